@@ -0,0 +1,76 @@
+"""Add telemetry continuous aggregates (1m, 5m, 1h, 1d)
+
+Revision ID: 004_telemetry_caggs
+Revises: 003_device_sensor_motor
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '004_telemetry_caggs'
+down_revision = '003_device_sensor_motor'
+branch_labels = None
+depends_on = None
+
+# Actuator columns whose on-fraction is aggregated per bucket
+ACTUATORS = (
+    'primary_heater',
+    'secondary_heater',
+    'exhaust_fan',
+    'sv_valve',
+    'fan',
+    'turning_motor',
+    'door_light',
+)
+
+# view, bucket width, refresh start_offset, end_offset, schedule_interval.
+# start_offset is generous so rows replayed from the ingest journal after
+# an outage are still picked up by the refresh.
+AGGREGATES = (
+    ('telemetry_1m', '1 minute', '1 day', '1 minute', '1 minute'),
+    ('telemetry_5m', '5 minutes', '3 days', '5 minutes', '5 minutes'),
+    ('telemetry_1h', '1 hour', '7 days', '1 hour', '30 minutes'),
+    ('telemetry_1d', '1 day', '60 days', '1 day', '1 hour'),
+)
+
+
+def upgrade():
+    on_fractions = ",\n            ".join(
+        f"avg({name}::int)::float8 AS {name}_on" for name in ACTUATORS
+    )
+    # Continuous aggregates cannot be created inside a transaction
+    with op.get_context().autocommit_block():
+        for view, width, start_offset, end_offset, schedule in AGGREGATES:
+            # materialized_only = false: queries union the materialized buckets
+            # with time_bucket() over raw rows for the not-yet-materialized tail
+            op.execute(f"""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS {view}
+                WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+                SELECT
+                    time_bucket(INTERVAL '{width}', ts) AS bucket,
+                    device_id,
+                    count(*) AS samples,
+                    min(temp_c) AS temp_c_min,
+                    avg(temp_c) AS temp_c_avg,
+                    max(temp_c) AS temp_c_max,
+                    min(hum_pct) AS hum_pct_min,
+                    avg(hum_pct) AS hum_pct_avg,
+                    max(hum_pct) AS hum_pct_max,
+                    {on_fractions}
+                FROM telemetry
+                GROUP BY bucket, device_id
+            """)
+            op.execute(f"""
+                SELECT add_continuous_aggregate_policy('{view}',
+                    start_offset => INTERVAL '{start_offset}',
+                    end_offset => INTERVAL '{end_offset}',
+                    schedule_interval => INTERVAL '{schedule}',
+                    if_not_exists => true)
+            """)
+            op.execute(f"CREATE INDEX IF NOT EXISTS ix_{view}_device_bucket ON {view} (device_id, bucket DESC)")
+
+
+def downgrade():
+    for view, *_ in reversed(AGGREGATES):
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view} CASCADE")
@@ -0,0 +1,89 @@
+"""Add telemetry_stats (per-bucket Welford accumulators and quantile sketches)
+
+Revision ID: 005_telemetry_stats
+Revises: 004_telemetry_caggs
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '005_telemetry_stats'
+down_revision = '004_telemetry_caggs'
+branch_labels = None
+depends_on = None
+
+# Must match TELEMETRY_STATS_BUCKET_SECONDS / TELEMETRY_STATS_RESOLUTION
+BUCKET = '5 minutes'
+RESOLUTION = 0.1
+FIELDS = ('temp_c', 'hum_pct')
+
+
+def upgrade():
+    op.create_table(
+        'telemetry_stats',
+        sa.Column('device_id', sa.Uuid(), sa.ForeignKey('device.id'), nullable=False),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('field', sa.String(), nullable=False),
+        sa.Column('samples', sa.BigInteger(), nullable=False),
+        sa.Column('mean', sa.Float(), nullable=False),
+        sa.Column('m2', sa.Float(), nullable=False),
+        sa.Column('min_value', sa.Float(), nullable=False),
+        sa.Column('max_value', sa.Float(), nullable=False),
+        sa.Column('sketch', postgresql.JSONB(), nullable=False, server_default='{}'),
+        sa.PrimaryKeyConstraint('device_id', 'bucket', 'field'),
+    )
+
+    # Sum the bin counts of two sparse histograms
+    op.execute("""
+        CREATE OR REPLACE FUNCTION telemetry_sketch_merge(a jsonb, b jsonb)
+        RETURNS jsonb LANGUAGE sql IMMUTABLE AS $$
+            SELECT coalesce(jsonb_object_agg(key, total), '{}'::jsonb)
+            FROM (
+                SELECT key, sum(value::bigint) AS total
+                FROM (
+                    SELECT * FROM jsonb_each_text(coalesce(a, '{}'::jsonb))
+                    UNION ALL
+                    SELECT * FROM jsonb_each_text(coalesce(b, '{}'::jsonb))
+                ) bins
+                GROUP BY key
+            ) merged
+        $$
+    """)
+
+    # Backfill from existing history so windows cover data ingested before this release
+    for field in FIELDS:
+        op.execute(f"""
+            WITH v AS (
+                SELECT device_id, time_bucket(INTERVAL '{BUCKET}', ts) AS bucket, {field}::float8 AS value
+                FROM telemetry
+                WHERE {field} IS NOT NULL
+            ),
+            moments AS (
+                SELECT device_id, bucket, count(*) AS samples, avg(value) AS mean,
+                       coalesce(var_pop(value), 0) * count(*) AS m2,
+                       min(value) AS min_value, max(value) AS max_value
+                FROM v
+                GROUP BY device_id, bucket
+            ),
+            sketches AS (
+                SELECT device_id, bucket, jsonb_object_agg(bin, n) AS sketch
+                FROM (
+                    SELECT device_id, bucket, floor(value / {RESOLUTION})::bigint AS bin, count(*) AS n
+                    FROM v
+                    GROUP BY device_id, bucket, bin
+                ) b
+                GROUP BY device_id, bucket
+            )
+            INSERT INTO telemetry_stats (device_id, bucket, field, samples, mean, m2, min_value, max_value, sketch)
+            SELECT m.device_id, m.bucket, '{field}', m.samples, m.mean, m.m2, m.min_value, m.max_value, s.sketch
+            FROM moments m
+            JOIN sketches s USING (device_id, bucket)
+        """)
+
+
+def downgrade():
+    op.drop_table('telemetry_stats')
+    op.execute("DROP FUNCTION IF EXISTS telemetry_sketch_merge(jsonb, jsonb)")
@@ -0,0 +1,40 @@
+"""Add composite (device_id, ts DESC) / (farm_id, ts DESC) telemetry indexes
+
+Revision ID: 006_composite_indexes
+Revises: 005_telemetry_stats
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006_composite_indexes'
+down_revision = '005_telemetry_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # transaction_per_chunk builds the index chunk by chunk instead of
+    # locking the whole hypertable for the duration; it needs autocommit
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_telemetry_device_id_ts "
+            "ON telemetry (device_id, ts DESC) WITH (timescaledb.transaction_per_chunk)"
+        )
+        # device_id breaks ts ties so farm-wide range reads need no sort
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_telemetry_farm_id_ts "
+            "ON telemetry (farm_id, ts DESC, device_id DESC) WITH (timescaledb.transaction_per_chunk)"
+        )
+    # Prefix of ix_telemetry_farm_id_ts
+    op.drop_index('ix_telemetry_farm_id', table_name='telemetry')
+    # Command history: device_id = ? ORDER BY created_at DESC, id DESC (keyset)
+    op.create_index('ix_command_device_id_created_at', 'command', ['device_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_command_device_id_created_at', table_name='command')
+    op.create_index('ix_telemetry_farm_id', 'telemetry', ['farm_id'], unique=False)
+    op.drop_index('ix_telemetry_farm_id_ts', table_name='telemetry')
+    op.drop_index('ix_telemetry_device_id_ts', table_name='telemetry')
@@ -0,0 +1,99 @@
+"""Enable telemetry compression and trim payload to its residual keys
+
+Revision ID: 007_telemetry_compression
+Revises: 006_composite_indexes
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_telemetry_compression'
+down_revision = '006_composite_indexes'
+branch_labels = None
+depends_on = None
+
+COMPRESS_AFTER = '7 days'
+
+# payload keys mirrored by a typed column (see telemetry_codec.TYPED_PAYLOAD_KEYS)
+TYPED_KEYS = {
+    'seq': 'seq',
+    'temp_c': 'temp_c',
+    'current_temp': 'temp_c',
+    'hum_pct': 'hum_pct',
+    'current_humidity': 'hum_pct',
+    'primary_heater': 'primary_heater',
+    'secondary_heater': 'secondary_heater',
+    'exhaust_fan': 'exhaust_fan',
+    'sv_valve': 'sv_valve',
+    'fan': 'fan',
+    'turning_motor': 'turning_motor',
+    'limit_switch': 'limit_switch',
+    'door_light': 'door_light',
+    'heater': 'heater',
+    'motor_state': 'motor_state',
+    'uptime_s': 'uptime_s',
+    'rssi': 'rssi',
+    'ip': 'ip',
+}
+
+
+# ts is dropped when it is the row's timestamp (telemetry_codec.residual_payload):
+# ISO 8601 strings (UTC when without offset) or epoch seconds/milliseconds.
+# Nested CASEs so a cast only runs on values it accepts.
+ISO_TS = r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}(:?\d{2})?)?$'
+DROP_TS = f"""
+    CASE jsonb_typeof(payload::jsonb -> 'ts')
+    WHEN 'string' THEN
+        CASE WHEN payload::jsonb ->> 'ts' !~ '{ISO_TS}' THEN ''
+        WHEN CASE WHEN payload::jsonb ->> 'ts' ~ '(Z|[+-]\d{{2}}(:?\d{{2}})?)$'
+                  THEN (payload::jsonb ->> 'ts')::timestamptz
+                  ELSE (payload::jsonb ->> 'ts')::timestamp AT TIME ZONE 'UTC' END = ts
+        THEN 'ts' ELSE '' END
+    WHEN 'number' THEN
+        CASE WHEN (payload::jsonb ->> 'ts')::float8 <= 0 OR (payload::jsonb ->> 'ts')::float8 >= 1e14 THEN ''
+        WHEN to_timestamp(CASE WHEN (payload::jsonb ->> 'ts')::float8 > 1e11
+                               THEN (payload::jsonb ->> 'ts')::float8 / 1000
+                               ELSE (payload::jsonb ->> 'ts')::float8 END) = ts
+        THEN 'ts' ELSE '' END
+    ELSE '' END"""
+
+
+def upgrade():
+    # Drop payload keys whose value equals the typed column, chunk by chunk
+    # (one transaction each) and before any chunk is compressed
+    residual = f"(payload::jsonb - {DROP_TS})"
+    for key, column in TYPED_KEYS.items():
+        residual = (
+            f"({residual} - CASE WHEN payload::jsonb -> '{key}' = to_jsonb({column}) "
+            f"THEN '{key}' ELSE '' END)"
+        )
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        chunks = [row[0] for row in bind.execute(sa.text("SELECT show_chunks('telemetry')::text"))]
+        for chunk in chunks:
+            bind.execute(sa.text(
+                f"UPDATE {chunk} SET payload = nullif({residual}, '{{}}'::jsonb)::json "
+                f"WHERE payload IS NOT NULL"
+            ))
+
+    # Segment by device so per-device range scans decompress only their segments
+    op.execute("""
+        ALTER TABLE telemetry SET (
+            timescaledb.compress,
+            timescaledb.compress_segmentby = 'device_id',
+            timescaledb.compress_orderby = 'ts DESC'
+        )
+    """)
+    op.execute(
+        f"SELECT add_compression_policy('telemetry', INTERVAL '{COMPRESS_AFTER}', if_not_exists => true)"
+    )
+
+
+def downgrade():
+    # Trimmed payload keys are not restored (they are still in the typed columns)
+    op.execute("SELECT remove_retention_policy('telemetry', if_exists => true)")
+    op.execute("SELECT remove_compression_policy('telemetry', if_exists => true)")
+    op.execute("SELECT decompress_chunk(c, if_compressed => true) FROM show_chunks('telemetry') c")
+    op.execute("ALTER TABLE telemetry SET (timescaledb.compress = false)")
@@ -0,0 +1,35 @@
+"""Add telemetry_archive (chunks moved to the Parquet archive)
+
+Revision ID: 008_telemetry_archive
+Revises: 007_telemetry_compression
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_telemetry_archive'
+down_revision = '007_telemetry_compression'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'telemetry_archive',
+        sa.Column('chunk_name', sa.String(), nullable=False),
+        sa.Column('range_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('range_end', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('rows', sa.BigInteger(), nullable=False),
+        sa.Column('files', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('chunk_name'),
+    )
+    op.create_index(op.f('ix_telemetry_archive_range_end'), 'telemetry_archive', ['range_end'], unique=False)
+
+
+def downgrade():
+    # Archived rows stay in the Parquet files; they are not copied back
+    op.drop_index(op.f('ix_telemetry_archive_range_end'), table_name='telemetry_archive')
+    op.drop_table('telemetry_archive')
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, farms, devices, telemetry, websocket, firmware
+from app.api.v1.endpoints import auth, users, farms, devices, telemetry, websocket, firmware, admin
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -9,3 +9,4 @@ api_router.include_router(devices.router, prefix="/devices", tags=["devices"])
 api_router.include_router(telemetry.router, tags=["telemetry"])
 api_router.include_router(websocket.router, tags=["websocket"])
 api_router.include_router(firmware.router, prefix="/firmware", tags=["firmware"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
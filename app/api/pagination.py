@@ -0,0 +1,29 @@
+import base64
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(ts: datetime, key: uuid.UUID) -> str:
+    """Opaque keyset cursor for the position just after (ts, key)."""
+    raw = f"{ts.isoformat()}|{key}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, key = raw.split("|")
+        return datetime.fromisoformat(ts), uuid.UUID(key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def set_next_cursor(response: Response, ts: Optional[datetime], key: Optional[uuid.UUID]):
+    if ts is not None and key is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(ts, key)
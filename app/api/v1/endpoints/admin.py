@@ -0,0 +1,52 @@
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import deps
+from app.models import User
+from app.schemas.telemetry import TelemetryPolicyUpdate, TelemetryStorageStatus
+from app.services.telemetry_storage import telemetry_storage
+from app.services.ws_hub import ws_hub
+
+router = APIRouter()
+
+@router.get("/telemetry/storage", response_model=TelemetryStorageStatus)
+async def read_telemetry_storage(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Size, chunk counts, compression ratio and active policies of the telemetry hypertable.
+    """
+    return await telemetry_storage.get_status(db)
+
+@router.put("/telemetry/policies", response_model=TelemetryStorageStatus)
+async def update_telemetry_policies(
+    policy_in: TelemetryPolicyUpdate,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Set the compression (compress chunks older than N days) and retention
+    (drop chunks older than N days) policies. null removes a policy.
+    """
+    update_data = policy_in.model_dump(exclude_unset=True)
+    try:
+        if "compress_after_days" in update_data:
+            await telemetry_storage.set_compression(db, update_data["compress_after_days"])
+        if "retention_days" in update_data:
+            await telemetry_storage.set_retention(db, update_data["retention_days"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    return await telemetry_storage.get_status(db)
+
+@router.get("/ws/clients")
+async def read_ws_clients(
+    current_user: User = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    WebSocket clients of this API process with their queue length, lag
+    (age of the oldest unsent message) and sent/dropped message counts.
+    """
+    return ws_hub.clients()
@@ -1,18 +1,25 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import tuple_
 from sqlmodel import select, delete
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
 from app.api import deps
+from app.core.config import settings
+from app.api.pagination import decode_cursor, set_next_cursor
 from app.models import Device, Command, CommandStatus, Farm
 from app.schemas.device import DeviceResponse, DeviceUpdate
 from app.schemas.command import CommandCreate, CommandResponse
 from app.services.mqtt_service import mqtt_service
+from app.services.device_registry import device_registry
+from app.services.latest_telemetry import latest_telemetry
+from app.services.telemetry_archive import telemetry_archive
+from app.services.telemetry_stats import telemetry_stats
 
 router = APIRouter()
 
@@ -43,22 +50,17 @@ async def list_devices(
     result = await db.execute(query)
     devices = result.scalars().all()
 
-    # Fetch latest telemetry for these devices
+    # Fetch latest telemetry for these devices (Redis, DB on cache miss)
     if devices:
         device_ids = [d.id for d in devices]
-        from app.models import Telemetry
-        
-        # Select distinct latest telemetry for each device
-        t_query = select(Telemetry).distinct(Telemetry.device_id).where(Telemetry.device_id.in_(device_ids)).order_by(Telemetry.device_id, Telemetry.ts.desc())
-        t_result = await db.execute(t_query)
-        telemetry_map = {t.device_id: t for t in t_result.scalars().all()}
+        telemetry_map = await latest_telemetry.get_many(db, device_ids)
         
         response = []
         for d in devices:
             d_dict = d.model_dump()
             t = telemetry_map.get(d.id)
             if t:
-                d_dict["latest_telemetry"] = t.model_dump()
+                d_dict["latest_telemetry"] = t
             response.append(d_dict)
             
         return response
@@ -77,14 +79,11 @@ async def read_device(
         raise HTTPException(status_code=404, detail="Device not found")
         
     # Fetch latest telemetry
-    from app.models import Telemetry
-    t_query = select(Telemetry).where(Telemetry.device_id == device_id).order_by(Telemetry.ts.desc()).limit(1)
-    t_result = await db.execute(t_query)
-    latest_telemetry = t_result.scalars().first()
+    latest = (await latest_telemetry.get_many(db, [device_id])).get(device_id)
     
     device_dict = device.model_dump()
-    if latest_telemetry:
-        device_dict["latest_telemetry"] = latest_telemetry.model_dump()
+    if latest:
+        device_dict["latest_telemetry"] = latest
         
     return device_dict
 
@@ -164,13 +163,26 @@ async def send_command(
 @router.get("/{device_id}/cmds", response_model=List[CommandResponse])
 async def read_commands(
     device_id: uuid.UUID,
+    response: Response,
     db: AsyncSession = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page; replaces skip"
+    ),
 ) -> Any:
-    query = select(Command).where(Command.device_id == device_id).order_by(Command.created_at.desc()).offset(skip).limit(limit)
+    query = select(Command).where(Command.device_id == device_id)
+    # Keyset pagination on (created_at, id)
+    if cursor:
+        query = query.where(tuple_(Command.created_at, Command.id) < decode_cursor(cursor))
+    else:
+        query = query.offset(skip)
+    query = query.order_by(Command.created_at.desc(), Command.id.desc()).limit(limit)
     result = await db.execute(query)
-    return result.scalars().all()
+    commands = result.scalars().all()
+    if len(commands) == limit:
+        set_next_cursor(response, commands[-1].created_at, commands[-1].id)
+    return commands
 
 @router.put("/{device_id}", response_model=DeviceResponse)
 async def update_device(
@@ -236,6 +248,7 @@ async def update_device(
     db.add(device)
     await db.commit()
     await db.refresh(device)
+    await device_registry.invalidate(device.device_id, device.id)
     return device
 
 @router.delete("/{device_id}", response_model=DeviceResponse)
@@ -264,9 +277,15 @@ async def delete_device(
     await db.execute(delete(Telemetry).where(Telemetry.device_id == device_id))
     # Delete Commands
     await db.execute(delete(Command).where(Command.device_id == device_id))
+    # Delete windowed stats
+    from app.models import TelemetryStats
+    await db.execute(delete(TelemetryStats).where(TelemetryStats.device_id == device_id))
 
     await db.delete(device)
     await db.commit()
+    await device_registry.invalidate(device.device_id, device.id)
+    await latest_telemetry.forget(device.id)
+    await telemetry_archive.forget(device.id)
     return device
 
 
@@ -322,17 +341,24 @@ async def analyze_device(
     
     return analysis
 
-from sqlalchemy import func
 from app.schemas.device import DeviceStatsResponse
 
+STATS_WINDOWS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "cycle": timedelta(days=settings.INCUBATION_CYCLE_DAYS),
+}
+
 @router.get("/{device_id}/stats", response_model=DeviceStatsResponse)
 async def get_device_stats(
     device_id: uuid.UUID,
+    window: Literal["1h", "24h", "cycle"] = "cycle",
     db: AsyncSession = Depends(deps.get_db),
     current_user: Any = Depends(deps.get_current_user),
 ) -> Any:
     """
-    Get aggregated temperature and humidity statistics.
+    Get temperature and humidity statistics (min/max/mean/stddev, p5/p50/p95)
+    over the last hour, day or incubation cycle (INCUBATION_CYCLE_DAYS).
     """
     # Check device permissions (borrowing logic from read_device)
     result = await db.execute(select(Device).where(Device.id == device_id))
@@ -348,25 +374,18 @@ async def get_device_stats(
          if not farm or farm.owner_user_id != current_user.id:
              raise HTTPException(status_code=403, detail="Not authorized")
 
-    # Calculate stats
-    from app.models import Telemetry
-    query = select(
-        func.max(Telemetry.temp_c), 
-        func.avg(Telemetry.temp_c), 
-        func.max(Telemetry.hum_pct), 
-        func.avg(Telemetry.hum_pct)
-    ).where(Telemetry.device_id == device_id)
-    
-    stats_res = await db.execute(query)
-    # result is a single row with 4 columns
-    row = stats_res.first()
-    
-    if not row:
-        return {}
+    # Merge the per-bucket accumulators of the window: O(buckets), not O(rows)
+    since = datetime.now(timezone.utc) - STATS_WINDOWS[window]
+    stats = await telemetry_stats.window(db, device_id, since)
+    temp = stats["temp_c"].summary()
+    hum = stats["hum_pct"].summary()
     
     return {
-        "max_temp_c": row[0],
-        "avg_temp_c": row[1],
-        "max_hum_pct": row[2],
-        "avg_hum_pct": row[3]
+        "window": window,
+        "max_temp_c": temp["max"],
+        "avg_temp_c": temp["mean"],
+        "max_hum_pct": hum["max"],
+        "avg_hum_pct": hum["mean"],
+        "temp_c": temp,
+        "hum_pct": hum,
     }
@@ -8,6 +8,8 @@ from app.api import deps
 from app.models import Farm, User, Device, UserRole
 from app.schemas.farm import FarmCreate, FarmResponse, FarmUpdate
 from app.schemas.device import DeviceResponse, DeviceCreate
+from app.services.device_registry import device_registry
+from app.services.latest_telemetry import latest_telemetry
 
 router = APIRouter()
 
@@ -87,22 +89,17 @@ async def read_farm_devices(
     result = await db.execute(query)
     devices = result.scalars().all()
 
-    # Fetch latest telemetry for these devices
+    # Fetch latest telemetry for these devices (Redis, DB on cache miss)
     if devices:
         device_ids = [d.id for d in devices]
-        from app.models import Telemetry
-        
-        # Select distinct latest telemetry for each device
-        t_query = select(Telemetry).distinct(Telemetry.device_id).where(Telemetry.device_id.in_(device_ids)).order_by(Telemetry.device_id, Telemetry.ts.desc())
-        t_result = await db.execute(t_query)
-        telemetry_map = {t.device_id: t for t in t_result.scalars().all()}
+        telemetry_map = await latest_telemetry.get_many(db, device_ids)
         
         response = []
         for d in devices:
             d_dict = d.model_dump()
             t = telemetry_map.get(d.id)
             if t:
-                d_dict["latest_telemetry"] = t.model_dump()
+                d_dict["latest_telemetry"] = t
             response.append(d_dict)
             
         return response
@@ -152,6 +149,8 @@ async def create_device_for_farm(
     db.add(device)
     await db.commit()
     await db.refresh(device)
+    # Clear any negative cache entry left by telemetry sent before registration
+    await device_registry.invalidate(device.device_id, device.id)
     return device
 
 @router.put("/{farm_id}", response_model=FarmResponse)
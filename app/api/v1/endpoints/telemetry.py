@@ -1,45 +1,228 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, Query
+from typing import Any, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, Uuid, column, func, table
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from app.api import deps
+from app.api.pagination import decode_cursor, set_next_cursor
 from app.models import Telemetry
 from app.schemas.farm import FarmResponse # reuse or create specific
+from app.schemas.telemetry import TelemetryBucket
+from app.services.downsampling import downsample
+from app.services.latest_telemetry import latest_telemetry
+from app.services.telemetry_archive import as_utc, telemetry_archive
+from app.services.telemetry_export import EXPORT_MEDIA_TYPES, export_telemetry
 
 router = APIRouter()
 
+# Continuous aggregates created by migration 004_telemetry_caggs
+BUCKET_VIEWS = {
+    "1m": "telemetry_1m",
+    "5m": "telemetry_5m",
+    "1h": "telemetry_1h",
+    "1d": "telemetry_1d",
+}
+BUCKET_WIDTHS = {
+    "1m": timedelta(minutes=1),
+    "5m": timedelta(minutes=5),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+BUCKET_COLUMNS = tuple(TelemetryBucket.model_fields)
+# Upper bound on buckets returned by one request
+MAX_BUCKETS = 5000
+
+async def read_telemetry_buckets(
+    db: AsyncSession,
+    device_id: uuid.UUID,
+    bucket: str,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+) -> List[TelemetryBucket]:
+    """
+    Min/avg/max of temp_c and hum_pct plus actuator on-fractions per bucket,
+    oldest first. The views are real-time aggregates, so buckets newer than
+    the last refresh are computed with time_bucket() over the raw rows.
+
+    A range spanning more than MAX_BUCKETS buckets is rejected (400); without
+    start_time the newest MAX_BUCKETS buckets are returned.
+    """
+    if start_time:
+        span = (as_utc(end_time) or datetime.now(timezone.utc)) - as_utc(start_time)
+        if span / BUCKET_WIDTHS[bucket] > MAX_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Range spans more than {MAX_BUCKETS} {bucket} buckets, use a wider bucket",
+            )
+    view = table(
+        BUCKET_VIEWS[bucket],
+        column("bucket", DateTime(timezone=True)),
+        column("device_id", Uuid),
+        *(column(name) for name in BUCKET_COLUMNS[2:]),
+    )
+    query = select(*view.c).where(view.c.device_id == device_id)
+    if start_time:
+        query = query.where(view.c.bucket >= start_time)
+    if end_time:
+        query = query.where(view.c.bucket <= end_time)
+    query = query.order_by(view.c.bucket.desc()).limit(MAX_BUCKETS)
+
+    result = await db.execute(query)
+    rows = result.mappings().all()
+    return [TelemetryBucket(**row) for row in reversed(rows)]
+
+async def read_telemetry_downsampled(
+    db: AsyncSession,
+    device_id: uuid.UUID,
+    max_points: int,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+) -> List[dict]:
+    """
+    ts, temp_c and hum_pct reduced with LTTB to about max_points per series,
+    oldest first. Only the charted columns are read from the hypertable
+    (and from the archive for the part of the range before its boundary).
+    """
+    start_time, end_time = as_utc(start_time), as_utc(end_time)
+    columns = ("ts", "temp_c", "hum_pct")
+    rows = []
+    boundary = await telemetry_archive.boundary(db)
+    if boundary and (start_time is None or start_time < boundary):
+        async for archived in telemetry_archive.read(
+            columns, device_id=device_id, start_time=start_time, end_time=end_time, before=boundary
+        ):
+            rows.extend(dict(zip(columns, row)) for row in telemetry_archive.to_rows(archived, columns))
+        start_time = boundary
+
+    query = select(Telemetry.ts, Telemetry.temp_c, Telemetry.hum_pct).where(Telemetry.device_id == device_id)
+    if start_time:
+        query = query.where(Telemetry.ts >= start_time)
+    if end_time:
+        query = query.where(Telemetry.ts <= end_time)
+    query = query.order_by(Telemetry.ts.asc())
+
+    result = await db.execute(query)
+    rows.extend(dict(row) for row in result.mappings())
+    return downsample(rows, max_points)
+
 @router.get("/devices/{device_id}/telemetry")
 async def read_device_telemetry(
     device_id: uuid.UUID,
+    response: Response,
     db: AsyncSession = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page; replaces skip"
+    ),
     start_time: datetime = Query(None),
     end_time: datetime = Query(None),
+    bucket: Optional[Literal["1m", "5m", "1h", "1d"]] = Query(
+        None, description="Aggregate into time buckets instead of returning raw rows"
+    ),
+    max_points: Optional[int] = Query(
+        None, ge=3, le=100000,
+        description="Downsample temp_c/hum_pct of the whole range to about this many points per series (LTTB)",
+    ),
 ) -> Any:
+    if bucket:
+        return await read_telemetry_buckets(db, device_id, bucket, start_time, end_time)
+    if max_points:
+        return await read_telemetry_downsampled(db, device_id, max_points, start_time, end_time)
+
+    start_time, end_time = as_utc(start_time), as_utc(end_time)
+    # Rows before the archive boundary are only in the Parquet archive
+    boundary = await telemetry_archive.boundary(db)
+
     # Build query
     query = select(Telemetry).where(Telemetry.device_id == device_id)
     if start_time:
         query = query.where(Telemetry.ts >= start_time)
     if end_time:
         query = query.where(Telemetry.ts <= end_time)
-        
-    query = query.order_by(Telemetry.ts.desc()).offset(skip).limit(limit)
+    if boundary:
+        query = query.where(Telemetry.ts >= boundary)
+
+    # Keyset pagination: seek past the last row of the previous page
+    # instead of scanning and discarding `skip` rows
+    cursor_ts = None
+    if cursor:
+        # device_id is fixed here, so (ts, device_id) < cursor reduces to ts < cursor ts,
+        # which seeks the (device_id, ts DESC) index directly
+        cursor_ts, _ = decode_cursor(cursor)
+        query = query.where(Telemetry.ts < cursor_ts)
+    else:
+        query = query.offset(skip)
+    page = query.order_by(Telemetry.ts.desc(), Telemetry.device_id.desc()).limit(limit)
     
-    result = await db.execute(query)
-    return result.scalars().all()
+    result = await db.execute(page)
+    rows = list(result.scalars().all())
+    if boundary and len(rows) < limit and (start_time is None or start_time < boundary):
+        # The page runs past the boundary: continue it from the archive
+        archive_skip = 0
+        if skip and not cursor and not rows:
+            # The offset may reach past the hot rows too
+            hot_rows = (await db.execute(select(func.count()).select_from(query.offset(None).subquery()))).scalar()
+            archive_skip = max(skip - hot_rows, 0)
+        # Capped at the boundary: files of a chunk being archived may be
+        # visible before its rows leave the hypertable
+        cursor_ts = as_utc(cursor_ts)
+        rows += await telemetry_archive.read_page(
+            device_id, limit - len(rows), offset=archive_skip,
+            start_time=start_time, end_time=end_time,
+            before=min(cursor_ts, boundary) if cursor_ts else boundary,
+        )
+    if len(rows) == limit:
+        set_next_cursor(response, rows[-1].ts, rows[-1].device_id)
+    return rows
+
+def _export_response(fmt: str, filename: str, **filters) -> StreamingResponse:
+    return StreamingResponse(
+        export_telemetry(fmt, **filters),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+@router.get("/devices/{device_id}/telemetry/export")
+async def export_device_telemetry(
+    device_id: uuid.UUID,
+    format: Literal["ndjson", "csv", "parquet", "arrow"] = "ndjson",
+    start_time: datetime = Query(None),
+    end_time: datetime = Query(None),
+) -> Any:
+    """
+    Stream a telemetry range (oldest first) without materializing it:
+    rows come from a server-side cursor in fixed-size chunks.
+    parquet/arrow carry ts, device_id, temp_c, hum_pct, the actuator
+    booleans and rssi, one record batch per chunk.
+    """
+    return _export_response(
+        format, f"telemetry-{device_id}",
+        device_id=device_id, start_time=start_time, end_time=end_time,
+    )
+
+@router.get("/farms/{farm_id}/telemetry/export")
+async def export_farm_telemetry(
+    farm_id: uuid.UUID,
+    format: Literal["ndjson", "csv", "parquet", "arrow"] = "ndjson",
+    start_time: datetime = Query(None),
+    end_time: datetime = Query(None),
+) -> Any:
+    """Farm-wide variant of the device telemetry export."""
+    return _export_response(
+        format, f"telemetry-farm-{farm_id}",
+        farm_id=farm_id, start_time=start_time, end_time=end_time,
+    )
 
 @router.get("/farms/{farm_id}/telemetry/latest")
 async def read_farm_latest_telemetry(
     farm_id: uuid.UUID,
     db: AsyncSession = Depends(deps.get_db),
 ) -> Any:
-    # Advanced: usage of distinct on connection to get latest per device
-    # PostgreSQL DISTINCT ON (device_id) ORDER BY device_id, ts DESC
-    
-    query = select(Telemetry).distinct(Telemetry.device_id).where(Telemetry.farm_id == farm_id).order_by(Telemetry.device_id, Telemetry.ts.desc())
-    result = await db.execute(query)
-    return result.scalars().all()
+    # Served from the Redis latest-reading cache; DISTINCT ON (device_id)
+    # against the hypertable only when the farm is not cached yet
+    return await latest_telemetry.get_farm(db, farm_id)
@@ -1,40 +1,139 @@
+from typing import Literal, Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
-from app.core.redis import get_redis
+from app.services.telemetry_stream import telemetry_stream
+from app.services.ws_hub import ClientQueue, OutgoingMessage, subscription_decoder, ws_hub
 import json
+import re
 import logging
 import asyncio
+import msgspec
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# "Try again later": the client could not keep up with the farm's telemetry
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# "Internal error": the missed messages could not be replayed, reconnect
+REPLAY_FAILED_CLOSE_CODE = 1011
+STREAM_ID = re.compile(r"^\d+(-\d+)?$")
+
+async def _send_messages(websocket: WebSocket, queue: ClientQueue):
+    while True:
+        await websocket.send_text(await queue.get())
+
+async def _receive_controls(websocket: WebSocket, queue: ClientQueue):
+    """
+    Apply the client's subscribe messages until it disconnects. Replies go
+    through the send queue, so only the send task writes to the socket.
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        text = message.get("text") or message.get("bytes")
+        if not text:
+            continue
+        try:
+            subscription = subscription_decoder.decode(text)
+        except (msgspec.DecodeError, msgspec.ValidationError) as e:
+            queue.put_control(json.dumps({"type": "error", "detail": str(e)}))
+            continue
+        queue.subscribe(subscription)
+        queue.put_control(json.dumps({
+            "type": "subscribed",
+            "devices": subscription.devices,
+            "fields": subscription.fields,
+            "max_rate": subscription.max_rate,
+        }))
+
+async def _replay(websocket: WebSocket, queue: ClientQueue, farm_id: str, last_id: str):
+    """
+    Send the stream entries after last_id straight to the socket. The client
+    already joined the hub, so live messages queue up meanwhile; the ones
+    also covered by the replay are dropped from its queue.
+    """
+    if not STREAM_ID.match(last_id):
+        await websocket.send_text(json.dumps({"type": "error", "detail": "Invalid last_id"}))
+        return
+    messages, truncated = await telemetry_stream.replay(farm_id, last_id)
+    for message in messages:
+        await websocket.send_text(queue.encode(OutgoingMessage(message)))
+    if messages:
+        queue.skip_through(json.loads(messages[-1])["id"])
+    await websocket.send_text(json.dumps({"type": "replayed", "count": len(messages), "truncated": truncated}))
+
 @router.websocket("/ws/farms/{farm_id}")
 async def websocket_endpoint(
     websocket: WebSocket, 
     farm_id: str,
-    token: str = Query(...)
+    token: str = Query(...),
+    last_id: Optional[str] = Query(None),
+    encoding: Literal["json", "delta"] = Query("json"),
 ):
+    """
+    Live telemetry of a farm. By default every reading of every device is
+    sent; a {"action": "subscribe", ...} message (see ws_hub.Subscription)
+    narrows it to some devices and fields at a capped rate.
+
+    Every message carries its Redis Stream "id". A client reconnecting
+    with ?last_id=<id> first gets the messages it missed (unfiltered),
+    then {"type": "replayed", "count": n, "truncated": bool}; truncated
+    means messages after last_id were trimmed from the stream. If the
+    replay fails the socket is closed with code 1011.
+
+    ?encoding=delta sends a "snapshot" of each device's first reading and
+    then "delta" messages with only the changed data fields (see
+    ws_hub.DeltaEncoder). Frames are permessage-deflate compressed when
+    the client offers the extension (uvicorn --ws-per-message-deflate).
+    """
     # TODO: Validate token (auth)
     # For now, minimal validation logic or call get_current_user via dependency?
     # WebSockets don't support headers easily in standard JS API, usually query param.
     # verification logic here:
     
     await websocket.accept()
-    redis = await get_redis()
-    pubsub = redis.pubsub()
-    
-    channel = f"telemetry:{farm_id}"
-    await pubsub.subscribe(channel)
-    
+    # Messages come from the process-wide hub (one Redis subscription per farm)
+    queue = await ws_hub.join(farm_id, delta=encoding == "delta")
+    if last_id is not None:
+        try:
+            await _replay(websocket, queue, farm_id, last_id)
+        except Exception as e:
+            logger.error(f"WebSocket replay error: {e}")
+            await ws_hub.leave(farm_id, queue)
+            try:
+                await websocket.close(code=REPLAY_FAILED_CLOSE_CODE, reason="Replay failed")
+            except Exception:
+                pass
+            return
+    lagging = asyncio.create_task(queue.lagging.wait())
+    tasks = [
+        asyncio.create_task(_send_messages(websocket, queue)),
+        asyncio.create_task(_receive_controls(websocket, queue)),
+        lagging,
+    ]
     try:
-        while True:
-            message = await pubsub.get_message(ignore_subscribe_messages=True)
-            if message:
-                await websocket.send_text(message["data"])
-            await asyncio.sleep(0.01) # fast loop
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if lagging in done:
+            # The send task may be stuck on the slow link: cancel it before closing
+            for task in tasks:
+                task.cancel()
+            logger.warning(
+                f"Disconnecting slow client {queue.id} of farm {farm_id} "
+                f"({queue.dropped} messages dropped, {queue.lag():.1f}s behind)"
+            )
+            try:
+                await asyncio.wait_for(websocket.close(code=SLOW_CONSUMER_CLOSE_CODE), timeout=5.0)
+            except Exception:
+                pass
+            return
+        for task in done:
+            task.result()
+        logger.info(f"Client disconnected from farm {farm_id}")
     except WebSocketDisconnect:
-        logger.info(f"Client disconnected from {channel}")
+        logger.info(f"Client disconnected from farm {farm_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        await pubsub.unsubscribe(channel)
-        await pubsub.close()
+        for task in tasks:
+            task.cancel()
+        await ws_hub.leave(farm_id, queue)
@@ -14,6 +14,89 @@ class Settings(BaseSettings):
     MQTT_BROKER: str = "localhost"
     MQTT_PORT: int = 1883
     
+    # Consume telemetry inside the API process. Set to false when running
+    # `python -m app.ingest` so API workers do not subscribe to telemetry.
+    RUN_INGESTION_IN_API: bool = True
+    
+    # MQTT v5 shared subscription group. When set, every ingestion process
+    # subscribes to $share/<group>/incubators/+/telemetry and the broker
+    # splits messages between them.
+    MQTT_SHARED_GROUP: Optional[str] = None
+    # Async partitions per process (= concurrent messages in flight);
+    # one device always maps to one partition
+    INGEST_PARTITIONS: int = 8
+    # Messages buffered per partition (0 = unbounded) and what to do when full:
+    # "block" (backpressure), "drop_new" or "drop_oldest"
+    INGEST_QUEUE_SIZE: int = 1000
+    INGEST_OVERFLOW_POLICY: str = "block"
+    # Bound on aiomqtt's own receive buffer ahead of the partitions; messages
+    # beyond it are discarded (ingest_dropped_messages_total{queue="mqtt_receive"}).
+    # Unset: INGEST_PARTITIONS * INGEST_QUEUE_SIZE (0 = unbounded)
+    MQTT_MAX_QUEUED_MESSAGES: Optional[int] = None
+    
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    # Per-message ingestion logs are emitted once every N messages
+    INGEST_LOG_SAMPLE_RATE: int = 1000
+    # Port of the /metrics page served by `python -m app.ingest`
+    INGEST_METRICS_PORT: int = 9100
+    
+    # Telemetry ingestion (batched writes to the hypertable)
+    TELEMETRY_BATCH_SIZE: int = 500
+    TELEMETRY_FLUSH_INTERVAL: float = 1.0  # seconds
+    TELEMETRY_MAX_BUFFER: int = 50000  # rows held in memory before the oldest are journaled
+    
+    # What the payload column stores: "full" raw payload, "residual" (keys
+    # not already in a typed column) or "none". This is also the `payload`
+    # the telemetry endpoints return; the trimmed values are in the typed fields
+    TELEMETRY_PAYLOAD_MODE: str = "residual"
+    
+    # Local spill journal used while Postgres is down or slow
+    INGEST_JOURNAL_DIR: str = "data/ingest-journal"  # one {hostname}-{pid} subdirectory per process
+    INGEST_JOURNAL_SEGMENT_MB: int = 64
+    INGEST_JOURNAL_MAX_MB: int = 2048  # oldest segments are deleted beyond this
+    INGEST_JOURNAL_FSYNC_INTERVAL: float = 1.0  # seconds
+    INGEST_JOURNAL_REPLAY_INTERVAL: float = 5.0  # seconds
+    
+    # Device registry cache (serial -> UUID/farm)
+    DEVICE_CACHE_TTL: float = 300.0  # seconds
+    DEVICE_CACHE_NEGATIVE_TTL: float = 30.0  # seconds an unknown serial stays cached
+    DEVICE_CACHE_MAX_SIZE: int = 10000
+    
+    # In-memory duplicate suppression: recent (ts, seq) pairs kept per device
+    DEDUP_WINDOW: int = 64
+    DEDUP_MAX_DEVICES: int = 20000
+    
+    # Write-behind of Device last_seen/status/settings
+    DEVICE_STATE_FLUSH_INTERVAL: float = 5.0  # seconds
+    
+    # Windowed telemetry stats (/devices/{id}/stats), accumulated at ingest
+    TELEMETRY_STATS_BUCKET_SECONDS: int = 300  # must match migration 005
+    TELEMETRY_STATS_RESOLUTION: float = 0.1  # quantile sketch bin width
+    TELEMETRY_STATS_FLUSH_INTERVAL: float = 10.0  # seconds
+    # Length of the "cycle" stats window
+    INCUBATION_CYCLE_DAYS: int = 21
+    
+    # Hot/cold tiering: chunks that ended more than this many days ago are
+    # moved to Parquet and dropped (0 disables). At least 61 (the telemetry_1d
+    # refresh window) and below any retention policy.
+    TELEMETRY_ARCHIVE_AFTER_DAYS: int = 0
+    # Local directory or s3://bucket/prefix on the MinIO endpoint
+    TELEMETRY_ARCHIVE_URI: str = "data/telemetry-archive"
+    TELEMETRY_ARCHIVE_INTERVAL: float = 3600.0  # seconds between archiver runs
+    
+    # Telemetry exports are streamed from a server-side cursor in chunks of this many rows
+    TELEMETRY_EXPORT_CHUNK_ROWS: int = 5000
+    
+    # Approximate number of messages kept per farm in the telemetry Redis
+    # Stream that reconnecting WebSocket clients replay from (last_id)
+    TELEMETRY_STREAM_MAXLEN: int = 10000
+    
+    # WebSocket fan-out: per-client send queue (conflated to the latest
+    # reading per device when full) and how long a client may stay behind
+    WS_CLIENT_QUEUE_SIZE: int = 256
+    WS_CLIENT_MAX_LAG: float = 30.0  # seconds
+    
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     
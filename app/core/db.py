@@ -1,9 +1,22 @@
+import msgspec
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel
 from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+_json_encoder = msgspec.json.Encoder()
+
+def _json_serializer(obj) -> str:
+    # msgspec writes msgspec.Raw (the untouched device payload) through as-is
+    return _json_encoder.encode(obj).decode()
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    future=True,
+    json_serializer=_json_serializer,
+    json_deserializer=msgspec.json.decode,
+)
 
 async def init_db():
     async with engine.begin() as conn:
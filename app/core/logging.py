@@ -0,0 +1,50 @@
+import itertools
+import logging
+from typing import Any
+
+from app.core.config import settings
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Appends structured `fields` passed via `extra` as key=value pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+def setup_logging():
+    handler = logging.StreamHandler()
+    handler.setFormatter(KeyValueFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields: Any):
+    """Structured log line; nothing is formatted when `level` is disabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+class SampledLog:
+    """
+    Logs one in every `every` calls, for per-message events on the hot path.
+    The level check happens first, so disabled levels cost one comparison.
+    """
+
+    def __init__(self, logger: logging.Logger, level: int, every: int):
+        self.logger = logger
+        self.level = level
+        self.every = max(1, every)
+        self._counter = itertools.count(1)
+
+    def __call__(self, event: str, **fields: Any):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if next(self._counter) % self.every:
+            return
+        self.logger.log(self.level, event, extra={"fields": {**fields, "sample_rate": self.every}})
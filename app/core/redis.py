@@ -1,6 +1,10 @@
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
 from app.core.config import settings
-from typing import Optional
+import logging
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
 
 redis_client: Optional[redis.Redis] = None
 
@@ -21,3 +25,49 @@ async def close_redis():
     global redis_client
     if redis_client:
         await redis_client.close()
+
+_scripts = []
+
+class RedisScript:
+    """
+    Lua script queued on pipelines as EVALSHA. The SHA is loaded once
+    (SCRIPT LOAD); redis-py's register_script() would instead send a
+    SCRIPT EXISTS round trip before every pipeline that calls it.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha: Optional[str] = None
+        _scripts.append(self)
+
+    async def load(self) -> str:
+        client = await get_redis()
+        self.sha = await client.script_load(self.source)
+        return self.sha
+
+    async def stage(self, pipe, keys: Sequence, args: Sequence):
+        sha = self.sha or await self.load()
+        pipe.evalsha(sha, len(keys), *keys, *args)
+
+async def load_scripts():
+    for script in _scripts:
+        await script.load()
+
+async def execute_scripted(build: Callable[[Any], Awaitable[None]]) -> list:
+    """
+    Run a pipeline queued by `build(pipe)` in one round trip. After a Redis
+    restart or SCRIPT FLUSH the scripts are gone: on NOSCRIPT they are
+    reloaded and the pipeline is rebuilt and run once more.
+    """
+    client = await get_redis()
+    for attempt in range(2):
+        async with client.pipeline(transaction=False) as pipe:
+            await build(pipe)
+            try:
+                return await pipe.execute()
+            except NoScriptError:
+                if attempt:
+                    raise
+                logger.warning("Redis scripts missing, reloading")
+                for script in _scripts:
+                    script.sha = None
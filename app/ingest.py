@@ -0,0 +1,54 @@
+"""
+Standalone telemetry ingestion worker.
+
+Owns the MQTT telemetry subscription and the batched DB writers so the API
+can run with RUN_INGESTION_IN_API=false and scale independently:
+
+    python -m app.ingest
+
+Prometheus metrics are served on INGEST_METRICS_PORT (/metrics).
+"""
+import asyncio
+import logging
+import signal
+import sys
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.core.metrics import start_metrics_server
+from app.core.redis import init_redis, close_redis
+from app.services.ingestion import start_ingestion, stop_ingestion
+from app.services.mqtt_service import mqtt_service
+
+logger = logging.getLogger("app.ingest")
+
+async def main() -> int:
+    metrics_server = await start_metrics_server("0.0.0.0", settings.INGEST_METRICS_PORT)
+    await init_redis()
+    await start_ingestion()
+    if not mqtt_service.is_connected:
+        # Exit non-zero so the supervisor (docker/systemd) restarts us
+        logger.error("Could not connect to MQTT broker, exiting")
+        await stop_ingestion()
+        await close_redis()
+        metrics_server.close()
+        return 1
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Ingestion worker running")
+    await stop.wait()
+
+    logger.info("Ingestion worker shutting down")
+    await stop_ingestion()
+    await close_redis()
+    metrics_server.close()
+    await metrics_server.wait_closed()
+    return 0
+
+if __name__ == "__main__":
+    setup_logging()
+    sys.exit(asyncio.run(main()))
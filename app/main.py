@@ -1,20 +1,36 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from contextlib import asynccontextmanager
 from app.core.config import settings
+from app.core.logging import setup_logging
+from app.core.metrics import CONTENT_TYPE_LATEST, render_text
 from app.core.redis import init_redis, close_redis
 from app.services.mqtt_service import mqtt_service
+from app.services.ingestion import start_ingestion, stop_ingestion
+from app.services.ws_hub import ws_hub
+
+setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_redis()
-    await mqtt_service.start()
+    if settings.RUN_INGESTION_IN_API:
+        await start_ingestion()
+    else:
+        # API-only mode: MQTT is used to publish commands, telemetry is
+        # consumed by the standalone worker (python -m app.ingest)
+        await mqtt_service.start(subscribe=False)
     yield
     # Shutdown
-    await mqtt_service.stop()
+    if settings.RUN_INGESTION_IN_API:
+        await stop_ingestion()
+    else:
+        await mqtt_service.stop()
+    await ws_hub.close()
     await close_redis()
 
 from fastapi.middleware.cors import CORSMiddleware
+from app.api.pagination import NEXT_CURSOR_HEADER
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -30,6 +46,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
 @app.get("/")
@@ -40,5 +57,9 @@ async def root():
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_text(), media_type=CONTENT_TYPE_LATEST)
+
 from app.api.api import api_router
 app.include_router(api_router, prefix=settings.API_V1_STR)
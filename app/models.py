@@ -4,7 +4,8 @@ from typing import Optional, List, Dict, Any
 from enum import Enum
 
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON, DateTime, func, String, Boolean, text, Enum as SAEnum
+from sqlalchemy import Column, JSON, BigInteger, DateTime, Index, func, String, Boolean, text, Enum as SAEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from pydantic import EmailStr
 
 # Enums
@@ -84,9 +85,15 @@ class Telemetry(SQLModel, table=True):
     Primary Key is (ts, device_id) usually for chunks, but SQLModel expects a PK.
     We will use composite PK (ts, device_id).
     """
+    __table_args__ = (
+        # Hot reads filter by device or farm and order by ts DESC
+        Index("ix_telemetry_device_id_ts", "device_id", text("ts DESC")),
+        Index("ix_telemetry_farm_id_ts", "farm_id", text("ts DESC"), text("device_id DESC")),
+    )
+
     ts: datetime = Field(primary_key=True, sa_type=DateTime(timezone=True), index=True)
     device_id: uuid.UUID = Field(primary_key=True, foreign_key="device.id")
-    farm_id: Optional[uuid.UUID] = Field(index=True)
+    farm_id: Optional[uuid.UUID] = None
     
     seq: Optional[int] = None
     
@@ -115,11 +122,48 @@ class Telemetry(SQLModel, table=True):
     
     payload: Optional[Dict[str, Any]] = Field(default=None, sa_type=JSON)
 
+class TelemetryStats(SQLModel, table=True):
+    """
+    Mergeable per-bucket statistics of one telemetry field, updated at ingest.
+    samples/mean/m2 are Welford accumulators; sketch is a sparse histogram
+    {bin: count} with bins of TELEMETRY_STATS_RESOLUTION used for quantiles.
+    """
+    __tablename__ = "telemetry_stats"
+
+    device_id: uuid.UUID = Field(primary_key=True, foreign_key="device.id")
+    bucket: datetime = Field(primary_key=True, sa_type=DateTime(timezone=True))
+    field: str = Field(primary_key=True)
+
+    samples: int = Field(sa_type=BigInteger)
+    mean: float
+    m2: float
+    min_value: float
+    max_value: float
+    sketch: Dict[str, int] = Field(default_factory=dict, sa_type=JSONB)
+
+class TelemetryArchive(SQLModel, table=True):
+    """
+    A telemetry chunk moved to the Parquet archive and dropped from the
+    hypertable. Rows with ts < max(range_end) are read from the archive.
+    """
+    __tablename__ = "telemetry_archive"
+
+    chunk_name: str = Field(primary_key=True)
+    range_start: datetime = Field(sa_type=DateTime(timezone=True))
+    range_end: datetime = Field(sa_type=DateTime(timezone=True), index=True)
+    rows: int = Field(sa_type=BigInteger)
+    files: int
+    archived_at: Optional[datetime] = Field(default=None, sa_type=DateTime(timezone=True), sa_column_kwargs={"server_default": func.now()})
+
 class CommandBase(SQLModel):
     cmd: str
     params: Optional[Dict[str, Any]] = Field(default=None, sa_type=JSON)
 
 class Command(CommandBase, table=True):
+    __table_args__ = (
+        Index("ix_command_device_id_created_at", "device_id", "created_at", "id"),
+    )
+
     id: Optional[uuid.UUID] = Field(default_factory=uuid.uuid4, primary_key=True)
     device_id: uuid.UUID = Field(foreign_key="device.id")
     farm_id: Optional[uuid.UUID] = None
@@ -69,8 +69,21 @@ class DeviceAnalysisResponse(SQLModel):
     summary_for_farmer: str
     recommended_action: str
 
+class FieldStats(SQLModel):
+    samples: int = 0
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    stddev: Optional[float] = None
+    p5: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+
 class DeviceStatsResponse(SQLModel):
+    window: Optional[str] = None
     max_temp_c: Optional[float] = None
     avg_temp_c: Optional[float] = None
     max_hum_pct: Optional[float] = None
     avg_hum_pct: Optional[float] = None
+    temp_c: Optional[FieldStats] = None
+    hum_pct: Optional[FieldStats] = None
@@ -0,0 +1,47 @@
+from typing import Optional
+from sqlmodel import Field, SQLModel
+from datetime import datetime
+import uuid
+
+# Actuator columns aggregated as on-fractions (share of samples reporting on)
+ACTUATOR_FIELDS = (
+    "primary_heater",
+    "secondary_heater",
+    "exhaust_fan",
+    "sv_valve",
+    "fan",
+    "turning_motor",
+    "door_light",
+)
+
+class TelemetryBucket(SQLModel):
+    bucket: datetime
+    device_id: uuid.UUID
+    samples: int
+    temp_c_min: Optional[float] = None
+    temp_c_avg: Optional[float] = None
+    temp_c_max: Optional[float] = None
+    hum_pct_min: Optional[float] = None
+    hum_pct_avg: Optional[float] = None
+    hum_pct_max: Optional[float] = None
+    primary_heater_on: Optional[float] = None
+    secondary_heater_on: Optional[float] = None
+    exhaust_fan_on: Optional[float] = None
+    sv_valve_on: Optional[float] = None
+    fan_on: Optional[float] = None
+    turning_motor_on: Optional[float] = None
+    door_light_on: Optional[float] = None
+
+class TelemetryStorageStatus(SQLModel):
+    total_bytes: int
+    chunks: int
+    compressed_chunks: int
+    before_compression_bytes: int
+    after_compression_bytes: int
+    compress_after_days: Optional[int] = None
+    retention_days: Optional[int] = None
+
+class TelemetryPolicyUpdate(SQLModel):
+    # Omitted fields are left unchanged, null removes the policy
+    compress_after_days: Optional[int] = Field(default=None, ge=1)
+    retention_days: Optional[int] = Field(default=None, ge=1)
@@ -0,0 +1,76 @@
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Optional, Union
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+checks = registry.counter(
+    "ingest_dedup_checks_total", "Telemetry messages checked for redelivery"
+)
+hits = registry.counter(
+    "ingest_dedup_hits_total", "Telemetry messages dropped as duplicates before any DB work"
+)
+
+
+class _Ring:
+    __slots__ = ("keys", "pos")
+
+    def __init__(self, size: int):
+        # 8 bytes per remembered message
+        self.keys = array("q", [0]) * size
+        self.pos = 0
+
+
+class DuplicateFilter:
+    """
+    Drops QoS1 redeliveries in memory.
+    For each device the fingerprints of the last `window` (ts, seq) pairs are
+    kept in a fixed-size ring; a message whose fingerprint is already in the
+    ring is a duplicate. Devices are evicted LRU beyond `max_devices`.
+
+    Only readings with a device ts are checked, matching the (ts, device_id)
+    primary key: seq alone restarts at 0 when a device reboots.
+    """
+
+    def __init__(self, window: int, max_devices: int):
+        self.window = max(1, window)
+        self.max_devices = max_devices
+        self._rings: "OrderedDict[str, _Ring]" = OrderedDict()
+
+    @staticmethod
+    def fingerprint(ts: Union[str, int, float], seq: Optional[int]) -> int:
+        # 0 marks an empty ring slot, so never return it
+        return hash((ts, seq)) or 1
+
+    def is_duplicate(self, device_key: str, ts: Union[str, int, float, None], seq: Optional[int]) -> bool:
+        """Check a message and remember it. Returns True for a redelivery."""
+        if not ts:
+            # The server assigns ts: nothing identifies the reading, cannot dedup
+            return False
+        checks.inc()
+
+        ring = self._rings.get(device_key)
+        if ring is None:
+            ring = self._rings[device_key] = _Ring(self.window)
+            if len(self._rings) > self.max_devices:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(device_key)
+
+        key = self.fingerprint(ts, seq)
+        if key in ring.keys:
+            hits.inc()
+            return True
+        ring.keys[ring.pos] = key
+        ring.pos = (ring.pos + 1) % self.window
+        return False
+
+
+duplicate_filter = DuplicateFilter(
+    window=settings.DEDUP_WINDOW,
+    max_devices=settings.DEDUP_MAX_DEVICES,
+)
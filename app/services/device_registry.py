@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import registry
+from app.core.redis import get_redis
+from app.models import Device
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "devices:invalidate"
+
+lookups = registry.counter(
+    "device_registry_lookups_total", "Device serial lookups by result", ["result"]
+)
+
+
+class DeviceRef(NamedTuple):
+    id: uuid.UUID
+    farm_id: Optional[uuid.UUID]
+
+
+class DeviceRegistry:
+    """
+    Process-local cache mapping a physical device serial to its
+    (Device.id, farm_id). Entries expire after `ttl` seconds and the least
+    recently used entry is evicted once `max_size` is reached. Unknown
+    serials are cached as misses for `negative_ttl` seconds so rogue
+    publishers cannot hammer the database.
+
+    Writers call `invalidate(serial)`, which evicts the entry in every
+    process through the `devices:invalidate` Redis channel.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Optional[DeviceRef]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._callbacks: List[Callable[[str, Optional[str]], None]] = []
+        self._listener: Optional[asyncio.Task] = None
+
+    def on_invalidate(self, callback: Callable[[str, Optional[str]], None]):
+        """Register a callback(serial, device_uuid) run on every invalidation."""
+        self._callbacks.append(callback)
+
+    async def resolve(self, serial: str) -> Optional[DeviceRef]:
+        now = time.monotonic()
+        entry = self._entries.get(serial)
+        if entry is not None:
+            expires_at, ref = entry
+            if expires_at > now:
+                self._entries.move_to_end(serial)
+                lookups.labels(result="hit" if ref else "negative_hit").inc()
+                return ref
+            del self._entries[serial]
+
+        # Coalesce concurrent misses for the same serial into one query
+        pending = self._inflight.get(serial)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[serial] = future
+        try:
+            ref = await self._load(serial)
+            self._store(serial, ref)
+            lookups.labels(result="miss").inc()
+            future.set_result(ref)
+            return ref
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be awaiting the shared future; mark it retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[serial]
+
+    async def _load(self, serial: str) -> Optional[DeviceRef]:
+        async with AsyncSession(engine) as session:
+            result = await session.execute(
+                select(Device.id, Device.farm_id).where(Device.device_id == serial)
+            )
+            row = result.first()
+        if not row:
+            return None
+        return DeviceRef(id=row[0], farm_id=row[1])
+
+    def _store(self, serial: str, ref: Optional[DeviceRef]):
+        ttl = self.ttl if ref else self.negative_ttl
+        self._entries[serial] = (time.monotonic() + ttl, ref)
+        self._entries.move_to_end(serial)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def evict(self, serial: str, device_uuid: Optional[str] = None):
+        self._entries.pop(serial, None)
+        for callback in self._callbacks:
+            try:
+                callback(serial, device_uuid)
+            except Exception as e:
+                logger.error(f"Device invalidation callback failed: {e}")
+
+    async def invalidate(self, serial: str, device_uuid: Optional[uuid.UUID] = None):
+        """Evict `serial` locally and broadcast the eviction to other processes."""
+        device_uuid_str = str(device_uuid) if device_uuid else None
+        self.evict(serial, device_uuid_str)
+        try:
+            redis = await get_redis()
+            await redis.publish(
+                INVALIDATION_CHANNEL,
+                json.dumps({"serial": serial, "id": device_uuid_str}),
+            )
+        except Exception as e:
+            logger.error(f"Failed to broadcast device invalidation for {serial}: {e}")
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                redis = await get_redis()
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached before the (re)subscribe may have missed an eviction
+                self._entries.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        data = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self.evict(data.get("serial"), data.get("id"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Device invalidation listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+
+device_registry = DeviceRegistry(
+    ttl=settings.DEVICE_CACHE_TTL,
+    negative_ttl=settings.DEVICE_CACHE_NEGATIVE_TTL,
+    max_size=settings.DEVICE_CACHE_MAX_SIZE,
+)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import DateTime, column, func, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import registry
+from app.models import Device
+from app.services.device_registry import device_registry
+
+logger = logging.getLogger(__name__)
+
+# Device settings reported in telemetry and synced back to the Device row
+SETTING_FIELDS = (
+    "temp_low",
+    "temp_high",
+    "humidity_temp",
+    "sensor1_offset",
+    "sensor2_offset",
+    "motor_mode",
+    "timer_sec",
+)
+
+flush_latency = registry.histogram(
+    "device_state_flush_seconds", "Time spent persisting coalesced device state"
+)
+flushed_devices = registry.counter(
+    "device_state_last_seen_updates_total", "Devices whose last_seen was written in a bulk update"
+)
+settings_updates = registry.counter(
+    "device_state_settings_updates_total", "Device rows updated because reported settings changed"
+)
+
+_UNKNOWN = object()
+
+
+class _DeviceState:
+    __slots__ = ("last_seen", "settings", "pending_settings")
+
+    def __init__(self):
+        self.last_seen: Optional[datetime] = None
+        self.settings: Dict[str, Any] = {}
+        self.pending_settings: Dict[str, Any] = {}
+
+
+class DeviceStateTracker:
+    """
+    Write-behind layer for the Device row.
+    Telemetry only updates in-memory state; every `flush_interval` seconds
+    last_seen/status of all dirty devices are written in one bulk UPDATE and
+    reported settings are written only for devices where they changed.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._states: Dict[uuid.UUID, _DeviceState] = {}
+        self._dirty: Dict[uuid.UUID, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def observe(self, device_id: uuid.UUID, ts: datetime, data: Dict[str, Any]):
+        state = self._states.get(device_id)
+        if state is None:
+            state = self._states[device_id] = _DeviceState()
+
+        if state.last_seen is None or ts > state.last_seen:
+            state.last_seen = ts
+            self._dirty[device_id] = ts
+
+        for field in SETTING_FIELDS:
+            if field not in data:
+                continue
+            value = data[field]
+            if state.settings.get(field, _UNKNOWN) != value:
+                state.settings[field] = value
+                state.pending_settings[field] = value
+
+    def forget(self, serial: str, device_uuid: Optional[str] = None):
+        """
+        Drop the in-memory state of a device changed through the API,
+        so the next reported settings are written again.
+        """
+        if device_uuid:
+            self._states.pop(uuid.UUID(device_uuid), None)
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, {}
+        changed = {}
+        for device_id, state in self._states.items():
+            if state.pending_settings:
+                changed[device_id] = state.pending_settings
+                state.pending_settings = {}
+        if not dirty and not changed:
+            return
+
+        started = time.perf_counter()
+        try:
+            async with AsyncSession(engine) as session:
+                if dirty:
+                    seen = values(
+                        column("id", Device.__table__.c.id.type),
+                        column("last_seen", DateTime(timezone=True)),
+                        name="seen",
+                    ).data(list(dirty.items()))
+                    table = Device.__table__
+                    await session.execute(
+                        update(table)
+                        .where(table.c.id == seen.c.id)
+                        .values(
+                            last_seen=func.greatest(table.c.last_seen, seen.c.last_seen),
+                            status="online",
+                        )
+                    )
+                for device_id, fields in changed.items():
+                    await session.execute(
+                        update(Device.__table__).where(Device.__table__.c.id == device_id).values(**fields)
+                    )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to persist device state: {e}")
+            # Keep the newest values for the next attempt
+            for device_id, ts in dirty.items():
+                if self._dirty.get(device_id) is None or ts > self._dirty[device_id]:
+                    self._dirty[device_id] = ts
+            for device_id, fields in changed.items():
+                state = self._states.get(device_id)
+                if state is not None:
+                    state.pending_settings = {**fields, **state.pending_settings}
+            return
+
+        flush_latency.observe(time.perf_counter() - started)
+        flushed_devices.inc(len(dirty))
+        settings_updates.inc(len(changed))
+
+    async def _flush_loop(self):
+        while self._running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Device state flush loop error: {e}")
+
+
+device_state = DeviceStateTracker(flush_interval=settings.DEVICE_STATE_FLUSH_INTERVAL)
+device_registry.on_invalidate(device_state.forget)
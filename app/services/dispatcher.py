@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+import zlib
+from typing import Any, Awaitable, Callable, List
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# What to do when a partition queue is full
+OVERFLOW_BLOCK = "block"              # wait for room (backpressure on the receive loop)
+OVERFLOW_DROP_NEW = "drop_new"        # discard the incoming message
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # discard the oldest queued message
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST)
+
+queue_depth = registry.gauge(
+    "ingest_queue_depth", "Messages waiting in an ingestion partition", ["partition"]
+)
+queue_wait = registry.histogram(
+    "ingest_queue_wait_seconds", "Time a message waited in its partition before processing"
+)
+dropped = registry.counter(
+    "ingest_dropped_messages_total", "Messages shed because an ingestion queue was full", ["policy", "queue"]
+)
+blocked = registry.counter(
+    "ingest_backpressure_waits_total", "Submits that had to wait for room in a full partition"
+)
+
+
+class PartitionedDispatcher:
+    """
+    Spreads work over `partitions` async workers by hashing a key.
+    Items with the same key (a device serial) always land on the same
+    partition and are handled in arrival order, while different keys are
+    handled concurrently.
+
+    Each partition queue holds at most `queue_size` items (0 = unbounded);
+    `overflow_policy` decides what happens when it is full.
+    """
+
+    def __init__(
+        self,
+        partitions: int,
+        handler: Callable[..., Awaitable[None]],
+        queue_size: int = 0,
+        overflow_policy: str = OVERFLOW_BLOCK,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.partitions = max(1, partitions)
+        self.handler = handler
+        self.queue_size = max(0, queue_size)
+        self.overflow_policy = overflow_policy
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.partitions)]
+        self._workers = [
+            asyncio.create_task(self._work(index, queue)) for index, queue in enumerate(self._queues)
+        ]
+        logger.info(
+            f"Dispatcher started with {self.partitions} partitions "
+            f"(queue_size={self.queue_size}, overflow_policy={self.overflow_policy})"
+        )
+
+    async def stop(self, drain: bool = True):
+        if drain:
+            for queue in self._queues:
+                await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = []
+
+    def partition_for(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.partitions
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def submit(self, key: str, *args: Any) -> bool:
+        """Queue `args` for the partition of `key`. Returns False if the item was shed."""
+        index = self.partition_for(key)
+        queue = self._queues[index]
+        item = (time.monotonic(), args)
+
+        if queue.full():
+            if self.overflow_policy == OVERFLOW_DROP_NEW:
+                dropped.labels(policy=self.overflow_policy, queue="partition").inc()
+                return False
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                queue.get_nowait()
+                queue.task_done()
+                dropped.labels(policy=self.overflow_policy, queue="partition").inc()
+            else:
+                blocked.inc()
+
+        await queue.put(item)
+        queue_depth.labels(partition=str(index)).set(queue.qsize())
+        return True
+
+    async def _work(self, index: int, queue: asyncio.Queue):
+        depth = queue_depth.labels(partition=str(index))
+        while True:
+            enqueued_at, args = await queue.get()
+            queue_wait.observe(time.monotonic() - enqueued_at)
+            depth.set(queue.qsize())
+            try:
+                await self.handler(*args)
+            except Exception as e:
+                logger.error(f"Error handling dispatched message: {e}")
+            finally:
+                queue.task_done()
@@ -0,0 +1,75 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points of (x, y)
+    that keep the visual shape of the series. x must be ascending.
+
+    The first and last points are always kept. The interior is split into
+    threshold - 2 buckets; from each bucket the point forming the largest
+    triangle with the previously kept point and the mean of the next bucket
+    is chosen. Areas are computed with NumPy per bucket, so the Python loop
+    runs `threshold` times regardless of the series length.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - next_x) * (by - y[a]) - (x[a] - bx) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(
+    rows: List[Dict],
+    max_points: int,
+    fields: Sequence[str] = ("temp_c", "hum_pct"),
+    x_field: str = "ts",
+) -> List[Dict]:
+    """
+    Reduce rows (ascending by `x_field`) to about `max_points` per field.
+    LTTB runs on each field separately, skipping rows where it is null, and
+    the global min and max of each field are always kept. Returns the union
+    of the selected rows in order, so at most len(fields) * (max_points + 2).
+    """
+    if len(rows) <= max_points:
+        return rows
+
+    x = np.fromiter((row[x_field].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    keep = []
+    for field in fields:
+        y = np.fromiter(
+            (np.nan if row[field] is None else row[field] for row in rows),
+            dtype=np.float64,
+            count=len(rows),
+        )
+        valid = np.flatnonzero(~np.isnan(y))
+        if not len(valid):
+            continue
+        picked = valid[lttb_indices(x[valid], y[valid], max_points)]
+        extremes = valid[[int(y[valid].argmin()), int(y[valid].argmax())]]
+        keep.append(picked)
+        keep.append(extremes)
+
+    if not keep:
+        return rows[:max_points]
+    return [rows[i] for i in np.unique(np.concatenate(keep))]
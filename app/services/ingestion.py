@@ -1,38 +1,80 @@
-import json
 import logging
-from datetime import datetime
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
-from app.core.db import engine
-from app.models import Telemetry, Device
-from app.core.redis import get_redis
-from sqlmodel import select
+import time
+from typing import Union
+from app.core.config import settings
+from app.core.logging import SampledLog, log_event
+from app.core.metrics import ingest_stage_latency
+from app.core.redis import execute_scripted, load_scripts
+from app.services.dedup import duplicate_filter
+from app.services.device_registry import device_registry
+from app.services.device_state import device_state
+from app.services.latest_telemetry import latest_telemetry
+from app.services.mqtt_service import mqtt_service
+from app.services.telemetry_archive import telemetry_archive
+from app.services.telemetry_codec import DecodeError, build_record, decode_payload, encode_message
+from app.services.telemetry_stats import telemetry_stats
+from app.services.telemetry_stream import telemetry_stream
+from app.services.telemetry_writer import telemetry_writer
 
 logger = logging.getLogger(__name__)
 
-async def process_telemetry(device_id_str: str, payload_str: str):
+decode_latency = ingest_stage_latency.labels(stage="decode")
+lookup_latency = ingest_stage_latency.labels(stage="device_lookup")
+publish_latency = ingest_stage_latency.labels(stage="redis_publish")
+
+# Per-message logs are sampled so they cannot flood the log or cost throughput
+log_ingested = SampledLog(logger, logging.INFO, settings.INGEST_LOG_SAMPLE_RATE)
+log_invalid = SampledLog(logger, logging.WARNING, settings.INGEST_LOG_SAMPLE_RATE)
+log_unknown = SampledLog(logger, logging.WARNING, settings.INGEST_LOG_SAMPLE_RATE)
+
+async def start_ingestion():
     """
-    Validate, Store to DB, Publish to Redis
+    Start the telemetry pipeline: DB writers first, then the MQTT consumer.
+    Runs either inside the API process or in the standalone worker (app.ingest).
     """
-    print(f"📥 INGESTION: Processing telemetry for device: {device_id_str}", flush=True)
+    await device_registry.start()
     try:
-        data = json.loads(payload_str)
-        print(f"📥 INGESTION: Payload parsed successfully", flush=True)
-    except json.JSONDecodeError:
-        print(f"❌ INGESTION: Invalid JSON!", flush=True)
-        logger.error("Invalid JSON telemetry")
-        return
+        # EVALSHA of the publish path; reloaded on demand if this fails
+        await load_scripts()
+    except Exception as e:
+        logger.warning(f"Failed to preload Redis scripts: {e}")
+    await telemetry_writer.start()
+    await device_state.start()
+    await telemetry_stats.start()
+    await telemetry_archive.start()
+    await mqtt_service.start(subscribe=True)
 
-    # Extract fields
+async def stop_ingestion():
+    await mqtt_service.stop()
+    # Drain buffered telemetry once no more messages can arrive
+    await telemetry_writer.stop()
+    await device_state.stop()
+    await telemetry_stats.stop()
+    await telemetry_archive.stop()
+    await device_registry.stop()
+
+async def process_telemetry(device_id_str: str, payload_raw: Union[bytes, str]):
+    """
+    Validate, queue for the batched DB writer, Publish to Redis
+    """
+    # Single typed parse of the device payload
     # Expected format: { ts, seq, temp_c, hum_pct, heater, fan, rssi, ... }
+    started = time.perf_counter()
+    try:
+        payload = decode_payload(payload_raw)
+    except DecodeError as e:
+        log_invalid("invalid telemetry payload", device=device_id_str, error=e)
+        return
+    decode_latency.observe(time.perf_counter() - started)
+
+    # Drop QoS1 redeliveries before any DB or Redis work
+    if duplicate_filter.is_duplicate(device_id_str, payload.ts, payload.seq):
+        log_event(logger, logging.DEBUG, "duplicate telemetry", device=device_id_str, seq=payload.seq, ts=payload.ts)
+        return
+
     # ts might be ISO string or absent (use now)
-    ts_val = datetime.utcnow()
-    if "ts" in data:
-        try:
-            ts_val = datetime.fromisoformat(data["ts"].replace('Z', '+00:00'))
-        except:
-            pass
-            
+    ts_val = payload.timestamp()
+
     # We need to find the internal UUID IDs for device and farm?
     # Or we assume device_id_str is the physical ID (serial) and we map it.
     # Topic has physical ID? Or UUID?
@@ -40,104 +82,41 @@ async def process_telemetry(device_id_str: str, payload_str: str):
     # User Example: "device_id": "INC-0001", "farm_id": "FARM-1"
     # These are likely string IDs. We need to look up the UUIDs in Postgres.
     
-    async with AsyncSession(engine) as session:
-        # Cache this lookup? For now, DB lookup.
-        # Find device by physical ID (device_id_str)
-        # Note: farm_id_str might be physical farm name or ID.
-        # Let's assume device lookup is enough if device_id is unique.
-        
-        # If the topic sends UUIDs, we can use them directly.
-        # But usually MQTT topics use human readable or serials.
-        # Let's try to map `device_id` (string) to `Device` record.
-        
-        stmt = select(Device).where(Device.device_id == device_id_str)
-        result = await session.execute(stmt)
-        device = result.scalars().first()
-        
-        if not device:
-            print(f"❌ INGESTION: Device not found in DB: {device_id_str}", flush=True)
-            logger.warning(f"Unknown device: {device_id_str}")
-            return
-        
-        print(f"✅ INGESTION: Device found! UUID: {device.id}", flush=True)
-            
-        # Create Telemetry Record
-        telemetry = Telemetry(
-            ts=ts_val,
-            device_id=device.id,
-            farm_id=device.farm_id, # Use the DB relation
-            seq=data.get("seq", 0),
-            temp_c=data.get("temp_c") or data.get("current_temp", 0.0),
-            hum_pct=data.get("hum_pct") or data.get("current_humidity", 0.0),
-            # New actuator state fields
-            primary_heater=data.get("primary_heater"),
-            secondary_heater=data.get("secondary_heater"),
-            exhaust_fan=data.get("exhaust_fan"),
-            sv_valve=data.get("sv_valve"),
-            fan=data.get("fan"),
-            turning_motor=data.get("turning_motor"),
-            limit_switch=data.get("limit_switch"),
-            door_light=data.get("door_light"),
-            ip=data.get("ip"),
-            # Legacy fields
-            heater=data.get("heater") or data.get("primary_heater", False),
-            motor_state=data.get("motor_state"),
-            uptime_s=data.get("uptime_s"),
-            rssi=data.get("rssi", 0),
-            payload=data
-        )
-        session.add(telemetry)
-        
-        # Update Device Last Seen
-        device.last_seen = ts_val
-        
-        # Update device settings from telemetry (sync from device → server)
-        if "temp_low" in data:
-            device.temp_low = data.get("temp_low")
-        if "temp_high" in data:
-            device.temp_high = data.get("temp_high")
-        if "humidity_temp" in data:
-            device.humidity_temp = data.get("humidity_temp")
-        if "sensor1_offset" in data:
-            device.sensor1_offset = data.get("sensor1_offset")
-        if "sensor2_offset" in data:
-            device.sensor2_offset = data.get("sensor2_offset")
-        if "motor_mode" in data:
-            device.motor_mode = data.get("motor_mode")
-        if "timer_sec" in data:
-            device.timer_sec = data.get("timer_sec")
-        
-        # Update device status to online
-        device.status = "online"
-        session.add(device)
-        
-        # Cache IDs before commit (commit expires objects)
-        device_uuid = str(device.id)
-        farm_uuid = str(device.farm_id) if device.farm_id else None
-        device_serial = device.device_id
-        
-        try:
-            await session.commit()
-        except IntegrityError:
-            logger.warning(f"Duplicate telemetry received for {device_id_str} at {ts_val}")
-            await session.rollback()
-            return
-        
-        # Publish to Redis for WebSockets
-        # Channel: telemetry:{farm_id} using UUID
-        if farm_uuid:
-            redis = await get_redis()
-            # Publish the enriched data (including internal UUIDs if needed by frontend)
-            # Or just forward the payload with some metadata
-            msg = {
-                "type": "telemetry",
-                "device_id": device_uuid,
-                "device_serial": device_serial,
-                "farm_id": farm_uuid,
-                "data": json.loads(telemetry.model_dump_json())
-            }
-            # redis.publish is async in aioredis/redis-py 4.2+?
-            await redis.publish(f"telemetry:{farm_uuid}", json.dumps(msg))
-            
-            logger.info(f"Ingested telemetry for {device_id_str}")
+    # Map the physical serial to the Device UUID / farm via the in-memory
+    # registry; only cache misses (and expired entries) reach Postgres.
+    started = time.perf_counter()
+    device = await device_registry.resolve(device_id_str)
+    lookup_latency.observe(time.perf_counter() - started)
+    if not device:
+        log_unknown("unknown device", device=device_id_str)
+        return
+
+    # Create Telemetry Record (the raw payload bytes are stored untouched)
+    record = build_record(payload, payload_raw, device.id, device.farm_id, ts_val)
+
+    # Telemetry rows are written in batches by the telemetry writer
+    # Only the payload keys not already in typed columns are stored by default
+    row = record.db_row(settings.TELEMETRY_PAYLOAD_MODE)
+    telemetry_writer.add(row)
+
+    # Device last_seen/status and reported settings (sync from device → server)
+    # are coalesced in memory and written behind in bulk
+    device_state.observe(device.id, ts_val, payload.reported_settings())
+
+    # Latest-reading cache + stream append/publish for WebSockets, in one Redis round trip
+    # Channel: telemetry:{farm_id} using UUID
+    started = time.perf_counter()
+    message = encode_message(record, device_id_str) if device.farm_id else None
+
+    async def build(pipe):
+        # Same form as persisted, so a cache miss read from the DB is identical
+        await latest_telemetry.stage(pipe, device.id, ts_val, row)
+        if message is not None:
+            # Publish the enriched data (including internal UUIDs if needed by frontend),
+            # encoded once straight to bytes; also kept in the farm's stream for replay
+            await telemetry_stream.stage(pipe, device.farm_id, message)
+
+    await execute_scripted(build)
+    publish_latency.observe(time.perf_counter() - started)
 
+    log_ingested("ingested telemetry", device=device_id_str, device_uuid=device.id, ts=ts_val.isoformat())
@@ -0,0 +1,148 @@
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import msgspec
+from sqlalchemy import Uuid, column, true, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from app.core.metrics import registry
+from app.core.redis import RedisScript, execute_scripted, get_redis
+from app.models import Device, Telemetry
+
+logger = logging.getLogger(__name__)
+
+cache_hits = registry.counter(
+    "latest_telemetry_cache_hits_total", "Latest-telemetry lookups answered from Redis"
+)
+cache_misses = registry.counter(
+    "latest_telemetry_cache_misses_total", "Latest-telemetry lookups that fell back to Postgres"
+)
+
+DEVICE_KEY = "telemetry:latest:{}"
+
+# Only replace the cached reading with a newer one: out-of-order and
+# replayed messages must not roll the latest reading back.
+# KEYS: device hash  ARGV: ts (epoch ms), row JSON
+_SET_LATEST = RedisScript("""
+local current = redis.call('HGET', KEYS[1], 'ts')
+if current and tonumber(current) > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'ts', ARGV[1], 'data', ARGV[2])
+return 1
+""")
+
+_encoder = msgspec.json.Encoder()
+
+
+def _epoch_ms(ts: datetime) -> int:
+    return int(ts.timestamp() * 1000)
+
+
+def _encode(row: Dict[str, Any]) -> bytes:
+    # ts in UTC whatever the device's offset, as Postgres returns it, so
+    # cache hits and DB reads serialize alike
+    return _encoder.encode(dict(row, ts=row["ts"].astimezone(timezone.utc)))
+
+
+def latest_rows_query(device_ids: List[uuid.UUID]):
+    """
+    Latest telemetry row of each device: one LIMIT 1 probe of the
+    (device_id, ts DESC) index per device instead of DISTINCT ON + sort.
+    """
+    ids = values(column("id", Uuid), name="ids").data([(device_id,) for device_id in device_ids])
+    latest = (
+        select(Telemetry)
+        .where(Telemetry.device_id == ids.c.id)
+        .order_by(Telemetry.ts.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+    return select(aliased(Telemetry, latest)).select_from(ids).join(latest, true())
+
+
+class LatestTelemetryCache:
+    """
+    Latest telemetry row per device, kept in Redis by the ingestion path.
+
+    telemetry:latest:{device_id}       hash: ts (epoch ms), data (row JSON)
+
+    Readers fetch many devices with one pipelined round trip and only query
+    the hypertable for devices missing from the cache, which are then
+    written back.
+    """
+
+    async def stage(self, pipe, device_id: uuid.UUID, ts: datetime, row: Dict[str, Any]):
+        """Queue the update of one device's latest reading (a telemetry row) on a Redis pipeline."""
+        await self._stage_encoded(pipe, device_id, ts, _encode(row))
+
+    async def _stage_encoded(self, pipe, device_id: uuid.UUID, ts: datetime, data: bytes):
+        await _SET_LATEST.stage(pipe, [DEVICE_KEY.format(device_id)], [_epoch_ms(ts), data])
+
+    async def _store(self, rows: Dict[uuid.UUID, Tuple[datetime, bytes]]):
+        async def build(pipe):
+            for device_id, (ts, data) in rows.items():
+                await self._stage_encoded(pipe, device_id, ts, data)
+
+        await execute_scripted(build)
+
+    async def _from_db(self, db: AsyncSession, device_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, Any]]:
+        result = await db.execute(latest_rows_query(device_ids))
+        rows = {t.device_id: (t.ts, _encode(t.model_dump())) for t in result.scalars().all()}
+        try:
+            await self._store(rows)
+        except Exception as e:
+            logger.warning(f"Failed to backfill latest telemetry cache: {e}")
+        # Decoded from the cached form, so a miss returns what the next hit will
+        return {device_id: msgspec.json.decode(data) for device_id, (_, data) in rows.items()}
+
+    async def get_many(self, db: AsyncSession, device_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """Latest telemetry row (as a dict) for each device that has one."""
+        if not device_ids:
+            return {}
+        latest: Dict[uuid.UUID, Dict[str, Any]] = {}
+        missing = list(device_ids)
+        try:
+            redis = await get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                for device_id in device_ids:
+                    pipe.hget(DEVICE_KEY.format(device_id), "data")
+                cached = await pipe.execute()
+            missing = []
+            for device_id, data in zip(device_ids, cached):
+                if data is None:
+                    missing.append(device_id)
+                else:
+                    latest[device_id] = msgspec.json.decode(data)
+        except Exception as e:
+            logger.warning(f"Latest telemetry cache unavailable, reading from DB: {e}")
+
+        cache_hits.inc(len(latest))
+        if missing:
+            cache_misses.inc(len(missing))
+            latest.update(await self._from_db(db, missing))
+        return latest
+
+    async def get_farm(self, db: AsyncSession, farm_id: uuid.UUID) -> List[Dict[str, Any]]:
+        """Latest telemetry of every device currently in the farm that has reported."""
+        # The farm's devices come from Postgres (cheap primary lookup), so
+        # devices that have not reported lately or just moved in are included;
+        # only the cache misses among them are read from the hypertable
+        result = await db.execute(select(Device.id).where(Device.farm_id == farm_id))
+        device_ids = list(result.scalars().all())
+        latest = await self.get_many(db, device_ids)
+        return [latest[device_id] for device_id in device_ids if device_id in latest]
+
+    async def forget(self, device_id: uuid.UUID):
+        try:
+            redis = await get_redis()
+            await redis.delete(DEVICE_KEY.format(device_id))
+        except Exception as e:
+            logger.warning(f"Failed to drop latest telemetry of device {device_id}: {e}")
+
+
+latest_telemetry = LatestTelemetryCache()
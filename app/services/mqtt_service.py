@@ -1,40 +1,106 @@
 import asyncio
 import json
 import logging
+import time
 from typing import Any, Callable, Optional, Dict
 import aiomqtt
 from app.core.config import settings
+from app.core.logging import SampledLog
+from app.core.metrics import ingest_stage_latency
+from app.services.dispatcher import PartitionedDispatcher, dropped
 
 logger = logging.getLogger(__name__)
 
+# Receive -> handed to a partition, including any backpressure wait
+receive_latency = ingest_stage_latency.labels(stage="mqtt_receive")
+log_dropped = SampledLog(logger, logging.WARNING, settings.INGEST_LOG_SAMPLE_RATE)
+
+TELEMETRY_TOPIC = "incubators/+/telemetry"
+# Backoff between reconnect attempts after the broker connection drops (seconds)
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+def telemetry_subscription() -> str:
+    """
+    Topic filter used for telemetry. With MQTT_SHARED_GROUP set, the broker
+    load-balances messages across every subscriber in the group
+    ($share/<group>/incubators/+/telemetry, MQTT v5).
+    """
+    if settings.MQTT_SHARED_GROUP:
+        return f"$share/{settings.MQTT_SHARED_GROUP}/{TELEMETRY_TOPIC}"
+    return TELEMETRY_TOPIC
+
+def max_queued_messages() -> int:
+    """
+    Bound of aiomqtt's receive buffer. With the "block" policy, backpressure
+    from full partitions moves the backlog into that buffer, so it is bounded
+    by default to as many messages as the partitions hold. Messages arriving
+    while it is full are lost (see ReceiveQueue): the broker is not slowed
+    down, QoS1 only covers delivery up to this process.
+    """
+    if settings.MQTT_MAX_QUEUED_MESSAGES is not None:
+        return settings.MQTT_MAX_QUEUED_MESSAGES
+    return settings.INGEST_PARTITIONS * settings.INGEST_QUEUE_SIZE
+
+class ReceiveQueue(asyncio.Queue):
+    """
+    aiomqtt's receive buffer. When it is full aiomqtt discards the message
+    (already PUBACKed for QoS1) and logs a warning per message; the drop is
+    counted in ingest_dropped_messages_total instead, with a sampled log.
+    """
+
+    def put_nowait(self, item: aiomqtt.Message):
+        try:
+            super().put_nowait(item)
+        except asyncio.QueueFull:
+            dropped.labels(policy=settings.INGEST_OVERFLOW_POLICY, queue="mqtt_receive").inc()
+            log_dropped("MQTT receive buffer full, dropped telemetry", topic=item.topic.value)
+
 class MQTTService:
     def __init__(self):
         self.client: Optional[aiomqtt.Client] = None
         self.is_connected = False
+        self.dispatcher = PartitionedDispatcher(
+            settings.INGEST_PARTITIONS,
+            self.handle_telemetry,
+            queue_size=settings.INGEST_QUEUE_SIZE,
+            overflow_policy=settings.INGEST_OVERFLOW_POLICY,
+        )
+        self._loop_task: Optional[asyncio.Task] = None
 
-    async def start(self):
-        import sys
-        print(f"🔌 MQTT Starting - connecting to {settings.MQTT_BROKER}:{settings.MQTT_PORT}", flush=True)
-        sys.stdout.flush()
+    async def start(self, subscribe: bool = True):
+        logger.info(f"Connecting to MQTT broker {settings.MQTT_BROKER}:{settings.MQTT_PORT}")
         self.client = aiomqtt.Client(
             hostname=settings.MQTT_BROKER,
             port=settings.MQTT_PORT,
+            # Shared subscriptions are an MQTT v5 feature
+            protocol=aiomqtt.ProtocolVersion.V5 if settings.MQTT_SHARED_GROUP else None,
+            max_queued_incoming_messages=max_queued_messages() or None,
+            queue_type=ReceiveQueue,
             # username=settings.MQTT_USERNAME,
             # password=settings.MQTT_PASSWORD
         )
         try:
             await self.client.__aenter__()
             self.is_connected = True
-            print("✅ MQTT Connected to Broker!", flush=True)
-            print(f"✅ Subscribed to: incubators/+/telemetry", flush=True)
             logger.info("Connected to MQTT Broker")
-            # Start subscription loop in background
-            asyncio.create_task(self._subscribe_loop())
+            if subscribe:
+                self.dispatcher.start()
+                # Start subscription loop in background
+                self._loop_task = asyncio.create_task(self._subscribe_loop())
         except Exception as e:
-            print(f"❌ MQTT Connection Failed: {e}", flush=True)
             logger.error(f"Failed to connect to MQTT: {e}")
 
     async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+            # Finish messages already handed to the partitions
+            await self.dispatcher.stop(drain=True)
         if self.client:
             await self.client.__aexit__(None, None, None)
             self.is_connected = False
@@ -44,39 +110,65 @@ class MQTTService:
         if not self.is_connected or not self.client:
             logger.warning("MQTT not connected, cannot publish")
             return
-        
+
         if isinstance(payload, dict) or isinstance(payload, list):
             payload = json.dumps(payload)
-        
+
         await self.client.publish(topic, payload, qos=qos)
 
     async def _subscribe_loop(self):
         # Subscribe to all telemetry topics
         # Topic structure: incubators/{device_id}/telemetry
-        topic = "incubators/+/telemetry"
-        
+        topic = telemetry_subscription()
+
         if not self.client:
             return
 
-        await self.client.subscribe(topic, qos=1)
-        logger.info(f"Subscribed to {topic}")
-
-        async for message in self.client.messages:
+        delay = RECONNECT_MIN_DELAY
+        while True:
             try:
-                payload = message.payload.decode()
-                topic_parts = message.topic.value.split("/") 
-                # incubators, device_id, telemetry
-                logger.info(f"📨 MQTT Message received on topic: {message.topic.value}")
-                if len(topic_parts) == 3:
-                    device_id = topic_parts[1]
-                    logger.info(f"📊 Telemetry from device: {device_id}")
-                    logger.info(f"📦 Payload: {payload[:200]}...")  # First 200 chars
-                    await self.handle_telemetry(device_id, payload)
-            except Exception as e:
-                logger.error(f"Error processing MQTT message: {e}")
-
-    async def handle_telemetry(self, device_id: str, payload: str):
-        logger.info(f"✅ Processing telemetry for device: {device_id}")
+                if not self.is_connected:
+                    await self.client.__aenter__()
+                    self.is_connected = True
+                    logger.info("Reconnected to MQTT Broker")
+                # Clean session: subscriptions do not survive a reconnect
+                await self.client.subscribe(topic, qos=1)
+                logger.info(f"Subscribed to {topic}")
+                delay = RECONNECT_MIN_DELAY
+                async for message in self.client.messages:
+                    await self._handle_message(message)
+            except aiomqtt.MqttError as e:
+                # Broker gone: the loop must outlive it, or ingestion silently stops
+                self.is_connected = False
+                logger.error(f"MQTT connection lost: {e}; reconnecting in {delay:.0f}s")
+                try:
+                    await self.client.__aexit__(None, None, None)
+                except Exception:
+                    pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _handle_message(self, message: aiomqtt.Message):
+        started = time.perf_counter()
+        try:
+            # Raw bytes are handed to the typed decoder as-is
+            payload = message.payload
+            # message.topic is the publish topic, without the $share prefix
+            topic_parts = message.topic.value.split("/")
+            # incubators, device_id, telemetry
+            if len(topic_parts) == 3:
+                device_id = topic_parts[1]
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"MQTT message on {message.topic.value}: {payload[:200]!r}")
+                # Same device -> same partition, so per-device order is kept.
+                # Blocks here when the partition is full (backpressure).
+                if not await self.dispatcher.submit(device_id, device_id, payload):
+                    log_dropped("ingestion queue full, dropped telemetry", device=device_id)
+                receive_latency.observe(time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Error processing MQTT message: {e}")
+
+    async def handle_telemetry(self, device_id: str, payload: bytes):
         from app.services.ingestion import process_telemetry
         await process_telemetry(device_id, payload)
 
@@ -0,0 +1,286 @@
+import fcntl
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import msgspec
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.telemetry_codec import TelemetryRecord
+
+logger = logging.getLogger(__name__)
+
+journal_bytes = registry.gauge(
+    "ingest_journal_bytes", "Bytes of telemetry spilled to the local journal"
+)
+journal_segments = registry.gauge(
+    "ingest_journal_segments", "Segment files in the local journal"
+)
+spilled_rows = registry.counter(
+    "ingest_journal_spilled_rows_total", "Telemetry rows written to the local journal"
+)
+discarded_bytes = registry.counter(
+    "ingest_journal_discarded_bytes_total", "Journal bytes deleted to stay under the disk limit"
+)
+corrupt_lines = registry.counter(
+    "ingest_journal_corrupt_lines_total", "Unreadable journal lines skipped during replay"
+)
+dead_letter_rows = registry.counter(
+    "ingest_journal_dead_letter_rows_total", "Telemetry rows Postgres refused, moved to the dead-letter segments"
+)
+
+SEGMENT_SUFFIX = ".ndjson"
+LOCK_FILE = ".lock"
+# Under root; never replayed nor adopted, kept for inspection
+DEAD_LETTER_DIR = "dead-letter"
+
+
+class SpillJournal:
+    """
+    Append-only, segment-rotated journal of telemetry rows (one JSON line
+    per row) used while Postgres is down or too slow.
+
+    Writes go to the active segment and are fsynced at most every
+    `fsync_interval` seconds. A segment is closed once it exceeds
+    `segment_bytes`; when the journal grows past `max_bytes` the oldest
+    closed segments are deleted. Methods are blocking and thread-safe so
+    callers can run them in `asyncio.to_thread`.
+
+    Several ingest workers may share `root` (replicas on one volume): each
+    process writes to its own `{root}/{hostname}-{pid}` directory, held
+    under an exclusive flock. seal() also adopts the directories whose
+    lock is free (their process is gone), so their segments are replayed
+    by a live worker; a process only ever reads or deletes segments of
+    directories it holds the lock of.
+
+    Rows Postgres refuses on replay (device deleted meanwhile, value out of
+    a column's range) are appended to `{root}/dead-letter/{hostname}-{pid}`
+    segments instead, which are never replayed nor counted in `max_bytes`.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int, fsync_interval: float):
+        self.root = directory
+        self.directory = os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}")
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        # directory -> open lock file (own directory and adopted ones)
+        self._held: Dict[str, Any] = {}
+        self._active = None
+        self._active_path: Optional[str] = None
+        self._active_size = 0
+        self._last_fsync = 0.0
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder(TelemetryRecord)
+
+    def _try_lock(self, directory: str) -> bool:
+        if directory in self._held:
+            return True
+        try:
+            f = open(os.path.join(directory, LOCK_FILE), "a")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Held by a live worker
+            f.close()
+            return False
+        self._held[directory] = f
+        return True
+
+    def _claim(self):
+        """Lock this process's own directory before its first write."""
+        if self.directory not in self._held:
+            os.makedirs(self.directory, exist_ok=True)
+            if not self._try_lock(self.directory):
+                raise RuntimeError(f"Telemetry journal {self.directory} is locked by another process")
+
+    def _adopt_orphans(self):
+        if not os.path.isdir(self.root):
+            return
+        # Segments written directly under root predate per-process directories
+        candidates = [self.root] + [
+            entry.path for entry in os.scandir(self.root)
+            if entry.is_dir() and entry.path != self.directory and entry.name != DEAD_LETTER_DIR
+        ]
+        for directory in candidates:
+            if directory not in self._held and self._try_lock(directory):
+                logger.info(f"Adopted telemetry journal {directory}")
+
+    def _release_empty(self):
+        """Give back adopted directories once their segments are replayed."""
+        for directory in list(self._held):
+            if directory == self.directory or self._dir_segments(directory):
+                continue
+            f = self._held.pop(directory)
+            if directory != self.root:
+                try:
+                    os.remove(os.path.join(directory, LOCK_FILE))
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+            f.close()
+
+    @staticmethod
+    def _dir_segments(directory: str) -> List[str]:
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(directory, name) for name in names if name.endswith(SEGMENT_SUFFIX)]
+
+    def _segments(self) -> List[str]:
+        """Segments of the held directories, oldest first."""
+        segments = [path for directory in self._held for path in self._dir_segments(directory)]
+        return sorted(segments, key=os.path.basename)
+
+    def _open_segment(self):
+        self._claim()
+        # Zero-padded nanosecond timestamps sort in creation order
+        self._active_path = os.path.join(self.directory, f"{time.time_ns():020d}{SEGMENT_SUFFIX}")
+        self._active = open(self._active_path, "ab")
+        self._active_size = 0
+
+    def _close_active(self):
+        if self._active is None:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        if self._active_size == 0:
+            os.remove(self._active_path)
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+
+    def append(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        data = b"".join(self._encoder.encode(row) + b"\n" for row in rows)
+        with self._lock:
+            if self._active is None:
+                self._open_segment()
+            self._active.write(data)
+            self._active_size += len(data)
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                self._active.flush()
+                os.fsync(self._active.fileno())
+                self._last_fsync = now
+            journal_bytes.inc(len(data))
+            if self._active_size >= self.segment_bytes:
+                self._close_active()
+                self._enforce_limit()
+        spilled_rows.inc(len(rows))
+
+    def dead_letter(self, rows: List[Dict[str, Any]]):
+        """Set aside rows that can never be written (see class docstring)."""
+        if not rows:
+            return
+        data = b"".join(self._encoder.encode(row) + b"\n" for row in rows)
+        directory = os.path.join(self.root, DEAD_LETTER_DIR)
+        path = os.path.join(directory, os.path.basename(self.directory) + SEGMENT_SUFFIX)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        dead_letter_rows.inc(len(rows))
+
+    def sync(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.flush()
+                os.fsync(self._active.fileno())
+                self._last_fsync = time.monotonic()
+
+    def seal(self) -> List[str]:
+        """
+        Close the active segment and return all segments to replay, oldest
+        first: this process's and those of adopted orphan directories.
+        """
+        with self._lock:
+            self._close_active()
+            self._adopt_orphans()
+            self._release_empty()
+            segments = self._segments()
+            self._update_gauges(segments)
+            return segments
+
+    def read_segment(self, path: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the rows of a closed segment in lists of at most `batch_size`."""
+        batch = []
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(self._decoder.decode(line).to_row())
+                except (msgspec.DecodeError, msgspec.ValidationError):
+                    # Torn write from a crash
+                    corrupt_lines.inc()
+                    continue
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def remove(self, path: str):
+        with self._lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._release_empty()
+            self._update_gauges(self._segments())
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size(self._segments())
+
+    def close(self):
+        with self._lock:
+            self._close_active()
+            self._release_empty()
+
+    def _size(self, segments: List[str]) -> int:
+        total = 0
+        for path in segments:
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _enforce_limit(self):
+        segments = self._segments()
+        total = self._size(segments)
+        for path in segments:
+            if total <= self.max_bytes or path == self._active_path:
+                break
+            size = os.path.getsize(path)
+            os.remove(path)
+            total -= size
+            discarded_bytes.inc(size)
+            logger.error(f"Telemetry journal over {self.max_bytes} bytes, discarded {path}")
+        self._update_gauges(self._segments())
+
+    def _update_gauges(self, segments: List[str]):
+        journal_segments.set(len(segments))
+        journal_bytes.set(self._size(segments))
+
+
+spill_journal = SpillJournal(
+    directory=settings.INGEST_JOURNAL_DIR,
+    segment_bytes=settings.INGEST_JOURNAL_SEGMENT_MB * 1024 * 1024,
+    max_bytes=settings.INGEST_JOURNAL_MAX_MB * 1024 * 1024,
+    fsync_interval=settings.INGEST_JOURNAL_FSYNC_INTERVAL,
+)
@@ -0,0 +1,551 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import msgspec
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import registry
+from app.models import Telemetry
+# The telemetry_archive table (one row per archived chunk)
+from app.models import TelemetryArchive as ArchivedChunk
+from app.services.telemetry_export import BOOLEAN_FIELDS, EXPORT_COLUMNS, stream_row_chunks
+from app.services.telemetry_storage import MIN_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+archived_rows = registry.counter(
+    "telemetry_archived_rows_total", "Telemetry rows moved from the hypertable to the Parquet archive"
+)
+archive_read_latency = registry.histogram(
+    "telemetry_archive_read_seconds", "Time spent reading one merged batch of archived telemetry"
+)
+
+# Row columns stored in the files; farm_id/device_id/month are path partitions
+ARCHIVE_SCHEMA = pa.schema(
+    [
+        ("ts", pa.timestamp("us", tz="UTC")),
+        ("seq", pa.int64()),
+        ("temp_c", pa.float64()),
+        ("hum_pct", pa.float64()),
+        *((name, pa.bool_()) for name in BOOLEAN_FIELDS),
+        ("motor_state", pa.string()),
+        ("uptime_s", pa.int64()),
+        ("rssi", pa.int64()),
+        ("ip", pa.string()),
+        # JSON text
+        ("payload", pa.string()),
+    ]
+)
+PARTITION_COLUMNS = ("farm_id", "device_id")
+NO_FARM = "none"
+
+# Files are written under this suffix and renamed once their chunk is recorded
+STAGED_SUFFIX = ".staged"
+ARCHIVE_ROW_GROUP_ROWS = 65536
+
+# Any constant shared by all archiver instances
+ADVISORY_LOCK_KEY = 0x7E1E_A4C1
+# How long a process trusts its cached archive boundary
+BOUNDARY_TTL = 30.0
+
+_table = Telemetry.__table__
+_encoder = msgspec.json.Encoder()
+
+
+def as_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is None:
+        # Query parameters without an offset are taken as UTC
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _month(ts: datetime) -> str:
+    return ts.astimezone(timezone.utc).strftime("%Y-%m")
+
+
+def _filesystem(uri: str) -> Tuple[pafs.FileSystem, str]:
+    """Local directory, or s3://bucket/prefix on the MinIO endpoint."""
+    if uri.startswith("s3://"):
+        fs = pafs.S3FileSystem(
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            endpoint_override=settings.MINIO_ENDPOINT,
+            scheme="https" if settings.MINIO_SECURE else "http",
+            allow_bucket_creation=True,
+        )
+        return fs, uri[len("s3://"):].rstrip("/")
+    return pafs.LocalFileSystem(), os.path.abspath(uri)
+
+
+class TelemetryArchive:
+    """
+    Cold tier of the telemetry hypertable.
+
+    A background job moves every chunk older than `after_days` into zstd
+    Parquet files laid out as
+
+        {root}/farm_id={farm}/device_id={device}/month={YYYY-MM}/{chunk}.parquet
+
+    records it in telemetry_archive and drops it. Rows with ts before the
+    archive boundary (max(range_end) of the archived chunks) are read from
+    the files, newer rows from Postgres, so callers split a range at the
+    boundary, cap the archive read at it and concatenate both sides.
+    """
+
+    def __init__(self, uri: str, after_days: int, interval: float):
+        self.uri = uri
+        self.after_days = after_days
+        self.interval = interval
+        self.fs, self.root = _filesystem(uri)
+        self._boundary: Optional[datetime] = None
+        self._boundary_expires = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        # Staged files of an earlier run may be left over
+        self._recover = True
+
+    def _path(self, *parts: str) -> str:
+        return "/".join((self.root,) + parts)
+
+    # Boundary
+
+    async def boundary(self, db: Optional[AsyncSession] = None) -> Optional[datetime]:
+        """Rows older than this are only in the archive (None: nothing archived)."""
+        now = time.monotonic()
+        if now < self._boundary_expires:
+            return self._boundary
+        query = select(func.max(ArchivedChunk.range_end))
+        if db is not None:
+            boundary = (await db.execute(query)).scalar()
+        else:
+            async with AsyncSession(engine) as session:
+                boundary = (await session.execute(query)).scalar()
+        self._boundary = boundary
+        self._boundary_expires = now + BOUNDARY_TTL
+        return boundary
+
+    # Reads
+
+    def _device_dirs(self, device_id: Optional[uuid.UUID], farm_id: Optional[uuid.UUID]) -> List[str]:
+        fs = self.fs
+        if farm_id is not None:
+            selector = pafs.FileSelector(self._path(f"farm_id={farm_id}"), allow_not_found=True)
+            dirs = [i.path for i in fs.get_file_info(selector) if i.type == pafs.FileType.Directory]
+            if device_id is not None:
+                dirs = [d for d in dirs if d.endswith(f"/device_id={device_id}")]
+            return dirs
+        # The device may have moved between farms: probe it under every farm
+        farms = fs.get_file_info(pafs.FileSelector(self.root, allow_not_found=True))
+        candidates = [f"{i.path}/device_id={device_id}" for i in farms if i.type == pafs.FileType.Directory]
+        return [i.path for i in fs.get_file_info(candidates) if i.type == pafs.FileType.Directory]
+
+    def _files_by_month(
+        self,
+        device_id: Optional[uuid.UUID],
+        farm_id: Optional[uuid.UUID],
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+    ) -> Dict[str, List[str]]:
+        first = _month(start_time) if start_time else ""
+        last = _month(end_time) if end_time else "9999-99"
+        months: Dict[str, List[str]] = {}
+        for device_dir in self._device_dirs(device_id, farm_id):
+            selector = pafs.FileSelector(device_dir, recursive=True, allow_not_found=True)
+            for info in self.fs.get_file_info(selector):
+                if info.type != pafs.FileType.File or not info.path.endswith(".parquet"):
+                    continue
+                month = info.path.rsplit("/month=", 1)[1].split("/", 1)[0]
+                if first <= month <= last:
+                    months.setdefault(month, []).append(info.path)
+        return months
+
+    def _file_batches(
+        self,
+        path: str,
+        columns: List[str],
+        start_time: Optional[datetime],
+        upper: Optional[datetime],
+        inclusive: bool,
+        descending: bool,
+    ) -> Iterator[pa.Table]:
+        """
+        One file's rows in [start_time, upper] (or [start_time, upper)) in ts
+        order, a batch at a time. Row groups outside the range are skipped
+        using their ts statistics.
+        """
+        pf = pq.ParquetFile(path, filesystem=self.fs)
+        ts_index = pf.schema_arrow.get_field_index("ts")
+        groups = []
+        for i in range(pf.metadata.num_row_groups):
+            stats = pf.metadata.row_group(i).column(ts_index).statistics
+            if stats is not None and stats.has_min_max:
+                if start_time and stats.max < start_time:
+                    continue
+                if upper and (stats.min > upper or (not inclusive and stats.min >= upper)):
+                    continue
+            groups.append(i)
+        partitions = dict(part.split("=", 1) for part in path.split("/") if "=" in part)
+        batch_rows = settings.TELEMETRY_EXPORT_CHUNK_ROWS
+
+        def batches():
+            if not descending:
+                for batch in pf.iter_batches(batch_size=batch_rows, row_groups=groups, columns=columns):
+                    yield pa.Table.from_batches([batch])
+                return
+            # Newest first: row groups (bounded by ARCHIVE_ROW_GROUP_ROWS) backwards
+            for i in reversed(groups):
+                group = pf.read_row_group(i, columns=columns)
+                group = group.take(pa.array(range(group.num_rows - 1, -1, -1)))
+                for offset in range(0, group.num_rows, batch_rows):
+                    yield group.slice(offset, batch_rows)
+
+        for table in batches():
+            ts = table.column("ts")
+            mask = None
+            if start_time:
+                mask = pc.greater_equal(ts, start_time)
+            if upper:
+                below = pc.less_equal(ts, upper) if inclusive else pc.less(ts, upper)
+                mask = below if mask is None else pc.and_(mask, below)
+            if mask is not None:
+                table = table.filter(mask)
+            if table.num_rows:
+                table = table.append_column("device_id", pa.repeat(partitions["device_id"], table.num_rows))
+                yield table.append_column("farm_id", pa.repeat(partitions["farm_id"], table.num_rows))
+
+    def _merge_month(
+        self,
+        paths: List[str],
+        columns: Sequence[str],
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        before: Optional[datetime],
+        descending: bool,
+    ) -> Iterator[pa.Table]:
+        """
+        K-way merge of a month's files (each sorted by ts, one device per
+        file) on (ts, device_id), holding one batch per file at a time.
+        """
+        file_columns = [name for name in columns if name not in PARTITION_COLUMNS]
+        if "ts" not in file_columns:
+            file_columns.insert(0, "ts")
+        if before and (end_time is None or before <= end_time):
+            upper, inclusive = before, False
+        else:
+            upper, inclusive = end_time, True
+        sources = [
+            self._file_batches(path, file_columns, start_time, upper, inclusive, descending) for path in paths
+        ]
+        heads: Dict[int, pa.Table] = {}
+        for i, source in enumerate(sources):
+            head = next(source, None)
+            if head is not None:
+                heads[i] = head
+        order = "descending" if descending else "ascending"
+        while heads:
+            # Every row up to the earliest batch end can be emitted: the rest
+            # of that file comes after it, and so does the rest of the others
+            last = [head.column("ts")[-1].as_py() for head in heads.values()]
+            watermark = max(last) if descending else min(last)
+            parts = []
+            for i in list(heads):
+                head = heads[i]
+                ts = head.column("ts")
+                taken = pc.sum(pc.greater_equal(ts, watermark) if descending else pc.less_equal(ts, watermark)).as_py() or 0
+                if taken:
+                    parts.append(head.slice(0, taken))
+                if taken == head.num_rows:
+                    head = next(sources[i], None)
+                    if head is None:
+                        del heads[i]
+                        continue
+                else:
+                    head = head.slice(taken)
+                heads[i] = head
+            table = pa.concat_tables(parts)
+            if len(parts) > 1:
+                table = table.sort_by([("ts", order), ("device_id", order)])
+            yield table
+
+    @staticmethod
+    def to_rows(table: pa.Table, columns: Sequence[str]) -> List[tuple]:
+        """Arrow table -> row tuples typed like the hypertable's."""
+        values = []
+        for name in columns:
+            column = table.column(name).to_pylist()
+            if name == "device_id":
+                column = [uuid.UUID(v) for v in column]
+            elif name == "farm_id":
+                column = [None if v == NO_FARM else uuid.UUID(v) for v in column]
+            elif name == "payload":
+                column = [None if v is None else msgspec.json.decode(v) for v in column]
+            values.append(column)
+        return list(zip(*values))
+
+    async def read(
+        self,
+        columns: Sequence[str],
+        device_id: Optional[uuid.UUID] = None,
+        farm_id: Optional[uuid.UUID] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+        descending: bool = False,
+    ) -> AsyncIterator[pa.Table]:
+        """
+        Archived rows of a device or farm in [start_time, end_time] and
+        before `before` (callers pass the archive boundary they split the
+        range at), as sorted Arrow tables of at most one batch per file:
+        memory stays bounded whatever the range.
+        """
+        start_time, end_time, before = as_utc(start_time), as_utc(end_time), as_utc(before)
+        upper = min(end_time, before) if end_time and before else end_time or before
+        months = await asyncio.to_thread(self._files_by_month, device_id, farm_id, start_time, upper)
+        for month in sorted(months, reverse=descending):
+            merged = self._merge_month(months[month], columns, start_time, end_time, before, descending)
+            try:
+                while True:
+                    started = time.perf_counter()
+                    table = await asyncio.to_thread(next, merged, None)
+                    if table is None:
+                        break
+                    archive_read_latency.observe(time.perf_counter() - started)
+                    yield table
+            finally:
+                merged.close()
+
+    async def read_page(
+        self,
+        device_id: uuid.UUID,
+        limit: int,
+        offset: int = 0,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+    ) -> List[Telemetry]:
+        """Newest-first page of a device's archived rows."""
+        rows: List[Telemetry] = []
+        async for table in self.read(
+            EXPORT_COLUMNS, device_id=device_id, start_time=start_time,
+            end_time=end_time, before=before, descending=True,
+        ):
+            if offset >= table.num_rows:
+                offset -= table.num_rows
+                continue
+            table = table.slice(offset, limit - len(rows))
+            offset = 0
+            rows.extend(Telemetry(**dict(zip(EXPORT_COLUMNS, row))) for row in self.to_rows(table, EXPORT_COLUMNS))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    async def forget(self, device_id: uuid.UUID):
+        """Delete a device's archived telemetry."""
+        for device_dir in await asyncio.to_thread(self._device_dirs, device_id, None):
+            await asyncio.to_thread(self.fs.delete_dir, device_dir)
+
+    # Archiver
+
+    async def start(self):
+        if self._running or not self.after_days:
+            return
+        if self.after_days < MIN_RETENTION_DAYS:
+            # Continuous aggregates would re-materialize buckets from dropped chunks
+            logger.error(f"TELEMETRY_ARCHIVE_AFTER_DAYS must be at least {MIN_RETENTION_DAYS}, archiver disabled")
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._archive_loop())
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _archive_loop(self):
+        while self._running:
+            try:
+                await self.archive_old_chunks()
+            except Exception as e:
+                logger.error(f"Telemetry archiver error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def archive_old_chunks(self) -> int:
+        """
+        Archive and drop every chunk that ended more than after_days ago,
+        oldest first. Stops at the first chunk that cannot be archived: the
+        boundary is the end of the newest archived chunk, so archiving past
+        a skipped one would hide its rows from both tiers.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.after_days)
+        # Session-level advisory lock: one archiver at a time across processes
+        async with engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            )).scalar()
+            if not locked:
+                return 0
+            try:
+                if self._recover:
+                    await self._recover_staged()
+                result = await lock_conn.execute(text("""
+                    SELECT chunk_schema, chunk_name, range_start, range_end
+                    FROM timescaledb_information.chunks
+                    WHERE hypertable_name = 'telemetry' AND range_end <= :cutoff
+                    ORDER BY range_start
+                """), {"cutoff": cutoff})
+                chunks = result.all()
+                await lock_conn.commit()
+                archived = 0
+                for schema, name, range_start, range_end in chunks:
+                    if not await self.archive_chunk(f"{schema}.{name}", name, range_start, range_end):
+                        break
+                    archived += 1
+                return archived
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                await lock_conn.commit()
+
+    def _write_file(self, rows: List[tuple], farm_id, device_id, month: str, chunk_name: str) -> str:
+        """Write a farm/device/month run of a chunk to its staging path."""
+        columns = dict(zip(EXPORT_COLUMNS, zip(*rows)))
+        columns["payload"] = [
+            None if v is None else _encoder.encode(v).decode() for v in columns["payload"]
+        ]
+        table = pa.table({name: columns[name] for name in ARCHIVE_SCHEMA.names}, schema=ARCHIVE_SCHEMA)
+        directory = self._path(
+            f"farm_id={farm_id or NO_FARM}", f"device_id={device_id}", f"month={month}"
+        )
+        self.fs.create_dir(directory, recursive=True)
+        path = f"{directory}/{chunk_name}.parquet{STAGED_SUFFIX}"
+        pq.write_table(
+            table,
+            path,
+            filesystem=self.fs,
+            compression="zstd",
+            use_dictionary=["motor_state", "ip"],
+            column_encoding={name: "RLE" for name in BOOLEAN_FIELDS},
+            # Newest-first reads load a row group at a time
+            row_group_size=ARCHIVE_ROW_GROUP_ROWS,
+        )
+        return path
+
+    def _promote(self, paths: List[str]):
+        """Make staged files visible to reads (once their chunk is recorded)."""
+        for path in paths:
+            self.fs.move(path, path[: -len(STAGED_SUFFIX)])
+
+    def _discard(self, paths: List[str]):
+        for path in paths:
+            try:
+                self.fs.delete_file(path)
+            except FileNotFoundError:
+                pass
+
+    async def _recover_staged(self):
+        """
+        Settle staged files left by an interrupted run: promote those of
+        chunks recorded as archived, delete the rest.
+        """
+        selector = pafs.FileSelector(self.root, recursive=True, allow_not_found=True)
+        infos = await asyncio.to_thread(self.fs.get_file_info, selector)
+        staged = [i.path for i in infos if i.type == pafs.FileType.File and i.path.endswith(STAGED_SUFFIX)]
+        if staged:
+            async with AsyncSession(engine) as session:
+                archived = set((await session.execute(select(ArchivedChunk.chunk_name))).scalars())
+            promote = [p for p in staged if p.rsplit("/", 1)[1].split(".parquet", 1)[0] in archived]
+            await asyncio.to_thread(self._promote, promote)
+            await asyncio.to_thread(self._discard, [p for p in staged if p not in promote])
+            logger.info(f"Archive recovery: {len(promote)} staged files promoted, {len(staged) - len(promote)} discarded")
+        self._recover = False
+
+    async def archive_chunk(self, chunk: str, chunk_name: str, range_start: datetime, range_end: datetime) -> bool:
+        """
+        Write one chunk to Parquet (one file per farm/device/month, named
+        after the chunk, so a re-run overwrites it), then record it and
+        drop it in one transaction. Files are written under a staging name
+        and only renamed into place after the commit. False when the chunk
+        changed meanwhile and is left for a later run.
+        """
+        c = _table.c
+        # One contiguous run per farm/device/month (a device that moved
+        # farms within the chunk would otherwise interleave)
+        query = (
+            select(*(c[name] for name in EXPORT_COLUMNS))
+            .where(c.ts >= range_start, c.ts < range_end)
+            .order_by(c.device_id.desc(), c.farm_id, c.ts.asc())
+        )
+        written = 0
+        paths: List[str] = []
+        key = None
+        group: List[tuple] = []
+        farm_idx, device_idx = EXPORT_COLUMNS.index("farm_id"), EXPORT_COLUMNS.index("device_id")
+        try:
+            async for rows in stream_row_chunks(query):
+                for row in rows:
+                    row_key = (row[farm_idx], row[device_idx], _month(row[0]))
+                    if row_key != key and group:
+                        paths.append(await asyncio.to_thread(self._write_file, group, *key, chunk_name))
+                        written += len(group)
+                        group = []
+                    key = row_key
+                    group.append(row)
+            if group:
+                paths.append(await asyncio.to_thread(self._write_file, group, *key, chunk_name))
+                written += len(group)
+
+            async with AsyncSession(engine) as session:
+                # Block late inserts into the chunk and make sure none slipped in
+                # while it was being written out
+                await session.execute(text(f"LOCK TABLE {chunk} IN SHARE MODE"))
+                count = (await session.execute(text(f"SELECT count(*) FROM {chunk}"))).scalar()
+                if count != written:
+                    logger.warning(f"Chunk {chunk} changed while archiving ({count} != {written} rows), retrying later")
+                    await session.rollback()
+                    await asyncio.to_thread(self._discard, paths)
+                    return False
+                session.add(ArchivedChunk(
+                    chunk_name=chunk_name, range_start=range_start, range_end=range_end,
+                    rows=written, files=len(paths),
+                ))
+                await session.execute(
+                    text("SELECT drop_chunks('telemetry', older_than => :end, newer_than => :start)"),
+                    {"start": range_start, "end": range_end},
+                )
+                await session.commit()
+        except Exception:
+            # Committed or not, the staged files are settled by the next run
+            self._recover = True
+            raise
+
+        try:
+            await asyncio.to_thread(self._promote, paths)
+        except Exception:
+            self._recover = True
+            raise
+        self._boundary_expires = 0.0
+        archived_rows.inc(written)
+        logger.info(f"Archived chunk {chunk} ({written} rows, {len(paths)} files)")
+        return True
+
+telemetry_archive = TelemetryArchive(
+    uri=settings.TELEMETRY_ARCHIVE_URI,
+    after_days=settings.TELEMETRY_ARCHIVE_AFTER_DAYS,
+    interval=settings.TELEMETRY_ARCHIVE_INTERVAL,
+)
@@ -0,0 +1,242 @@
+"""
+Typed telemetry decoding / encoding for the ingestion hot path.
+
+The device payload is parsed exactly once into a msgspec Struct. The
+original bytes are kept as `msgspec.Raw` and embedded as-is in both the DB
+`payload` column and the Redis/WebSocket message, so no field is decoded or
+re-encoded twice.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import Annotated, Any, Dict, Optional, Union
+
+import msgspec
+
+from app.services.device_state import SETTING_FIELDS
+
+UnsetFloat = Union[Optional[float], msgspec.UnsetType]
+UnsetInt = Union[Optional[int], msgspec.UnsetType]
+# Values of the INTEGER columns; anything wider fails decoding instead of the batch INSERT
+Int32 = Annotated[int, msgspec.Meta(ge=-2**31, le=2**31 - 1)]
+
+# Numeric ts above this are epoch milliseconds (1e11 s is the year 5138)
+EPOCH_MS_THRESHOLD = 1e11
+
+
+class TelemetryPayload(msgspec.Struct):
+    """
+    Device → server payload.
+    Expected format: { ts, seq, temp_c, hum_pct, heater, fan, rssi, ... }
+    Unknown keys are ignored here but preserved in the raw payload.
+    """
+    # ISO 8601 string or epoch seconds/milliseconds
+    ts: Union[str, int, float, None] = None
+    seq: Optional[Int32] = 0
+    temp_c: Optional[float] = None
+    # UNSET when absent: an explicit null is stored as null, absence as 0.0
+    current_temp: UnsetFloat = msgspec.UNSET
+    hum_pct: Optional[float] = None
+    current_humidity: UnsetFloat = msgspec.UNSET
+    # Actuator states
+    primary_heater: Optional[bool] = None
+    secondary_heater: Optional[bool] = None
+    exhaust_fan: Optional[bool] = None
+    sv_valve: Optional[bool] = None
+    fan: Optional[bool] = None
+    turning_motor: Optional[bool] = None
+    limit_switch: Optional[bool] = None
+    door_light: Optional[bool] = None
+    # Legacy fields
+    heater: Optional[bool] = None
+    motor_state: Optional[str] = None
+    uptime_s: Optional[Int32] = None
+    rssi: Optional[Int32] = 0
+    ip: Optional[str] = None
+    # Device settings (UNSET when not reported)
+    temp_low: UnsetFloat = msgspec.UNSET
+    temp_high: UnsetFloat = msgspec.UNSET
+    humidity_temp: UnsetFloat = msgspec.UNSET
+    sensor1_offset: UnsetFloat = msgspec.UNSET
+    sensor2_offset: UnsetFloat = msgspec.UNSET
+    motor_mode: UnsetInt = msgspec.UNSET
+    timer_sec: UnsetInt = msgspec.UNSET
+
+    def timestamp(self) -> datetime:
+        """Device timestamp as aware UTC, or now when absent/unparseable."""
+        if isinstance(self.ts, str) and self.ts:
+            try:
+                ts_val = datetime.fromisoformat(self.ts.replace('Z', '+00:00'))
+                if ts_val.tzinfo is None:
+                    ts_val = ts_val.replace(tzinfo=timezone.utc)
+                return ts_val
+            except ValueError:
+                pass
+        elif isinstance(self.ts, (int, float)) and not isinstance(self.ts, bool) and self.ts > 0:
+            # Epoch seconds, or milliseconds from devices that send Date.now()-style values
+            seconds = self.ts / 1000 if self.ts > EPOCH_MS_THRESHOLD else self.ts
+            try:
+                return datetime.fromtimestamp(seconds, timezone.utc)
+            except (OverflowError, OSError, ValueError):
+                pass
+        return datetime.now(timezone.utc)
+
+    def reported_settings(self) -> Dict[str, Any]:
+        return {
+            field: value
+            for field in SETTING_FIELDS
+            if (value := getattr(self, field)) is not msgspec.UNSET
+        }
+
+
+class TelemetryRecord(msgspec.Struct):
+    """One `telemetry` row; field order matches the Telemetry model."""
+    ts: datetime
+    device_id: uuid.UUID
+    farm_id: Optional[uuid.UUID]
+    seq: Optional[int]
+    temp_c: Optional[float]
+    hum_pct: Optional[float]
+    primary_heater: Optional[bool]
+    secondary_heater: Optional[bool]
+    exhaust_fan: Optional[bool]
+    sv_valve: Optional[bool]
+    fan: Optional[bool]
+    turning_motor: Optional[bool]
+    limit_switch: Optional[bool]
+    door_light: Optional[bool]
+    heater: Optional[bool]
+    motor_state: Optional[str]
+    uptime_s: Optional[int]
+    rssi: Optional[int]
+    ip: Optional[str]
+    payload: Optional[msgspec.Raw] = None
+
+    def to_row(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__struct_fields__}
+
+    def db_row(self, payload_mode: str = "full") -> Dict[str, Any]:
+        """
+        Row for the hypertable. payload_mode "residual" keeps only the payload
+        keys not already stored in a typed column, "none" drops the payload.
+        """
+        row = self.to_row()
+        if payload_mode == "none":
+            row["payload"] = None
+        elif payload_mode == "residual" and self.payload is not None:
+            row["payload"] = residual_payload(self)
+        return row
+
+
+class TelemetryMessage(msgspec.Struct):
+    """Message published on telemetry:{farm_id} for WebSocket clients."""
+    type: str
+    device_id: uuid.UUID
+    device_serial: str
+    farm_id: uuid.UUID
+    data: TelemetryRecord
+
+
+DecodeError = (msgspec.DecodeError, msgspec.ValidationError)
+
+# lax mode accepts e.g. "99.5" for floats and 0/1 for booleans, like the old dict lookups did
+_decoder = msgspec.json.Decoder(TelemetryPayload, strict=False)
+_encoder = msgspec.json.Encoder()
+
+
+def decode_payload(raw: Union[bytes, str]) -> TelemetryPayload:
+    """Parse a device payload. Raises one of `DecodeError` on bad input."""
+    return _decoder.decode(raw)
+
+
+def build_record(
+    payload: TelemetryPayload,
+    raw: Union[bytes, str],
+    device_id: uuid.UUID,
+    farm_id: Optional[uuid.UUID],
+    ts: datetime,
+) -> TelemetryRecord:
+    if isinstance(raw, str):
+        raw = raw.encode()
+    return TelemetryRecord(
+        ts=ts,
+        device_id=device_id,
+        farm_id=farm_id,
+        seq=payload.seq,
+        temp_c=payload.temp_c or (0.0 if payload.current_temp is msgspec.UNSET else payload.current_temp),
+        hum_pct=payload.hum_pct or (0.0 if payload.current_humidity is msgspec.UNSET else payload.current_humidity),
+        primary_heater=payload.primary_heater,
+        secondary_heater=payload.secondary_heater,
+        exhaust_fan=payload.exhaust_fan,
+        sv_valve=payload.sv_valve,
+        fan=payload.fan,
+        turning_motor=payload.turning_motor,
+        limit_switch=payload.limit_switch,
+        door_light=payload.door_light,
+        ip=payload.ip,
+        heater=payload.heater or (payload.primary_heater if payload.primary_heater is not None else False),
+        motor_state=payload.motor_state,
+        uptime_s=payload.uptime_s,
+        rssi=payload.rssi,
+        payload=msgspec.Raw(raw),
+    )
+
+
+# Payload keys mirrored by a same-named typed column (plus the legacy aliases)
+TYPED_PAYLOAD_KEYS = {
+    "seq": "seq",
+    "temp_c": "temp_c",
+    "current_temp": "temp_c",
+    "hum_pct": "hum_pct",
+    "current_humidity": "hum_pct",
+    "primary_heater": "primary_heater",
+    "secondary_heater": "secondary_heater",
+    "exhaust_fan": "exhaust_fan",
+    "sv_valve": "sv_valve",
+    "fan": "fan",
+    "turning_motor": "turning_motor",
+    "limit_switch": "limit_switch",
+    "door_light": "door_light",
+    "heater": "heater",
+    "motor_state": "motor_state",
+    "uptime_s": "uptime_s",
+    "rssi": "rssi",
+    "ip": "ip",
+}
+
+
+def residual_payload(record: TelemetryRecord) -> Optional[msgspec.Raw]:
+    """
+    The record's raw payload without the keys whose value is already in a
+    typed column (and without ts when it is the row's timestamp).
+    None when nothing is left.
+    """
+    try:
+        data = msgspec.json.decode(record.payload)
+    except msgspec.DecodeError:
+        return record.payload
+    if not isinstance(data, dict):
+        return record.payload
+    residual = {}
+    for key, value in data.items():
+        column = TYPED_PAYLOAD_KEYS.get(key)
+        if column is not None and getattr(record, column) == value:
+            continue
+        if key == "ts" and isinstance(value, (str, int, float)) and TelemetryPayload(ts=value).timestamp() == record.ts:
+            continue
+        residual[key] = value
+    if not residual:
+        return None
+    return msgspec.Raw(_encoder.encode(residual))
+
+
+def encode_message(record: TelemetryRecord, device_serial: str) -> bytes:
+    return _encoder.encode(
+        TelemetryMessage(
+            type="telemetry",
+            device_id=record.device_id,
+            device_serial=device_serial,
+            farm_id=record.farm_id,
+            data=record,
+        )
+    )
+
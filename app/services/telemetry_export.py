@@ -0,0 +1,245 @@
+import csv
+import io
+import logging
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence
+
+import msgspec
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Telemetry
+from app.schemas.telemetry import ACTUATOR_FIELDS
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+_table = Telemetry.__table__
+EXPORT_COLUMNS = tuple(c.name for c in _table.columns)
+
+_encoder = msgspec.json.Encoder()
+
+# Columnar exports carry the analytics columns only
+BOOLEAN_FIELDS = ACTUATOR_FIELDS + ("limit_switch", "heater")
+COLUMNAR_SCHEMA = pa.schema(
+    [
+        ("ts", pa.timestamp("us", tz="UTC")),
+        # Few distinct devices per export: dictionary-encoded strings
+        ("device_id", pa.dictionary(pa.int32(), pa.string())),
+        ("temp_c", pa.float64()),
+        ("hum_pct", pa.float64()),
+        *((name, pa.bool_()) for name in BOOLEAN_FIELDS),
+        ("rssi", pa.int32()),
+    ]
+)
+COLUMNAR_COLUMNS = tuple(COLUMNAR_SCHEMA.names)
+
+
+def telemetry_range_query(
+    device_id: Optional[uuid.UUID] = None,
+    farm_id: Optional[uuid.UUID] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    columns: Sequence[str] = EXPORT_COLUMNS,
+) -> Select:
+    """Core (not ORM) select of a telemetry range, oldest first."""
+    query = select(*(_table.c[name] for name in columns))
+    if device_id:
+        query = query.where(_table.c.device_id == device_id)
+    if farm_id:
+        query = query.where(_table.c.farm_id == farm_id)
+    if start_time:
+        query = query.where(_table.c.ts >= start_time)
+    if end_time:
+        query = query.where(_table.c.ts <= end_time)
+    return query.order_by(_table.c.ts.asc(), _table.c.device_id.asc())
+
+
+async def stream_row_chunks(query: Select, chunk_rows: int = 0) -> AsyncIterator[List[tuple]]:
+    """
+    Run `query` through an asyncpg server-side cursor and yield lists of at
+    most `chunk_rows` rows, so memory stays constant whatever the range.
+
+    Opens its own session: a StreamingResponse body runs after the request
+    dependencies (and their session) have been torn down.
+    """
+    chunk_rows = chunk_rows or settings.TELEMETRY_EXPORT_CHUNK_ROWS
+    async with AsyncSession(engine) as session:
+        result = await session.stream(query.execution_options(yield_per=chunk_rows))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def range_row_chunks(
+    columns: Sequence[str],
+    device_id: Optional[uuid.UUID] = None,
+    farm_id: Optional[uuid.UUID] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> AsyncIterator[List[tuple]]:
+    """
+    Row chunks of a telemetry range, oldest first: archived rows (before the
+    archive boundary) from Parquet, then the rest from the hypertable.
+    """
+    from app.services.telemetry_archive import as_utc, telemetry_archive
+
+    start_time, end_time = as_utc(start_time), as_utc(end_time)
+    boundary = await telemetry_archive.boundary()
+    if boundary and (start_time is None or start_time < boundary):
+        chunk_rows = settings.TELEMETRY_EXPORT_CHUNK_ROWS
+        async for table in telemetry_archive.read(columns, device_id, farm_id, start_time, end_time, before=boundary):
+            for offset in range(0, table.num_rows, chunk_rows):
+                yield telemetry_archive.to_rows(table.slice(offset, chunk_rows), columns)
+        if end_time and end_time < boundary:
+            return
+        start_time = boundary
+    query = telemetry_range_query(device_id, farm_id, start_time, end_time, columns)
+    async for rows in stream_row_chunks(query):
+        yield rows
+
+
+def encode_ndjson(rows: List[tuple]) -> bytes:
+    return b"".join(_encoder.encode(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        # The JSON payload column is written as a JSON string
+        return _encoder.encode(value).decode()
+    return value
+
+
+def encode_csv(rows: List[tuple], header: bool = False) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    return buf.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file object whose bytes are drained after every batch."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ColumnarEncoder:
+    """
+    Encodes row chunks as one Arrow record batch each, written either as
+    a Parquet row group or an Arrow IPC stream message. Only the current
+    batch is held in memory.
+
+    Parquet: zstd, dictionary-encoded device_id, RLE for the actuator
+    booleans (long on/off runs compress to a few bytes).
+    Arrow: IPC stream format, zstd-compressed buffers.
+    """
+
+    def __init__(self, fmt: str):
+        self._sink = _ChunkSink()
+        stream = pa.PythonFile(self._sink, mode="w")
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(
+                stream,
+                COLUMNAR_SCHEMA,
+                compression="zstd",
+                use_dictionary=["device_id"],
+                column_encoding={name: "RLE" for name in BOOLEAN_FIELDS},
+            )
+        else:
+            self._writer = pa.ipc.new_stream(
+                stream, COLUMNAR_SCHEMA, options=pa.ipc.IpcWriteOptions(compression="zstd")
+            )
+
+    @staticmethod
+    def record_batch(rows: List[tuple]) -> pa.RecordBatch:
+        columns = list(zip(*rows)) if rows else [()] * len(COLUMNAR_COLUMNS)
+        arrays = []
+        for field, values in zip(COLUMNAR_SCHEMA, columns):
+            if field.name == "device_id":
+                arrays.append(
+                    pa.array([str(v) for v in values], pa.string()).dictionary_encode()
+                )
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=COLUMNAR_SCHEMA)
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        self._writer.write_batch(self.record_batch(rows))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+async def export_telemetry(
+    fmt: str,
+    device_id: Optional[uuid.UUID] = None,
+    farm_id: Optional[uuid.UUID] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> AsyncIterator[bytes]:
+    """Encoded export body, one chunk per server-side cursor fetch."""
+    columnar = ColumnarEncoder(fmt) if fmt in COLUMNAR_FORMATS else None
+    columns = COLUMNAR_COLUMNS if columnar else EXPORT_COLUMNS
+    exported = 0
+    if fmt == "csv":
+        # Header even for an empty range
+        yield encode_csv([], header=True)
+    try:
+        async for rows in range_row_chunks(columns, device_id, farm_id, start_time, end_time):
+            if columnar:
+                yield columnar.encode(rows)
+            elif fmt == "csv":
+                yield encode_csv(rows)
+            else:
+                yield encode_ndjson(rows)
+            exported += len(rows)
+        if columnar:
+            # Parquet footer / Arrow end-of-stream marker
+            yield columnar.finish()
+    except Exception as e:
+        # Headers are already sent, so the client only sees a truncated body
+        logger.error(f"Telemetry export failed after {exported} rows: {e}")
+        raise
+    logger.info(f"Exported {exported} telemetry rows as {fmt}")
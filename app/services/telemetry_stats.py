@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import math
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import registry
+from app.models import Device, TelemetryStats
+from app.services.telemetry_writer import telemetry_writer
+
+logger = logging.getLogger(__name__)
+
+STATS_FIELDS = ("temp_c", "hum_pct")
+
+flush_latency = registry.histogram(
+    "telemetry_stats_flush_seconds", "Time spent merging telemetry stats buckets into Postgres"
+)
+flushed_buckets = registry.counter(
+    "telemetry_stats_buckets_total", "Telemetry stats bucket deltas merged into Postgres"
+)
+
+
+class RunningStats:
+    """
+    Mergeable summary of a stream of values: Welford mean/M2, min/max and
+    a sparse fixed-width histogram for quantiles (error <= resolution / 2).
+    """
+    __slots__ = ("resolution", "samples", "mean", "m2", "min_value", "max_value", "bins")
+
+    def __init__(self, resolution: float):
+        self.resolution = resolution
+        self.samples = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_value = math.inf
+        self.max_value = -math.inf
+        self.bins: Dict[int, int] = {}
+
+    def add(self, value: float):
+        self.samples += 1
+        delta = value - self.mean
+        self.mean += delta / self.samples
+        self.m2 += delta * (value - self.mean)
+        self.min_value = min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+        b = math.floor(value / self.resolution)
+        self.bins[b] = self.bins.get(b, 0) + 1
+
+    def merge(self, samples: int, mean: float, m2: float, min_value: float, max_value: float, bins: Dict[Any, int]):
+        """Chan et al. parallel combination of two Welford accumulators."""
+        if not samples:
+            return
+        total = self.samples + samples
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.samples * samples / total
+        self.mean += delta * samples / total
+        self.samples = total
+        self.min_value = min(self.min_value, min_value)
+        self.max_value = max(self.max_value, max_value)
+        for b, count in bins.items():
+            b = int(b)
+            self.bins[b] = self.bins.get(b, 0) + count
+
+    @property
+    def stddev(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return math.sqrt(self.m2 / self.samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        rank = q * self.samples
+        seen = 0
+        for b in sorted(self.bins):
+            seen += self.bins[b]
+            if seen >= rank:
+                # Bin midpoint, never outside the observed range
+                value = (b + 0.5) * self.resolution
+                return min(max(value, self.min_value), self.max_value)
+        return self.max_value
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        empty = not self.samples
+        return {
+            "samples": self.samples,
+            "min": None if empty else self.min_value,
+            "max": None if empty else self.max_value,
+            "mean": None if empty else self.mean,
+            "stddev": self.stddev,
+            "p5": self.quantile(0.05),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class TelemetryStatsAggregator:
+    """
+    Per-device, per-bucket RunningStats of temp_c and hum_pct, fed with the
+    rows the telemetry writer inserted (duplicates skipped by ON CONFLICT are
+    not counted, so the stats match the hypertable).
+    Every `flush_interval` seconds the accumulated deltas are merged into
+    telemetry_stats with one upsert (Welford combination and sketch merge
+    done in SQL), so any number of flushes or workers can feed a bucket.
+    A window query reads O(buckets) rows and merges them.
+    """
+
+    def __init__(self, bucket_seconds: int, resolution: float, flush_interval: float):
+        self.bucket_seconds = bucket_seconds
+        self.resolution = resolution
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[uuid.UUID, datetime, str], RunningStats] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def bucket_start(self, ts: datetime) -> datetime:
+        epoch = int(ts.timestamp())
+        return datetime.fromtimestamp(epoch - epoch % self.bucket_seconds, tz=timezone.utc)
+
+    def observe(self, device_id: uuid.UUID, ts: datetime, values: Dict[str, Optional[float]]):
+        bucket = self.bucket_start(ts)
+        for field in STATS_FIELDS:
+            value = values.get(field)
+            if value is None:
+                continue
+            key = (device_id, bucket, field)
+            stats = self._pending.get(key)
+            if stats is None:
+                stats = self._pending[key] = RunningStats(self.resolution)
+            stats.add(value)
+
+    def observe_rows(self, rows: List[Dict[str, Any]]):
+        """Account telemetry rows once they are in the hypertable (see TelemetryWriter.on_insert)."""
+        for row in rows:
+            self.observe(row["device_id"], row["ts"], row)
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        rows = [
+            {
+                "device_id": device_id,
+                "bucket": bucket,
+                "field": field,
+                "samples": s.samples,
+                "mean": s.mean,
+                "m2": s.m2,
+                "min_value": s.min_value,
+                "max_value": s.max_value,
+                "sketch": {str(b): c for b, c in s.bins.items()},
+            }
+            for (device_id, bucket, field), s in pending.items()
+        ]
+        table = TelemetryStats.__table__
+        stmt = pg_insert(table)
+        ex = stmt.excluded
+        total = table.c.samples + ex.samples
+        delta = ex.mean - table.c.mean
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id", "bucket", "field"],
+            set_={
+                "samples": total,
+                "mean": table.c.mean + delta * ex.samples / total,
+                "m2": table.c.m2 + ex.m2 + delta * delta * table.c.samples * ex.samples / total,
+                "min_value": func.least(table.c.min_value, ex.min_value),
+                "max_value": func.greatest(table.c.max_value, ex.max_value),
+                "sketch": func.telemetry_sketch_merge(table.c.sketch, ex.sketch),
+            },
+        )
+
+        started = time.perf_counter()
+        try:
+            async with AsyncSession(engine) as session:
+                await session.execute(stmt, rows)
+                await session.commit()
+        except IntegrityError:
+            # A device was deleted while its deltas were pending
+            pending = await self._drop_deleted_devices(pending)
+            failed = bool(pending)
+        except Exception as e:
+            logger.error(f"Failed to persist telemetry stats: {e}")
+            failed = True
+        else:
+            failed = False
+
+        if failed:
+            # Fold the deltas back in for the next attempt
+            for key, stats in pending.items():
+                current = self._pending.get(key)
+                if current is not None:
+                    stats.merge(current.samples, current.mean, current.m2,
+                                current.min_value, current.max_value, current.bins)
+                self._pending[key] = stats
+            return
+
+        flush_latency.observe(time.perf_counter() - started)
+        flushed_buckets.inc(len(rows))
+
+    async def _drop_deleted_devices(self, pending):
+        device_ids = {key[0] for key in pending}
+        try:
+            async with AsyncSession(engine) as session:
+                result = await session.execute(select(Device.id).where(Device.id.in_(device_ids)))
+                existing = set(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Failed to persist telemetry stats: {e}")
+            return pending
+        return {key: stats for key, stats in pending.items() if key[0] in existing}
+
+    async def _flush_loop(self):
+        while self._running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Telemetry stats flush loop error: {e}")
+
+    async def window(self, db: AsyncSession, device_id: uuid.UUID, since: datetime) -> Dict[str, RunningStats]:
+        """Merge every bucket of the device starting at or after `since`'s bucket."""
+        table = TelemetryStats.__table__
+        query = select(
+            table.c.field, table.c.samples, table.c.mean, table.c.m2,
+            table.c.min_value, table.c.max_value, table.c.sketch,
+        ).where(table.c.device_id == device_id, table.c.bucket >= self.bucket_start(since))
+        result = await db.execute(query)
+
+        merged = {field: RunningStats(self.resolution) for field in STATS_FIELDS}
+        for field, samples, mean, m2, min_value, max_value, sketch in result.all():
+            if field in merged:
+                merged[field].merge(samples, mean, m2, min_value, max_value, sketch or {})
+        return merged
+
+
+telemetry_stats = TelemetryStatsAggregator(
+    bucket_seconds=settings.TELEMETRY_STATS_BUCKET_SECONDS,
+    resolution=settings.TELEMETRY_STATS_RESOLUTION,
+    flush_interval=settings.TELEMETRY_STATS_FLUSH_INTERVAL,
+)
+# Fed from inserted rows, so duplicates skipped by ON CONFLICT are not counted
+telemetry_writer.on_insert(telemetry_stats.observe_rows)
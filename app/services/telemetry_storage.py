@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HYPERTABLE = "telemetry"
+
+# Raw rows must outlive the largest continuous-aggregate refresh window
+# (telemetry_1d refreshes the last 60 days, see migration 004), otherwise a
+# refresh would recompute buckets from chunks that were already dropped
+MIN_RETENTION_DAYS = 61
+
+
+class TelemetryStorage:
+    """
+    Compression/retention policies and storage figures of the telemetry
+    hypertable. Policies are TimescaleDB background jobs, so they persist in
+    the database and apply to every API and ingestion instance.
+    """
+
+    async def _policy_days(self, db: AsyncSession, proc_name: str, key: str) -> Optional[int]:
+        result = await db.execute(
+            text(f"""
+                SELECT (config ->> '{key}')::interval
+                FROM timescaledb_information.jobs
+                WHERE proc_name = :proc AND hypertable_name = :table
+            """),
+            {"proc": proc_name, "table": HYPERTABLE},
+        )
+        interval = result.scalar()
+        return interval.days if interval is not None else None
+
+    async def get_status(self, db: AsyncSession) -> Dict[str, Any]:
+        total_bytes = (await db.execute(text(f"SELECT hypertable_size('{HYPERTABLE}')"))).scalar()
+        chunks = (await db.execute(text(f"""
+            SELECT count(*), count(*) FILTER (WHERE is_compressed)
+            FROM timescaledb_information.chunks
+            WHERE hypertable_name = '{HYPERTABLE}'
+        """))).one()
+        compression = (await db.execute(text(f"""
+            SELECT coalesce(sum(before_compression_total_bytes), 0),
+                   coalesce(sum(after_compression_total_bytes), 0)
+            FROM chunk_compression_stats('{HYPERTABLE}')
+            WHERE compression_status = 'Compressed'
+        """))).one()
+        return {
+            "total_bytes": total_bytes or 0,
+            "chunks": chunks[0],
+            "compressed_chunks": chunks[1],
+            "before_compression_bytes": compression[0],
+            "after_compression_bytes": compression[1],
+            "compress_after_days": await self._policy_days(db, "policy_compression", "compress_after"),
+            "retention_days": await self._policy_days(db, "policy_retention", "drop_after"),
+        }
+
+    async def set_compression(self, db: AsyncSession, days: Optional[int]):
+        """Compress chunks older than `days`; None removes the policy."""
+        await db.execute(text(f"SELECT remove_compression_policy('{HYPERTABLE}', if_exists => true)"))
+        if days is not None:
+            await db.execute(
+                text(f"SELECT add_compression_policy('{HYPERTABLE}', make_interval(days => :days))"),
+                {"days": days},
+            )
+        logger.info(f"Telemetry compression policy set to {days} days")
+
+    async def set_retention(self, db: AsyncSession, days: Optional[int]):
+        """Drop chunks older than `days`; None keeps telemetry forever."""
+        if days is not None and days < MIN_RETENTION_DAYS:
+            raise ValueError(f"Retention must be at least {MIN_RETENTION_DAYS} days")
+        archive_after = settings.TELEMETRY_ARCHIVE_AFTER_DAYS
+        if days is not None and archive_after and days <= archive_after:
+            # The retention job would drop chunks before the archiver moves them
+            raise ValueError(
+                f"Retention must be longer than TELEMETRY_ARCHIVE_AFTER_DAYS ({archive_after} days)"
+            )
+        await db.execute(text(f"SELECT remove_retention_policy('{HYPERTABLE}', if_exists => true)"))
+        if days is not None:
+            await db.execute(
+                text(f"SELECT add_retention_policy('{HYPERTABLE}', make_interval(days => :days))"),
+                {"days": days},
+            )
+        logger.info(f"Telemetry retention policy set to {days} days")
+
+
+telemetry_storage = TelemetryStorage()
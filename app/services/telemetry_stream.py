@@ -0,0 +1,80 @@
+import logging
+import uuid
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis import RedisScript, get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "telemetry:stream:{}"
+CHANNEL = "telemetry:{}"
+
+# Append to the farm's capped stream, then publish the message with the
+# entry id as its first key so live clients know where to resume from.
+# Each entry also records the id of the entry before it ("p"), so a replay
+# can tell whether anything between last_id and the oldest kept entry was trimmed.
+# KEYS: stream  ARGV: maxlen, message JSON, channel
+_APPEND_AND_PUBLISH = RedisScript("""
+local last = redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', 1)[1]
+local prev = last and last[1] or ''
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'm', ARGV[2], 'p', prev)
+redis.call('PUBLISH', ARGV[3], '{"id":"' .. id .. '",' .. string.sub(ARGV[2], 2))
+return id
+""")
+
+
+def with_stream_id(entry_id: str, message: str) -> str:
+    """The message as published live: {"id": <entry id>, ...rest}."""
+    return f'{{"id":"{entry_id}",{message[1:]}'
+
+
+def parse_stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class TelemetryStream:
+    """
+    Per-farm capped Redis Stream of the telemetry messages published to
+    WebSocket clients (telemetry:stream:{farm_id}, about `maxlen` entries).
+
+    Live messages carry their stream entry id; a client that reconnects
+    with the last id it saw gets the entries after it replayed from Redis.
+    """
+
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+
+    async def stage(self, pipe, farm_id: uuid.UUID, message: bytes):
+        """
+        Queue the append + publish of one message on a Redis pipeline
+        (run it with app.core.redis.execute_scripted).
+        """
+        await _APPEND_AND_PUBLISH.stage(
+            pipe, [STREAM_KEY.format(farm_id)], [self.maxlen, message, CHANNEL.format(farm_id)]
+        )
+
+    async def replay(self, farm_id: str, last_id: str, count: Optional[int] = None) -> Tuple[List[str], bool]:
+        """
+        Messages after `last_id` (oldest first, ids included) and whether
+        entries may be missing because the stream was trimmed past last_id.
+        """
+        redis = await get_redis()
+        key = STREAM_KEY.format(farm_id)
+        entries = await redis.xrange(key, min=f"({last_id}", max="+", count=count or self.maxlen)
+        truncated = False
+        if entries:
+            prev = entries[0][1].get("p")
+            if prev is None:
+                # Entry appended before "p" was recorded: all we know is
+                # whether the stream still reaches back to last_id
+                first = await redis.xrange(key, min="-", max="+", count=1)
+                truncated = parse_stream_id(first[0][0]) > parse_stream_id(last_id)
+            else:
+                # Something came between last_id and the first entry still kept
+                truncated = bool(prev) and parse_stream_id(prev) > parse_stream_id(last_id)
+        return [with_stream_id(entry_id, fields["m"]) for entry_id, fields in entries], truncated
+
+
+telemetry_stream = TelemetryStream(maxlen=settings.TELEMETRY_STREAM_MAXLEN)
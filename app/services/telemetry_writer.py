@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import ingest_stage_latency, registry
+from app.models import Telemetry
+from app.services.spill_journal import SpillJournal, spill_journal
+
+logger = logging.getLogger(__name__)
+
+# Time spent writing one telemetry batch to Postgres
+flush_latency = ingest_stage_latency.labels(stage="db_commit")
+flushed_rows = registry.counter(
+    "telemetry_writer_rows_total", "Telemetry rows written to Postgres"
+)
+flush_failures = registry.counter(
+    "telemetry_writer_flush_failures_total", "Telemetry batches that failed to write"
+)
+rejected_rows = registry.counter(
+    "telemetry_writer_rejected_rows_total", "Telemetry rows Postgres refused (deleted device, out-of-range value)"
+)
+overflow_rows = registry.counter(
+    "telemetry_writer_overflow_rows_total", "Telemetry rows moved to the journal because the buffer overflowed"
+)
+replayed_rows = registry.counter(
+    "ingest_journal_replayed_rows_total", "Journaled telemetry rows written back to Postgres"
+)
+replay_rate = registry.gauge(
+    "ingest_journal_replay_rows_per_second", "Throughput of the last journal segment replay"
+)
+buffered_rows = registry.gauge(
+    "telemetry_writer_buffered_rows", "Telemetry rows waiting to be flushed"
+)
+
+# Every column of the hypertable, so all rows in a batch share one INSERT shape
+TELEMETRY_COLUMNS = tuple(c.name for c in Telemetry.__table__.columns)
+# Executed with a list of rows: one multi-row INSERT per batch. RETURNING
+# reports the rows actually inserted, not those skipped as duplicates
+INSERT_TELEMETRY = (
+    pg_insert(Telemetry.__table__)
+    .on_conflict_do_nothing(index_elements=["ts", "device_id"])
+    .returning(Telemetry.__table__.c.ts, Telemetry.__table__.c.device_id)
+)
+
+
+def is_row_error(error: Exception) -> bool:
+    """
+    True when the rows themselves are refused (FK to a deleted device, value
+    out of the column's range): retrying the same rows can never succeed.
+    """
+    if isinstance(error, (IntegrityError, DataError)):
+        return True
+    # asyncpg data exceptions surface as plain DBAPIErrors: go by SQLSTATE
+    # class 22 (data exception) / 23 (integrity constraint violation)
+    sqlstate = getattr(getattr(error, "orig", None), "sqlstate", None) or ""
+    return sqlstate[:2] in ("22", "23")
+
+
+class TelemetryWriter:
+    """
+    Buffers telemetry rows and writes them as multi-row INSERTs.
+    A batch is flushed when it reaches `batch_size` rows or when
+    `flush_interval` seconds have passed since the last flush.
+    Duplicate (ts, device_id) rows are skipped by ON CONFLICT DO NOTHING.
+    A batch Postgres refuses because of its rows is split until the bad
+    rows are isolated; those go to the journal's dead-letter segments and
+    the rest is written, so one bad row cannot hold back a batch or a
+    journal segment.
+
+    When a batch cannot be written, or the buffer outgrows `max_buffer`
+    because Postgres cannot keep up, rows are spilled to the local journal
+    and replayed in bulk once writes succeed again.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_buffer: int,
+        journal: SpillJournal,
+        replay_interval: float,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.journal = journal
+        self.replay_interval = replay_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._overflow: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self._running = False
+        self._db_healthy = True
+        self._callbacks: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+    def on_insert(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Register a callback(rows) run with the rows each INSERT actually added."""
+        self._callbacks.append(callback)
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        self._replay_task = asyncio.create_task(self._replay_loop())
+        logger.info(
+            f"Telemetry writer started (batch_size={self.batch_size}, flush_interval={self.flush_interval}s)"
+        )
+
+    async def stop(self):
+        """Stop the background loops and drain whatever is still buffered."""
+        self._running = False
+        self._wakeup.set()
+        if self._replay_task:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+        # Anything that could not be written is in the journal by now
+        await asyncio.to_thread(self.journal.close)
+        logger.info("Telemetry writer stopped")
+
+    def add(self, row: Dict[str, Any]):
+        """Queue one telemetry row (a dict keyed by Telemetry column name)."""
+        self._buffer.append({column: row.get(column) for column in TELEMETRY_COLUMNS})
+        if len(self._buffer) > self.max_buffer:
+            # Postgres is not keeping up: the oldest rows go to the journal
+            overflow = len(self._buffer) - self.max_buffer
+            self._overflow.extend(self._buffer[:overflow])
+            del self._buffer[:overflow]
+            overflow_rows.inc(overflow)
+            self._wakeup.set()
+        buffered_rows.set(len(self._buffer))
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if self._overflow:
+                overflow, self._overflow = self._overflow, []
+                await self._spill(overflow)
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                buffered_rows.set(len(self._buffer))
+                if not await self._write(batch):
+                    # Postgres is failing: journal this batch and everything
+                    # still buffered instead of holding it in memory
+                    rest, self._buffer = self._buffer, []
+                    buffered_rows.set(0)
+                    await self._spill(batch + rest)
+                    break
+
+    async def _spill(self, rows: List[Dict[str, Any]]):
+        try:
+            await asyncio.to_thread(self.journal.append, rows)
+            logger.warning(f"Spilled {len(rows)} telemetry rows to the journal")
+        except Exception as e:
+            flush_failures.inc()
+            logger.error(f"Failed to journal {len(rows)} telemetry rows, they are lost: {e}")
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        """False when Postgres is unavailable (the batch must be kept)."""
+        started = time.perf_counter()
+        try:
+            written = await self._insert(batch)
+        except Exception as e:
+            flush_failures.inc()
+            self._db_healthy = False
+            logger.error(f"Failed to write telemetry batch of {len(batch)} rows: {e}")
+            return False
+
+        self._db_healthy = True
+        elapsed = time.perf_counter() - started
+        flush_latency.observe(elapsed)
+        flushed_rows.inc(written)
+        logger.debug(f"Flushed {written} telemetry rows in {elapsed * 1000:.1f} ms")
+        return True
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> int:
+        """
+        Insert `batch`, bisecting it when Postgres refuses some of its rows
+        so only those are lost. Returns the number of rows inserted; raises
+        on any other error.
+        """
+        try:
+            async with AsyncSession(engine) as session:
+                result = await session.execute(INSERT_TELEMETRY, batch)
+                inserted = {(ts, device_id) for ts, device_id in result}
+                await session.commit()
+        except Exception as e:
+            if not is_row_error(e):
+                raise
+            if len(batch) == 1:
+                await self._reject(batch, e)
+                return 0
+        else:
+            rows = [row for row in batch if (row["ts"], row["device_id"]) in inserted]
+            self._notify(rows)
+            return len(rows)
+        middle = len(batch) // 2
+        return await self._insert(batch[:middle]) + await self._insert(batch[middle:])
+
+    def _notify(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        for callback in self._callbacks:
+            try:
+                callback(rows)
+            except Exception as e:
+                logger.error(f"Telemetry insert callback failed: {e}")
+
+    async def _reject(self, rows: List[Dict[str, Any]], error: Exception):
+        rejected_rows.inc(len(rows))
+        for row in rows:
+            logger.error(f"Rejected telemetry row of device {row.get('device_id')} at {row.get('ts')}: {error}")
+        try:
+            await asyncio.to_thread(self.journal.dead_letter, rows)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter {len(rows)} telemetry rows, they are lost: {e}")
+
+    async def _flush_loop(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Telemetry flush loop error: {e}")
+
+    async def replay(self):
+        """Write journaled rows back into the hypertable, oldest segment first."""
+        segments = await asyncio.to_thread(self.journal.seal)
+        for path in segments:
+            started = time.perf_counter()
+            count = 0
+            batches = self.journal.read_segment(path, self.batch_size)
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                # Refused rows are dead-lettered by _write; False means Postgres is down
+                if not await self._write(batch):
+                    # Keep the segment; already written rows are skipped by ON CONFLICT next time
+                    batches.close()
+                    return
+                count += len(batch)
+                replayed_rows.inc(len(batch))
+            await asyncio.to_thread(self.journal.remove, path)
+            elapsed = time.perf_counter() - started
+            if elapsed > 0:
+                replay_rate.set(count / elapsed)
+            logger.info(f"Replayed {count} journaled telemetry rows in {elapsed:.1f}s")
+
+    async def _replay_loop(self):
+        while self._running:
+            await asyncio.sleep(self.replay_interval)
+            if not self._db_healthy:
+                continue
+            try:
+                await self.replay()
+            except Exception as e:
+                logger.error(f"Telemetry journal replay error: {e}")
+
+
+telemetry_writer = TelemetryWriter(
+    batch_size=settings.TELEMETRY_BATCH_SIZE,
+    flush_interval=settings.TELEMETRY_FLUSH_INTERVAL,
+    max_buffer=settings.TELEMETRY_MAX_BUFFER,
+    journal=spill_journal,
+    replay_interval=settings.INGEST_JOURNAL_REPLAY_INTERVAL,
+)
@@ -0,0 +1,467 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Annotated, Deque, Dict, List, Literal, Optional, Set, Tuple, Union
+
+import msgspec
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.redis import get_redis
+from app.services.telemetry_codec import TYPED_PAYLOAD_KEYS, TelemetryRecord
+from app.services.telemetry_stream import CHANNEL, parse_stream_id
+
+logger = logging.getLogger(__name__)
+
+ws_clients = registry.gauge("ws_clients", "WebSocket clients connected to this process")
+ws_channels = registry.gauge("ws_channels", "Redis telemetry channels this process is subscribed to")
+ws_dropped = registry.counter(
+    "ws_dropped_messages_total", "WebSocket messages conflated away or dropped for slow clients"
+)
+ws_slow_disconnects = registry.counter(
+    "ws_slow_disconnects_total", "WebSocket clients disconnected for staying behind too long"
+)
+ws_send_lag = registry.histogram(
+    "ws_send_lag_seconds", "Time WebSocket messages wait in a client queue before being sent"
+)
+ws_sent_bytes = registry.counter(
+    "ws_sent_bytes_total", "WebSocket message bytes sent before permessage-deflate", ["encoding"]
+)
+
+class _MessageKey(msgspec.Struct):
+    id: Optional[str] = None
+    device_id: Optional[str] = None
+    device_serial: Optional[str] = None
+
+
+_key_decoder = msgspec.json.Decoder(_MessageKey)
+_encoder = msgspec.json.Encoder()
+
+# Telemetry fields a client can select; ts and device_id are always sent
+SELECTABLE_FIELDS = frozenset(TelemetryRecord.__struct_fields__)
+ALWAYS_SENT_FIELDS = ("ts", "device_id")
+
+
+class Subscription(msgspec.Struct, forbid_unknown_fields=True):
+    """
+    Client -> server control message, replacing the client's filter:
+
+        {"action": "subscribe", "devices": ["INC-001"], "fields": ["temp_c"], "max_rate": 1}
+
+    devices: device UUIDs or serials (null: every device of the farm)
+    fields: telemetry fields to send (null: all)
+    max_rate: updates per second per device (null: every reading)
+    """
+    action: Literal["subscribe"]
+    devices: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
+    max_rate: Optional[Annotated[float, msgspec.Meta(gt=0)]] = None
+
+    def __post_init__(self):
+        unknown = set(self.fields or ()) - SELECTABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+
+subscription_decoder = msgspec.json.Decoder(Subscription)
+
+
+class OutgoingMessage:
+    """
+    One published telemetry message, shared by every client of the farm.
+    Field projections are encoded lazily and once per distinct field set,
+    so filtered-out and throttled-away messages are never re-encoded.
+    """
+    __slots__ = ("raw", "id", "device_id", "device_serial", "_decoded", "_projected", "_projections")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        try:
+            key = _key_decoder.decode(raw)
+        except msgspec.DecodeError:
+            key = _MessageKey()
+        # Redis Stream entry id
+        self.id = key.id
+        self.device_id = key.device_id
+        self.device_serial = key.device_serial
+        self._decoded = None
+        self._projected: Dict[Tuple[str, ...], dict] = {}
+        self._projections: Dict[Tuple[str, ...], str] = {}
+
+    def project(self, fields: Optional[Tuple[str, ...]]) -> dict:
+        """The decoded message with only `fields` in its data (shared: do not mutate)."""
+        if self._decoded is None:
+            self._decoded = msgspec.json.decode(self.raw)
+        if fields is None:
+            return self._decoded
+        message = self._projected.get(fields)
+        if message is None:
+            message = dict(self._decoded)
+            data = message.get("data")
+            if isinstance(data, dict):
+                message["data"] = {name: data[name] for name in fields if name in data}
+            self._projected[fields] = message
+        return message
+
+    def encode(self, fields: Optional[Tuple[str, ...]]) -> str:
+        if fields is None:
+            return self.raw
+        text = self._projections.get(fields)
+        if text is None:
+            text = self._projections[fields] = _encoder.encode(self.project(fields)).decode()
+        return text
+
+
+def compact_data(data: dict) -> dict:
+    """
+    Telemetry data with its raw device payload reduced to the keys whose
+    value is not already in a typed field (ts is always in data.ts).
+    """
+    payload = data.get("payload")
+    if not isinstance(payload, dict):
+        return data
+    residual = {
+        key: value for key, value in payload.items()
+        if key != "ts" and (key not in TYPED_PAYLOAD_KEYS or data.get(TYPED_PAYLOAD_KEYS[key]) != value)
+    }
+    return {**data, "payload": residual}
+
+
+class DeltaEncoder:
+    """
+    Delta encoding of one client's telemetry (?encoding=delta).
+
+    The first reading of a device is sent whole as {"type": "snapshot", ...};
+    the following ones as {"type": "delta", "id", "device_id", "data"} with
+    only the data fields that changed since the reading last sent to the
+    client. The client applies a delta onto its copy of the device's data.
+    In both, data.payload only carries the keys not mirrored by typed fields.
+    """
+
+    def __init__(self):
+        # device_id -> data last sent
+        self._last: Dict[str, dict] = {}
+
+    def reset(self):
+        """Start over with a snapshot of every device."""
+        self._last.clear()
+
+    def encode(self, message: OutgoingMessage, fields: Optional[Tuple[str, ...]]) -> str:
+        projected = message.project(fields)
+        data = projected.get("data") if isinstance(projected, dict) else None
+        device_id = message.device_id
+        if not isinstance(data, dict) or device_id is None:
+            return message.encode(fields)
+        data = compact_data(data)
+        last = self._last.get(device_id)
+        self._last[device_id] = data
+        if last is None:
+            return _encoder.encode({**projected, "type": "snapshot", "data": data}).decode()
+        delta = {"type": "delta"}
+        if message.id is not None:
+            delta["id"] = message.id
+        delta["device_id"] = device_id
+        delta["data"] = {key: value for key, value in data.items() if key not in last or last[key] != value}
+        return _encoder.encode(delta).decode()
+
+
+class ClientQueue:
+    """
+    Bounded send queue of one WebSocket client.
+
+    Messages of devices outside the client's Subscription are skipped on
+    arrival. With a max_rate, a device's readings inside its minimum
+    interval are held (only the newest one) and released when the interval
+    has passed.
+
+    While the client keeps up, every message is delivered in order. When
+    the queue is full it is conflated to the newest message per device
+    (then the oldest are dropped if still full). A client that stays in
+    that state for longer than `max_lag` seconds is flagged in `lagging`
+    and disconnected by its endpoint.
+
+    With `delta`, messages are delta-encoded (DeltaEncoder) against what
+    was actually sent when they leave the queue, so conflated and
+    throttled-away readings are folded into the next delta.
+    """
+
+    def __init__(self, farm_id: str, maxsize: int, max_lag: float, delta: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.farm_id = farm_id
+        self.maxsize = maxsize
+        self.max_lag = max_lag
+        self.connected_at = time.time()
+        self.encoding = "delta" if delta else "json"
+        self._delta = DeltaEncoder() if delta else None
+        self._sent_bytes = ws_sent_bytes.labels(encoding=self.encoding)
+        self.sent = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.lagging = asyncio.Event()
+        # (device_id, message, enqueued at); str messages are control replies
+        self._pending: Deque[Tuple[Optional[str], Union[OutgoingMessage, str], float]] = deque()
+        self._ready = asyncio.Event()
+        self._behind_since: Optional[float] = None
+        # Subscription
+        self._devices: Optional[Set[str]] = None
+        self._fields: Optional[Tuple[str, ...]] = None
+        self._min_interval = 0.0
+        self._last_queued: Dict[str, float] = {}
+        self._held: Dict[str, Tuple[OutgoingMessage, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def lag(self) -> float:
+        """Age of the oldest undelivered message."""
+        return time.monotonic() - self._pending[0][2] if self._pending else 0.0
+
+    def subscribe(self, subscription: Subscription):
+        self._devices = set(subscription.devices) if subscription.devices is not None else None
+        if subscription.fields is None:
+            self._fields = None
+        else:
+            self._fields = tuple(dict.fromkeys(ALWAYS_SENT_FIELDS + tuple(subscription.fields)))
+        self._min_interval = 1.0 / subscription.max_rate if subscription.max_rate else 0.0
+        # Forget what the new filter excludes
+        self._pending = deque(
+            item for item in self._pending
+            if not isinstance(item[1], OutgoingMessage) or self._wants(item[1])
+        )
+        self._held = {device: held for device, held in self._held.items() if self._wants(held[0])}
+        if self._delta is not None:
+            # Field set may have changed: resend every device whole
+            self._delta.reset()
+        self._ready.set()
+
+    def skip_through(self, entry_id: str):
+        """Drop queued live messages up to a stream id already replayed to the client."""
+        last = parse_stream_id(entry_id)
+        self._pending = deque(
+            item for item in self._pending
+            if not isinstance(item[1], OutgoingMessage) or item[1].id is None
+            or parse_stream_id(item[1].id) > last
+        )
+
+    def _wants(self, message: OutgoingMessage) -> bool:
+        devices = self._devices
+        return devices is None or message.device_id in devices or message.device_serial in devices
+
+    def put(self, message: OutgoingMessage):
+        if not self._wants(message):
+            return
+        now = time.monotonic()
+        device_id = message.device_id
+        if self._min_interval and device_id is not None:
+            if now - self._last_queued.get(device_id, 0.0) < self._min_interval:
+                if device_id in self._held:
+                    self.throttled += 1
+                self._held[device_id] = (message, now)
+                self._ready.set()
+                return
+            self._held.pop(device_id, None)
+            self._last_queued[device_id] = now
+        self._append(device_id, message, now)
+
+    def put_control(self, text: str):
+        """Queue a server reply to a control message (never conflated)."""
+        self._append(None, text, time.monotonic())
+
+    def _append(self, device_id: Optional[str], message: Union[OutgoingMessage, str], now: float):
+        if len(self._pending) >= self.maxsize:
+            if self._behind_since is None:
+                self._behind_since = now
+            elif now - self._behind_since > self.max_lag:
+                self.lagging.set()
+            self._conflate()
+        self._pending.append((device_id, message, now))
+        self._ready.set()
+
+    def _conflate(self):
+        kept: Deque[Tuple[Optional[str], Union[OutgoingMessage, str], float]] = deque()
+        seen: Set[str] = set()
+        for item in reversed(self._pending):
+            device_id = item[0]
+            if device_id is not None:
+                if device_id in seen:
+                    continue
+                seen.add(device_id)
+            kept.appendleft(item)
+        # More devices than slots: make room for the new message
+        while len(kept) >= self.maxsize:
+            kept.popleft()
+        dropped = len(self._pending) - len(kept)
+        self.dropped += dropped
+        ws_dropped.inc(dropped)
+        self._pending = kept
+
+    def _release_held(self) -> Optional[float]:
+        """Queue held readings whose interval has passed; seconds until the next one is due."""
+        now = time.monotonic()
+        next_due = None
+        for device_id in list(self._held):
+            due = self._last_queued.get(device_id, 0.0) + self._min_interval
+            if due <= now:
+                message, _ = self._held.pop(device_id)
+                self._last_queued[device_id] = now
+                self._append(device_id, message, now)
+            elif next_due is None or due - now < next_due:
+                next_due = due - now
+        return next_due
+
+    async def get(self) -> str:
+        while True:
+            wait = self._release_held() if self._held else None
+            if self._pending:
+                break
+            # Caught up again
+            self._behind_since = None
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        _, message, enqueued = self._pending.popleft()
+        ws_send_lag.observe(time.monotonic() - enqueued)
+        if isinstance(message, OutgoingMessage):
+            return self.encode(message)
+        return self._count(message)
+
+    def encode(self, message: OutgoingMessage) -> str:
+        """The client's encoding of a telemetry message, counted as sent."""
+        if self._delta is not None:
+            text = self._delta.encode(message, self._fields)
+        else:
+            text = message.encode(self._fields)
+        return self._count(text)
+
+    def _count(self, text: str) -> str:
+        size = len(text)
+        self.sent += 1
+        self.sent_bytes += size
+        self._sent_bytes.inc(size)
+        return text
+
+    def stats(self) -> Dict:
+        return {
+            "id": self.id,
+            "farm_id": self.farm_id,
+            "connected_at": self.connected_at,
+            "queued": len(self._pending),
+            "lag_seconds": self.lag(),
+            "encoding": self.encoding,
+            "sent": self.sent,
+            "sent_bytes": self.sent_bytes,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+            "devices": sorted(self._devices) if self._devices is not None else None,
+            "fields": list(self._fields) if self._fields is not None else None,
+        }
+
+
+class FarmHub:
+    """
+    In-process fan-out of farm telemetry to WebSocket clients.
+
+    One Redis pubsub connection per process carries one subscription per
+    farm that has at least one local client; a single listener task blocks
+    on it and copies every message into the ClientQueue of each of that
+    farm's clients, so a slow client never holds up the others.
+    A farm's channel is unsubscribed when its last client leaves.
+    """
+
+    def __init__(self, queue_size: int, max_lag: float):
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self._clients: Dict[str, Set[ClientQueue]] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        # Serializes (un)subscribe against membership changes
+        self._lock = asyncio.Lock()
+
+    async def join(self, farm_id: str, delta: bool = False) -> ClientQueue:
+        """Register a client of the farm; messages are delivered to the returned queue."""
+        queue = ClientQueue(farm_id, self.queue_size, self.max_lag, delta=delta)
+        async with self._lock:
+            clients = self._clients.get(farm_id)
+            if clients is None:
+                await self._subscribe(CHANNEL.format(farm_id))
+                clients = self._clients[farm_id] = set()
+            clients.add(queue)
+        ws_clients.inc()
+        return queue
+
+    async def leave(self, farm_id: str, queue: ClientQueue):
+        async with self._lock:
+            clients = self._clients.get(farm_id)
+            if clients is None or queue not in clients:
+                return
+            clients.discard(queue)
+            ws_clients.dec()
+            if queue.lagging.is_set():
+                ws_slow_disconnects.inc()
+            if not clients:
+                del self._clients[farm_id]
+                try:
+                    await self._pubsub.unsubscribe(CHANNEL.format(farm_id))
+                except Exception as e:
+                    logger.warning(f"Failed to unsubscribe from farm {farm_id}: {e}")
+                ws_channels.set(len(self._clients))
+
+    def clients(self) -> List[Dict]:
+        """Queue/lag/drop figures of every client connected to this process."""
+        return [queue.stats() for clients in self._clients.values() for queue in clients]
+
+    async def _subscribe(self, channel: str):
+        if self._pubsub is None:
+            redis = await get_redis()
+            self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(channel)
+        ws_channels.set(len(self._clients) + 1)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    def _fan_out(self, channel: str, data: str):
+        farm_id = channel.split(":", 1)[1]
+        clients = self._clients.get(farm_id)
+        if not clients:
+            return
+        message = OutgoingMessage(data)
+        for queue in clients:
+            queue.put(message)
+
+    async def _listen(self):
+        # listen() blocks on the socket and returns once nothing is subscribed
+        while self._clients:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] == "message":
+                        self._fan_out(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The pubsub reconnects and resubscribes on the next read
+                logger.error(f"WebSocket hub listener error: {e}")
+                await asyncio.sleep(1.0)
+            else:
+                # Between the last unsubscribe and a new subscribe
+                await asyncio.sleep(0.1)
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._clients.clear()
+
+
+ws_hub = FarmHub(queue_size=settings.WS_CLIENT_QUEUE_SIZE, max_lag=settings.WS_CLIENT_MAX_LAG)
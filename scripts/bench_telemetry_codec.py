@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: per-message CPU cost of the telemetry hot path.
+
+legacy: json.loads -> Telemetry(...) -> model_dump() for the DB row,
+        json.loads(model_dump_json()) + json.dumps(msg) for Redis
+typed:  one msgspec decode -> DB row + pre-encoded Redis bytes
+
+Run: python -m scripts.bench_telemetry_codec
+"""
+import json
+import timeit
+import uuid
+from datetime import datetime
+
+from app.models import Telemetry
+from app.services.telemetry_codec import build_record, decode_payload, encode_message
+
+PAYLOAD = json.dumps({
+    "ts": "2026-01-18T10:15:00Z",
+    "seq": 123456,
+    "temp_c": 99.5,
+    "hum_pct": 65.2,
+    "primary_heater": True,
+    "secondary_heater": False,
+    "exhaust_fan": True,
+    "fan": True,
+    "sv_valve": False,
+    "turning_motor": False,
+    "limit_switch": True,
+    "door_light": False,
+    "motor_state": "idle",
+    "uptime_s": 3600,
+    "rssi": -61,
+    "ip": "192.168.1.100",
+    "temp_low": 99.0,
+    "temp_high": 100.5,
+    "timer_sec": 7200,
+}).encode()
+
+DEVICE_ID = uuid.uuid4()
+FARM_ID = uuid.uuid4()
+
+
+def legacy():
+    data = json.loads(PAYLOAD.decode())
+    ts_val = datetime.fromisoformat(data["ts"].replace('Z', '+00:00'))
+    telemetry = Telemetry(
+        ts=ts_val,
+        device_id=DEVICE_ID,
+        farm_id=FARM_ID,
+        seq=data.get("seq", 0),
+        temp_c=data.get("temp_c") or data.get("current_temp", 0.0),
+        hum_pct=data.get("hum_pct") or data.get("current_humidity", 0.0),
+        primary_heater=data.get("primary_heater"),
+        secondary_heater=data.get("secondary_heater"),
+        exhaust_fan=data.get("exhaust_fan"),
+        sv_valve=data.get("sv_valve"),
+        fan=data.get("fan"),
+        turning_motor=data.get("turning_motor"),
+        limit_switch=data.get("limit_switch"),
+        door_light=data.get("door_light"),
+        ip=data.get("ip"),
+        heater=data.get("heater") or data.get("primary_heater", False),
+        motor_state=data.get("motor_state"),
+        uptime_s=data.get("uptime_s"),
+        rssi=data.get("rssi", 0),
+        payload=data,
+    )
+    row = telemetry.model_dump()
+    msg = {
+        "type": "telemetry",
+        "device_id": str(DEVICE_ID),
+        "device_serial": "INC-001",
+        "farm_id": str(FARM_ID),
+        "data": json.loads(telemetry.model_dump_json()),
+    }
+    return row, json.dumps(msg)
+
+
+def typed():
+    payload = decode_payload(PAYLOAD)
+    record = build_record(payload, PAYLOAD, DEVICE_ID, FARM_ID, payload.timestamp())
+    return record.to_row(), encode_message(record, "INC-001")
+
+
+def main():
+    n = 20000
+    results = {}
+    for name, fn in (("legacy", legacy), ("typed", typed)):
+        best = min(timeit.repeat(fn, number=n, repeat=5))
+        results[name] = best / n * 1e6
+        print(f"{name:>7}: {results[name]:7.2f} µs/message")
+    print(f"speedup: {results['legacy'] / results['typed']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
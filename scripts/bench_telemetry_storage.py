@@ -0,0 +1,107 @@
+"""
+Benchmark: telemetry storage and read latency before/after compression.
+
+Reports the hypertable size (and how much of it is the payload column),
+times representative read queries, compresses every chunk older than
+--older-than days and repeats both. Run against a copy of production
+data, not a live database: compression rewrites chunks.
+
+Run: python -m scripts.bench_telemetry_storage [--older-than 7] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.core.db import engine
+
+# Representative read paths (see app/api/v1/endpoints/telemetry.py)
+QUERIES = {
+    "device latest 100": """
+        SELECT * FROM telemetry WHERE device_id = :device_id
+        ORDER BY ts DESC LIMIT 100
+    """,
+    "device 24h range": """
+        SELECT * FROM telemetry WHERE device_id = :device_id
+          AND ts >= :end - INTERVAL '24 hours' AND ts < :end
+        ORDER BY ts
+    """,
+    "device 7d avg temp": """
+        SELECT time_bucket('1 hour', ts) AS bucket, avg(temp_c) FROM telemetry
+        WHERE device_id = :device_id AND ts >= :end - INTERVAL '7 days' AND ts < :end
+        GROUP BY bucket ORDER BY bucket
+    """,
+    "farm 1h range": """
+        SELECT * FROM telemetry WHERE farm_id = :farm_id
+          AND ts >= :end - INTERVAL '1 hour' AND ts < :end
+        ORDER BY ts DESC, device_id DESC
+    """,
+}
+
+
+async def storage(conn):
+    total = (await conn.execute(text("SELECT hypertable_size('telemetry')"))).scalar()
+    chunks, compressed = (await conn.execute(text("""
+        SELECT count(*), count(*) FILTER (WHERE is_compressed)
+        FROM timescaledb_information.chunks WHERE hypertable_name = 'telemetry'
+    """))).one()
+    rows, payload = (await conn.execute(text(
+        "SELECT count(*), coalesce(sum(pg_column_size(payload)), 0) FROM telemetry"
+    ))).one()
+    print(f"  size: {total / 2**20:10.1f} MiB  chunks: {chunks} ({compressed} compressed)  rows: {rows}")
+    if rows:
+        print(f"  payload column: {payload / 2**20:.1f} MiB ({payload / rows:.0f} B/row)")
+
+
+async def latencies(conn, params, repeat):
+    for name, sql in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await conn.execute(text(sql), params)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"  {name:>20}: p50 {statistics.median(timings):8.2f} ms  max {max(timings):8.2f} ms")
+
+
+async def main(older_than: int, repeat: int):
+    async with engine.connect() as conn:
+        row = (await conn.execute(text("""
+            SELECT device_id, farm_id, max(ts) FROM telemetry
+            GROUP BY device_id, farm_id ORDER BY count(*) DESC LIMIT 1
+        """))).first()
+        if row is None:
+            print("telemetry is empty")
+            return
+        # Read the busiest device's oldest compressible week
+        end = (await conn.execute(
+            text("SELECT least(:latest, now() - make_interval(days => :days))"),
+            {"latest": row[2], "days": older_than},
+        )).scalar()
+        params = {"device_id": row[0], "farm_id": row[1], "end": end}
+
+        print("before:")
+        await storage(conn)
+        await latencies(conn, params, repeat)
+
+        started = time.perf_counter()
+        compressed = (await conn.execute(text("""
+            SELECT count(compress_chunk(c, if_not_compressed => true))
+            FROM show_chunks('telemetry', older_than => make_interval(days => :days)) c
+        """), {"days": older_than})).scalar()
+        await conn.commit()
+        print(f"compressed {compressed} chunks in {time.perf_counter() - started:.1f} s")
+
+        print("after:")
+        await storage(conn)
+        await latencies(conn, params, repeat)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--older-than", type=int, default=7, help="compress chunks older than N days")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.older_than, args.repeat))
@@ -0,0 +1,113 @@
+"""
+Benchmark: WebSocket bytes per telemetry update, json vs delta encoding,
+each with and without permessage-deflate.
+
+Simulated farm readings (slowly drifting temperature/humidity, rare
+actuator changes) go through the same encoders as a live client; the
+deflate figures use one compressor per connection with context takeover
+and the window/memory settings of the websockets server (what uvicorn
+negotiates with --ws websockets --ws-per-message-deflate true).
+
+Run: python -m scripts.bench_ws_encoding [--devices 20] [--updates 500]
+"""
+import argparse
+import json
+import random
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from app.services.telemetry_codec import build_record, decode_payload, encode_message
+from app.services.telemetry_stream import with_stream_id
+from app.services.ws_hub import DeltaEncoder, OutgoingMessage
+
+
+def readings(devices: int, updates: int, seed: int = 1):
+    """Published messages of a farm, one reading per device per 2 s tick."""
+    rng = random.Random(seed)
+    farm_id = uuid.uuid4()
+    state = [
+        {
+            "id": uuid.uuid4(), "serial": f"INC-{n:04d}", "temp_c": 99.5, "hum_pct": 60.0,
+            "primary_heater": True, "exhaust_fan": False, "turning_motor": False, "rssi": -60,
+        }
+        for n in range(devices)
+    ]
+    start = datetime(2026, 1, 18, 10, 0, tzinfo=timezone.utc)
+    for tick in range(updates):
+        ts = start + timedelta(seconds=2 * tick)
+        for n, device in enumerate(state):
+            # Sensors report at 0.1 resolution, so most ticks repeat the value
+            device["temp_c"] = round(device["temp_c"] + rng.choice((-0.1, 0, 0, 0, 0.1)), 1)
+            device["hum_pct"] = round(device["hum_pct"] + rng.choice((-0.1, 0, 0, 0, 0, 0.1)), 1)
+            for actuator in ("primary_heater", "exhaust_fan", "turning_motor"):
+                if rng.random() < 0.02:
+                    device[actuator] = not device[actuator]
+            if rng.random() < 0.2:
+                device["rssi"] = rng.randint(-66, -55)
+            payload = json.dumps({
+                "ts": ts.isoformat().replace("+00:00", "Z"),
+                "seq": tick,
+                "temp_c": device["temp_c"],
+                "hum_pct": device["hum_pct"],
+                "primary_heater": device["primary_heater"],
+                "secondary_heater": False,
+                "exhaust_fan": device["exhaust_fan"],
+                "fan": True,
+                "sv_valve": False,
+                "turning_motor": device["turning_motor"],
+                "limit_switch": True,
+                "door_light": False,
+                "motor_state": "idle",
+                "uptime_s": 3600 + 2 * tick,
+                "rssi": device["rssi"],
+                "ip": "192.168.1.100",
+                "temp_low": 99.0,
+                "temp_high": 100.5,
+            }).encode()
+            parsed = decode_payload(payload)
+            record = build_record(parsed, payload, device["id"], farm_id, parsed.timestamp())
+            entry_id = f"{int(ts.timestamp() * 1000)}-{n}"
+            yield with_stream_id(entry_id, encode_message(record, device["serial"]).decode())
+
+
+class Deflate:
+    """permessage-deflate of one connection (context takeover)."""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(wbits=-12, memLevel=5)
+
+    def __call__(self, text: str) -> int:
+        data = self._compressor.compress(text.encode()) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        # The 00 00 ff ff flush marker is not sent
+        return len(data) - 4
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=500, help="readings per device")
+    args = parser.parse_args()
+
+    messages = list(readings(args.devices, args.updates))
+    delta = DeltaEncoder()
+    totals = {"json": [0, 0], "delta": [0, 0]}
+    deflate = {"json": Deflate(), "delta": Deflate()}
+    for raw in messages:
+        message = OutgoingMessage(raw)
+        for encoding, text in (("json", message.encode(None)), ("delta", delta.encode(message, None))):
+            totals[encoding][0] += len(text)
+            totals[encoding][1] += deflate[encoding](text)
+
+    count = len(messages)
+    baseline = totals["json"][0] / count
+    print(f"{count} updates from {args.devices} devices")
+    print(f"{'encoding':<16}{'bytes/update':>14}{'vs json':>10}")
+    for encoding, (plain, compressed) in totals.items():
+        for label, size in ((encoding, plain), (f"{encoding}+deflate", compressed)):
+            per_update = size / count
+            print(f"{label:<16}{per_update:>14.1f}{baseline / per_update:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+def test_duplicate_filter_drops_redeliveries_within_window():
+    from app.services.dedup import DuplicateFilter
+
+    dedup = DuplicateFilter(window=4, max_devices=10)
+    assert not dedup.is_duplicate("INC-001", "2026-01-18T10:15:00Z", 1)
+    assert dedup.is_duplicate("INC-001", "2026-01-18T10:15:00Z", 1)
+    # Same seq after a reboot but a new timestamp is a new reading
+    assert not dedup.is_duplicate("INC-001", "2026-01-18T11:00:00Z", 1)
+    # Other devices are tracked separately
+    assert not dedup.is_duplicate("INC-002", "2026-01-18T10:15:00Z", 1)
+    # Readings without ts cannot be deduplicated (seq restarts on reboot)
+    assert not dedup.is_duplicate("INC-001", None, 0)
+    assert not dedup.is_duplicate("INC-001", None, 0)
+    assert not dedup.is_duplicate("INC-001", None, 7)
+    assert not dedup.is_duplicate("INC-001", None, 7)
+    # Older than the window: forgotten
+    for seq in range(2, 6):
+        dedup.is_duplicate("INC-001", "2026-01-18T12:00:00Z", seq)
+    assert not dedup.is_duplicate("INC-001", "2026-01-18T10:15:00Z", 1)
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+
+def _registry(ttl=60.0, negative_ttl=60.0, max_size=100):
+    import uuid
+    from app.services.device_registry import DeviceRef, DeviceRegistry
+
+    registry = DeviceRegistry(ttl=ttl, negative_ttl=negative_ttl, max_size=max_size)
+    loads = []
+
+    async def load(serial):
+        loads.append(serial)
+        # Let concurrent resolves of the same serial pile up
+        await asyncio.sleep(0.01)
+        return None if serial.startswith("rogue") else DeviceRef(uuid.uuid5(uuid.NAMESPACE_OID, serial), None)
+
+    registry._load = load
+    return registry, loads
+
+@pytest.mark.asyncio
+async def test_device_registry_ttl_lru_and_negative_cache():
+    registry, loads = _registry(ttl=0.05, negative_ttl=60.0, max_size=2)
+    ref = await registry.resolve("INC-001")
+    assert await registry.resolve("INC-001") == ref
+    assert await registry.resolve("rogue-1") is None
+    assert await registry.resolve("rogue-1") is None
+    assert loads == ["INC-001", "rogue-1"]
+
+    # Expired after ttl; unknown serials stay cached for negative_ttl
+    await asyncio.sleep(0.06)
+    await registry.resolve("INC-001")
+    await registry.resolve("rogue-1")
+    assert loads == ["INC-001", "rogue-1", "INC-001"]
+
+    # Beyond max_size the least recently used entry is evicted
+    await registry.resolve("INC-002")
+    await registry.resolve("rogue-1")
+    assert loads[-1] == "INC-002"
+    await registry.resolve("INC-001")
+    assert loads[-1] == "INC-001" and len(loads) == 5
+
+@pytest.mark.asyncio
+async def test_device_registry_coalesces_misses_and_runs_invalidation_hooks(monkeypatch):
+    import app.services.device_registry as device_registry_module
+
+    registry, loads = _registry()
+    refs = await asyncio.gather(*(registry.resolve("INC-001") for _ in range(5)))
+    assert loads == ["INC-001"] and len(set(refs)) == 1
+
+    published, evicted = [], []
+
+    class FakeRedis:
+        async def publish(self, channel, message):
+            published.append((channel, message))
+
+    async def fake_redis():
+        return FakeRedis()
+
+    monkeypatch.setattr(device_registry_module, "get_redis", fake_redis)
+    registry.on_invalidate(lambda serial, device_uuid: evicted.append((serial, device_uuid)))
+    await registry.invalidate("INC-001", refs[0].id)
+
+    assert evicted == [("INC-001", str(refs[0].id))]
+    assert published[0][0] == device_registry_module.INVALIDATION_CHANNEL
+    # Evicted locally: the next resolve goes back to the database
+    await registry.resolve("INC-001")
+    assert loads == ["INC-001", "INC-001"]
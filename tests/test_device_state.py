@@ -0,0 +1,63 @@
+import pytest
+
+@pytest.mark.asyncio
+async def test_device_state_writes_only_changed_settings_and_keeps_them_on_failure(monkeypatch):
+    import uuid
+    from datetime import datetime, timedelta, timezone
+    import app.services.device_state as device_state_module
+    from app.services.device_state import DeviceStateTracker
+
+    tracker = DeviceStateTracker(flush_interval=60)
+    device_id = uuid.uuid4()
+    ts = datetime(2026, 1, 18, tzinfo=timezone.utc)
+    tracker.observe(device_id, ts, {"temp_low": 99.0, "timer_sec": 60})
+    tracker.observe(device_id, ts - timedelta(seconds=5), {"temp_low": 99.0, "timer_sec": 60})
+    assert tracker._dirty == {device_id: ts}
+    assert tracker._states[device_id].pending_settings == {"temp_low": 99.0, "timer_sec": 60}
+
+    class FailingSession:
+        def __init__(self, engine):
+            pass
+
+        async def __aenter__(self):
+            # A newer reading arrives while the write is in flight
+            tracker.observe(device_id, ts + timedelta(seconds=5), {"temp_low": 98.0})
+            raise ConnectionError("database unavailable")
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(device_state_module, "AsyncSession", FailingSession)
+    await tracker.flush()
+    # Re-merged for the next attempt, the newer values winning
+    assert tracker._dirty == {device_id: ts + timedelta(seconds=5)}
+    assert tracker._states[device_id].pending_settings == {"temp_low": 98.0, "timer_sec": 60}
+
+    executed = []
+
+    class Session:
+        def __init__(self, engine):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            executed.append(statement)
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(device_state_module, "AsyncSession", Session)
+    await tracker.flush()
+    # Bulk last_seen update + one settings update
+    assert len(executed) == 2
+    # Unchanged settings are not written again, only last_seen
+    tracker.observe(device_id, ts + timedelta(seconds=10), {"temp_low": 98.0, "timer_sec": 60})
+    assert tracker._states[device_id].pending_settings == {}
+    executed.clear()
+    await tracker.flush()
+    assert len(executed) == 1
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+
+from app.services.dispatcher import PartitionedDispatcher
+
+@pytest.mark.asyncio
+async def test_dispatcher_keeps_per_device_order():
+    handled = []
+
+    async def handler(device_id, seq):
+        # Yield so partitions interleave
+        await asyncio.sleep(0)
+        handled.append((device_id, seq))
+
+    dispatcher = PartitionedDispatcher(4, handler)
+    dispatcher.start()
+    for seq in range(50):
+        for device_id in ("INC-001", "INC-002", "INC-003"):
+            await dispatcher.submit(device_id, device_id, seq)
+    await dispatcher.stop(drain=True)
+
+    assert len(handled) == 150
+    for device_id in ("INC-001", "INC-002", "INC-003"):
+        assert [seq for d, seq in handled if d == device_id] == list(range(50))
+
+@pytest.mark.asyncio
+async def test_dispatcher_drop_new_sheds_when_full():
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(seq):
+        await release.wait()
+        handled.append(seq)
+
+    dispatcher = PartitionedDispatcher(1, handler, queue_size=2, overflow_policy="drop_new")
+    dispatcher.start()
+    accepted = [await dispatcher.submit("INC-001", seq) for seq in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    await dispatcher.stop(drain=True)
+
+    # One item is taken by the worker, two fit the queue, the rest are shed
+    assert accepted.count(False) >= 2
+    assert handled == [seq for seq, ok in zip(range(5), accepted) if ok]
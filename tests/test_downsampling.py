@@ -0,0 +1,30 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+
+from app.services.downsampling import downsample, lttb_indices
+
+def test_lttb_keeps_endpoints_and_spike():
+    x = np.arange(10000, dtype=np.float64)
+    y = np.sin(x / 500.0)
+    y[4321] = 50.0
+    idx = lttb_indices(x, y, 100)
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == 9999
+    assert np.all(np.diff(idx) > 0)
+    assert 4321 in idx
+
+def test_downsample_rows_skips_nulls_and_keeps_extremes():
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        {"ts": start + timedelta(seconds=5 * i), "temp_c": 99.5 + (i % 7) * 0.01,
+         "hum_pct": None if i % 3 else 60.0 + (i % 11)}
+        for i in range(5000)
+    ]
+    rows[2500]["temp_c"] = 120.0
+    rows[1200]["temp_c"] = 80.0
+    out = downsample(rows, 200)
+    assert len(out) <= 2 * (200 + 2)
+    assert [r["ts"] for r in out] == sorted(r["ts"] for r in out)
+    temps = [r["temp_c"] for r in out]
+    assert 120.0 in temps and 80.0 in temps
+    assert downsample(rows[:50], 200) == rows[:50]
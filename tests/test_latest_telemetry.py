@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+# Lua scripting in fakeredis
+pytest.importorskip("lupa")
+
+@pytest.fixture
+def redis(monkeypatch):
+    import app.core.redis as redis_module
+    import app.services.latest_telemetry as latest_module
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def get_redis():
+        return client
+
+    monkeypatch.setattr(redis_module, "get_redis", get_redis)
+    monkeypatch.setattr(latest_module, "get_redis", get_redis)
+    return client
+
+def _row(device_id, ts, temp_c):
+    return {"ts": ts, "device_id": device_id, "farm_id": None, "seq": 1, "temp_c": temp_c,
+            "hum_pct": 60.0, "rssi": -60, "payload": {"timer_sec": 60}}
+
+class DB:
+    """AsyncSession stand-in answering latest_rows_query with fixed rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, query):
+        self.queries += 1
+        rows = self.rows
+
+        class Result:
+            def scalars(self):
+                return self
+
+            def all(self):
+                return rows
+
+        return Result()
+
+@pytest.mark.asyncio
+async def test_latest_telemetry_keeps_the_newest_reading(redis):
+    from app.core.redis import execute_scripted
+    from app.services.latest_telemetry import latest_telemetry
+
+    device_id = uuid.uuid4()
+    ts = datetime(2026, 1, 18, 16, 0, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+
+    async def stage(ts, temp_c):
+        async def build(pipe):
+            await latest_telemetry.stage(pipe, device_id, ts, _row(device_id, ts, temp_c))
+        return await execute_scripted(build)
+
+    assert await stage(ts, 99.5) == [1]
+    # An older redelivery or replayed reading does not roll the cache back
+    assert await stage(ts - timedelta(seconds=2), 98.0) == [0]
+    latest = (await latest_telemetry.get_many(DB([]), [device_id]))[device_id]
+    assert latest["temp_c"] == 99.5
+    # Stored in UTC whatever the device's offset
+    assert latest["ts"] == "2026-01-18T10:30:00Z"
+    assert await stage(ts + timedelta(seconds=2), 100.0) == [1]
+    assert (await latest_telemetry.get_many(DB([]), [device_id]))[device_id]["temp_c"] == 100.0
+
+@pytest.mark.asyncio
+async def test_latest_telemetry_reads_misses_from_db_and_backfills(redis):
+    from app.models import Telemetry
+    from app.services.latest_telemetry import latest_telemetry
+
+    device_id = uuid.uuid4()
+    ts = datetime(2026, 1, 18, 10, 30, tzinfo=timezone.utc)
+    db = DB([Telemetry(**_row(device_id, ts, 99.5))])
+
+    from_db = await latest_telemetry.get_many(db, [device_id, uuid.uuid4()])
+    assert db.queries == 1 and list(from_db) == [device_id]
+    assert from_db[device_id]["ts"] == "2026-01-18T10:30:00Z"
+
+    # Backfilled: the next read is a cache hit returning the same row
+    cached = await latest_telemetry.get_many(db, [device_id])
+    assert db.queries == 1
+    assert cached == from_db
@@ -0,0 +1,12 @@
+def test_metrics_render_prometheus_text():
+    from app.core.metrics import MetricsRegistry, render_text
+
+    reg = MetricsRegistry()
+    reg.counter("rows_total", "Rows", ["farm"]).labels(farm="a").inc(3)
+    reg.histogram("stage_seconds", "Stage", ["stage"], buckets=(0.1, 1.0)).labels(stage="decode").observe(0.5)
+    text = render_text(reg)
+    assert 'rows_total{farm="a"} 3' in text
+    assert 'stage_seconds_bucket{stage="decode",le="0.1"} 0' in text
+    assert 'stage_seconds_bucket{stage="decode",le="1"} 1' in text
+    assert 'stage_seconds_bucket{stage="decode",le="+Inf"} 1' in text
+    assert 'stage_seconds_count{stage="decode"} 1' in text
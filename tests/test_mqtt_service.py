@@ -0,0 +1,23 @@
+import pytest
+
+@pytest.mark.asyncio
+async def test_receive_buffer_overflow_is_counted_as_dropped(caplog):
+    import aiomqtt
+    import paho.mqtt.client as paho
+    from app.core.config import settings
+    from app.services.dispatcher import dropped
+    from app.services.mqtt_service import ReceiveQueue
+
+    client = aiomqtt.Client("localhost", queue_type=ReceiveQueue, max_queued_incoming_messages=2)
+    counter = dropped.labels(policy=settings.INGEST_OVERFLOW_POLICY, queue="mqtt_receive")
+    before = counter.value
+    for seq in range(5):
+        message = paho.MQTTMessage(mid=seq, topic=b"incubators/INC-001/telemetry")
+        message.payload = b'{"seq": %d}' % seq
+        # What paho calls for every PUBLISH received from the broker
+        client._on_message(None, None, message)
+
+    # Two are buffered for the partitions, the rest are counted, not just logged by aiomqtt
+    assert client._queue.qsize() == 2
+    assert counter.value - before == 3
+    assert "Message queue is full" not in caplog.text
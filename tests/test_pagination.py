@@ -0,0 +1,81 @@
+import base64
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, set_next_cursor
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 1, 18, 10, 15, 0, 123456, tzinfo=timezone.utc)
+    key = uuid.uuid4()
+    cursor = encode_cursor(ts, key)
+    # URL-safe without padding, so it can go in a query string as-is
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (ts, key)
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    base64.urlsafe_b64encode(b"2026-01-18T10:15:00+00:00").decode(),
+    base64.urlsafe_b64encode(b"yesterday|" + str(uuid.uuid4()).encode()).decode(),
+    base64.urlsafe_b64encode(b"2026-01-18T10:15:00+00:00|not-a-uuid").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|\xff").decode(),
+])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+def test_next_cursor_header_only_with_a_last_row():
+    ts, key = datetime(2026, 1, 18, tzinfo=timezone.utc), uuid.uuid4()
+    response = Response()
+    set_next_cursor(response, ts, key)
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (ts, key)
+
+    for missing in ((None, key), (ts, None)):
+        response = Response()
+        set_next_cursor(response, *missing)
+        assert NEXT_CURSOR_HEADER not in response.headers
+
+@pytest.mark.asyncio
+async def test_next_cursor_set_on_full_pages_only():
+    from types import SimpleNamespace
+    from app.api.v1.endpoints.telemetry import read_device_telemetry
+
+    device_id = uuid.uuid4()
+    ts = datetime(2026, 1, 18, tzinfo=timezone.utc)
+
+    class Result:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def scalar(self):
+            # No archive boundary
+            return None
+
+        def scalars(self):
+            return self
+
+        def all(self):
+            return self.rows
+
+    class DB:
+        def __init__(self, rows):
+            self.rows = rows
+
+        async def execute(self, query):
+            return Result(self.rows)
+
+    rows = [SimpleNamespace(ts=ts, device_id=device_id), SimpleNamespace(ts=ts.replace(hour=1), device_id=device_id)]
+    for page, expected in ((rows, rows[-1]), (rows[:1], None)):
+        response = Response()
+        await read_device_telemetry(
+            device_id, response, db=DB(page), skip=0, limit=2, cursor=None,
+            start_time=None, end_time=None, bucket=None, max_points=None,
+        )
+        if expected is None:
+            assert NEXT_CURSOR_HEADER not in response.headers
+        else:
+            assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (expected.ts, device_id)
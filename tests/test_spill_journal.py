@@ -0,0 +1,56 @@
+def test_spill_journal_round_trip_and_disk_limit(tmp_path):
+    import uuid
+    from datetime import datetime, timezone
+    from app.services.spill_journal import SpillJournal
+
+    journal = SpillJournal(str(tmp_path), segment_bytes=400, max_bytes=1200, fsync_interval=0)
+    device_id = uuid.uuid4()
+    rows = [
+        {"ts": datetime(2026, 1, 18, 10, i, tzinfo=timezone.utc), "device_id": device_id,
+         "farm_id": None, "seq": i, "temp_c": 99.5, "hum_pct": 60.0, "primary_heater": True,
+         "secondary_heater": None, "exhaust_fan": None, "sv_valve": None, "fan": None,
+         "turning_motor": None, "limit_switch": None, "door_light": None, "heater": True,
+         "motor_state": None, "uptime_s": None, "rssi": -60, "ip": None, "payload": None}
+        for i in range(3)
+    ]
+    journal.append(rows)
+    segments = journal.seal()
+    assert len(segments) == 1
+    replayed = [row for batch in journal.read_segment(segments[0], 2) for row in batch]
+    assert replayed == rows
+
+    # Keep appending: oldest segments are discarded to stay under max_bytes
+    for _ in range(20):
+        journal.append(rows)
+    journal.close()
+    assert journal.size_bytes() <= 1200 + 400
+
+def test_spill_journal_keeps_live_workers_apart_and_adopts_orphans(tmp_path):
+    import os
+    import uuid
+    from datetime import datetime, timezone
+    from app.services.spill_journal import SpillJournal
+
+    def journal(name):
+        j = SpillJournal(str(tmp_path), segment_bytes=1 << 20, max_bytes=1 << 20, fsync_interval=0)
+        j.directory = os.path.join(str(tmp_path), name)
+        return j
+
+    row = {"ts": datetime(2026, 1, 18, tzinfo=timezone.utc), "device_id": uuid.uuid4(), "farm_id": None,
+           "seq": 1, "temp_c": 99.5, "hum_pct": 60.0, "heater": True, "rssi": -60}
+    worker_a, worker_b = journal("a"), journal("b")
+    worker_a.append([row])
+    worker_b.append([row])
+    # Each worker only replays (and deletes) its own segments while the other is alive
+    assert [os.path.dirname(p) for p in worker_b.seal()] == [worker_b.directory]
+    worker_a.append([row])
+    worker_b.remove(worker_b.seal()[0])
+
+    # Worker a exits: its flock is released and b adopts its directory
+    worker_a.close()
+    for f in worker_a._held.values():
+        f.close()
+    segments = worker_b.seal()
+    assert len(segments) == 1 and os.path.dirname(segments[0]) == worker_a.directory
+    worker_b.remove(segments[0])
+    assert not os.path.exists(worker_a.directory)
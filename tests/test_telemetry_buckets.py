@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+class DB:
+    """AsyncSession stand-in recording the SQL of each query."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+
+    async def execute(self, query):
+        from sqlalchemy.dialects import postgresql
+
+        self.queries.append(str(query.compile(dialect=postgresql.dialect())))
+        rows = self.rows
+
+        class Result:
+            def mappings(self):
+                return self
+
+            def all(self):
+                return rows
+
+        return Result()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("bucket, view", [
+    ("1m", "telemetry_1m"), ("5m", "telemetry_5m"), ("1h", "telemetry_1h"), ("1d", "telemetry_1d"),
+])
+async def test_bucket_mode_reads_the_continuous_aggregate_of_the_width(bucket, view):
+    from app.api.v1.endpoints.telemetry import read_telemetry_buckets
+
+    device_id = uuid.uuid4()
+    start = datetime(2026, 1, 18, tzinfo=timezone.utc)
+    rows = [
+        {"bucket": start + timedelta(hours=n), "device_id": device_id, "samples": 30, "temp_c_avg": 99.5}
+        for n in (1, 0)
+    ]
+    db = DB(rows)
+    buckets = await read_telemetry_buckets(db, device_id, bucket, start, start + timedelta(days=1))
+
+    assert f"FROM {view} " in db.queries[0]
+    # Newest first from the view, returned oldest first
+    assert [b.bucket for b in buckets] == [start, start + timedelta(hours=1)]
+
+@pytest.mark.asyncio
+async def test_bucket_mode_rejects_ranges_over_max_buckets():
+    from fastapi import HTTPException
+    from app.api.v1.endpoints.telemetry import MAX_BUCKETS, read_telemetry_buckets
+
+    device_id = uuid.uuid4()
+    start = datetime(2026, 1, 1)
+    # Exactly MAX_BUCKETS one-minute buckets is fine (naive times are UTC)
+    db = DB()
+    await read_telemetry_buckets(db, device_id, "1m", start, start + timedelta(minutes=MAX_BUCKETS))
+    assert len(db.queries) == 1
+
+    with pytest.raises(HTTPException) as exc:
+        await read_telemetry_buckets(db, device_id, "1m", start, start + timedelta(minutes=MAX_BUCKETS + 1))
+    assert exc.value.status_code == 400
+    # A 21-day cycle is too many 1m buckets but fine at 1h; nothing hits the DB when rejected
+    with pytest.raises(HTTPException):
+        await read_telemetry_buckets(db, device_id, "1m", start, start + timedelta(days=21))
+    await read_telemetry_buckets(db, device_id, "1h", start, start + timedelta(days=21))
+    assert len(db.queries) == 2
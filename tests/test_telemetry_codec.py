@@ -0,0 +1,66 @@
+import pytest
+
+def test_codec_decodes_once_and_keeps_raw_payload():
+    import json
+    import uuid
+    from app.services.telemetry_codec import build_record, decode_payload, encode_message
+
+    raw = b'{"ts": "2026-01-18T10:15:00Z", "current_temp": "99.5", "hum_pct": 61, "primary_heater": true, "timer_sec": 60, "extra": [1, 2]}'
+    payload = decode_payload(raw)
+    device_id, farm_id = uuid.uuid4(), uuid.uuid4()
+    record = build_record(payload, raw, device_id, farm_id, payload.timestamp())
+
+    row = record.to_row()
+    assert row["temp_c"] == 99.5
+    assert row["hum_pct"] == 61.0
+    assert row["heater"] is True
+    assert row["seq"] == 0 and row["rssi"] == 0
+    assert payload.reported_settings() == {"timer_sec": 60}
+
+    msg = json.loads(encode_message(record, "INC-001"))
+    assert msg["device_id"] == str(device_id)
+    assert msg["data"]["ts"] == "2026-01-18T10:15:00Z"
+    assert msg["data"]["payload"] == json.loads(raw)
+
+def test_residual_payload_drops_keys_stored_in_typed_columns():
+    import json
+    import uuid
+    from app.services.telemetry_codec import build_record, decode_payload
+
+    raw = b'{"ts": "2026-01-18T10:15:00Z", "seq": 7, "temp_c": 99.5, "current_humidity": 61.5, "rssi": -60, "timer_sec": 60}'
+    payload = decode_payload(raw)
+    record = build_record(payload, raw, uuid.uuid4(), uuid.uuid4(), payload.timestamp())
+
+    assert json.loads(bytes(record.db_row("residual")["payload"])) == {"timer_sec": 60}
+    assert record.db_row("none")["payload"] is None
+    assert bytes(record.db_row("full")["payload"]) == raw
+
+    raw = b'{"ts": "2026-01-18T10:15:00Z", "temp_c": 99.5}'
+    payload = decode_payload(raw)
+    record = build_record(payload, raw, uuid.uuid4(), None, payload.timestamp())
+    assert record.db_row("residual")["payload"] is None
+
+def test_codec_accepts_epoch_ts_and_keeps_null_legacy_readings():
+    import uuid
+    from datetime import datetime, timezone
+    from app.services.telemetry_codec import build_record, decode_payload
+
+    expected = datetime(2026, 1, 18, 10, 15, tzinfo=timezone.utc)
+    assert decode_payload(b'{"ts": 1768731300}').timestamp() == expected
+    assert decode_payload(b'{"ts": 1768731300000}').timestamp() == expected
+
+    raw = b'{"current_temp": null, "current_humidity": null}'
+    payload = decode_payload(raw)
+    record = build_record(payload, raw, uuid.uuid4(), None, payload.timestamp())
+    assert record.temp_c is None and record.hum_pct is None
+    # Absent legacy keys still default to 0.0
+    record = build_record(decode_payload(b'{}'), b'{}', uuid.uuid4(), None, expected)
+    assert record.temp_c == 0.0 and record.hum_pct == 0.0
+
+def test_codec_rejects_values_outside_the_integer_columns():
+    from app.services.telemetry_codec import DecodeError, decode_payload
+
+    assert decode_payload(b'{"seq": 2147483647, "rssi": -2147483648}').seq == 2**31 - 1
+    for raw in (b'{"seq": 2147483648}', b'{"uptime_s": 4294967296}', b'{"rssi": -2147483649}'):
+        with pytest.raises(DecodeError):
+            decode_payload(raw)
@@ -0,0 +1,21 @@
+def test_running_stats_merge_matches_single_pass():
+    import random
+    import statistics
+    from app.services.telemetry_stats import RunningStats
+
+    rng = random.Random(7)
+    values = [rng.gauss(99.5, 0.4) for _ in range(5000)]
+    whole, left, right = RunningStats(0.1), RunningStats(0.1), RunningStats(0.1)
+    for i, v in enumerate(values):
+        whole.add(v)
+        (left if i < 1700 else right).add(v)
+    # Sketch keys come back from JSONB as strings
+    left.merge(right.samples, right.mean, right.m2, right.min_value, right.max_value,
+               {str(b): c for b, c in right.bins.items()})
+
+    assert left.samples == whole.samples == 5000
+    assert abs(left.mean - statistics.fmean(values)) < 1e-9
+    assert abs(left.stddev - statistics.pstdev(values)) < 1e-9
+    assert left.min_value == min(values) and left.max_value == max(values)
+    assert abs(left.quantile(0.5) - statistics.median(values)) <= 0.1
+    assert abs(left.quantile(0.95) - statistics.quantiles(values, n=20)[-1]) <= 0.1
@@ -0,0 +1,50 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+# Lua scripting in fakeredis
+pytest.importorskip("lupa")
+
+@pytest.fixture
+def redis(monkeypatch):
+    import app.core.redis as redis_module
+    import app.services.telemetry_stream as stream_module
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def get_redis():
+        return client
+
+    monkeypatch.setattr(redis_module, "get_redis", get_redis)
+    monkeypatch.setattr(stream_module, "get_redis", get_redis)
+    return client
+
+@pytest.mark.asyncio
+async def test_replay_is_truncated_only_when_entries_after_last_id_were_trimmed(redis):
+    import json
+    import uuid
+    from app.core.redis import execute_scripted
+    from app.services.telemetry_stream import STREAM_KEY, TelemetryStream
+
+    stream = TelemetryStream(maxlen=100)
+    farm_id = uuid.uuid4()
+    ids = []
+    for seq in range(5):
+        async def build(pipe):
+            await stream.stage(pipe, farm_id, json.dumps({"seq": seq}).encode())
+        ids.extend(await execute_scripted(build))
+    key = STREAM_KEY.format(farm_id)
+
+    messages, truncated = await stream.replay(str(farm_id), ids[1])
+    assert [json.loads(m)["seq"] for m in messages] == [2, 3, 4] and not truncated
+
+    # last_id itself is trimmed, but the first kept entry directly follows it
+    await redis.xtrim(key, maxlen=3, approximate=False)
+    messages, truncated = await stream.replay(str(farm_id), ids[1])
+    assert [json.loads(m)["id"] for m in messages] == ids[2:] and not truncated
+
+    # Now an entry after last_id is gone too
+    await redis.xtrim(key, maxlen=2, approximate=False)
+    messages, truncated = await stream.replay(str(farm_id), ids[1])
+    assert [json.loads(m)["seq"] for m in messages] == [3, 4] and truncated
+    # Nothing newer than the last id seen
+    assert await stream.replay(str(farm_id), ids[4]) == ([], False)
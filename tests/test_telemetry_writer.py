@@ -0,0 +1,184 @@
+import asyncio
+import pytest
+
+def _writer(tmp_path, batch_size=100, flush_interval=60.0):
+    from app.services.spill_journal import SpillJournal
+    from app.services.telemetry_writer import TelemetryWriter
+
+    journal = SpillJournal(str(tmp_path), segment_bytes=1 << 20, max_bytes=1 << 20, fsync_interval=0)
+    writer = TelemetryWriter(batch_size, flush_interval, max_buffer=1000, journal=journal, replay_interval=60.0)
+    written = []
+
+    async def write(batch):
+        written.append(batch)
+        return True
+
+    writer._write = write
+    return writer, written
+
+@pytest.mark.asyncio
+async def test_telemetry_writer_flushes_full_batches_and_on_interval(tmp_path):
+    writer, written = _writer(tmp_path, batch_size=3, flush_interval=0.2)
+    await writer.start()
+    for seq in range(3):
+        writer.add({"seq": seq})
+    # A full batch wakes the flush loop before the interval
+    await asyncio.sleep(0.05)
+    assert [[row["seq"] for row in batch] for batch in written] == [[0, 1, 2]]
+
+    writer.add({"seq": 3})
+    await asyncio.sleep(0.05)
+    assert len(written) == 1
+    await asyncio.sleep(0.3)
+    assert [row["seq"] for row in written[1]] == [3]
+    await writer.stop()
+
+@pytest.mark.asyncio
+async def test_telemetry_writer_batches_share_one_insert_shape_and_drain_on_stop(tmp_path):
+    from sqlalchemy.dialects import postgresql
+    from app.services.telemetry_writer import INSERT_TELEMETRY, TELEMETRY_COLUMNS
+
+    writer, written = _writer(tmp_path, batch_size=2)
+    await writer.start()
+    writer.add({"seq": 1, "temp_c": 99.5, "unknown": "dropped"})
+    writer.add({"seq": 2})
+    writer.add({"seq": 3})
+    await writer.stop()
+
+    # Drained on stop, in batch_size chunks
+    assert [[row["seq"] for row in batch] for batch in written] == [[1, 2], [3]]
+    # Every row carries every column (missing ones as None), nothing else
+    assert all(tuple(row) == TELEMETRY_COLUMNS for batch in written for row in batch)
+    assert written[0][1]["temp_c"] is None
+    sql = str(INSERT_TELEMETRY.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (ts, device_id) DO NOTHING" in sql
+
+def _refusing_session(refused, inserted, attempts):
+    """AsyncSession stand-in whose INSERT fails with an FK violation when a batch has a `refused` device."""
+    from sqlalchemy.exc import IntegrityError
+
+    class Session:
+        def __init__(self, engine):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement, rows):
+            attempts.append(len(rows))
+            if any(row["device_id"] == refused for row in rows):
+                raise IntegrityError("INSERT INTO telemetry", {}, Exception("violates foreign key constraint"))
+            self._rows = rows
+            return [(row["ts"], row["device_id"]) for row in rows]
+
+        async def commit(self):
+            inserted.extend(row["seq"] for row in self._rows)
+
+    return Session
+
+@pytest.mark.asyncio
+async def test_telemetry_writer_drops_only_the_rows_postgres_refuses(tmp_path, monkeypatch):
+    import uuid
+    import app.services.telemetry_writer as telemetry_writer_module
+    from app.services.spill_journal import SpillJournal
+    from app.services.telemetry_writer import TelemetryWriter
+
+    deleted = uuid.uuid4()
+    inserted, attempts = [], []
+    monkeypatch.setattr(telemetry_writer_module, "AsyncSession", _refusing_session(deleted, inserted, attempts))
+    journal = SpillJournal(str(tmp_path), segment_bytes=1 << 20, max_bytes=1 << 20, fsync_interval=0)
+    writer = TelemetryWriter(8, 60.0, max_buffer=1000, journal=journal, replay_interval=60.0)
+    device_id = uuid.uuid4()
+    for seq in range(8):
+        writer.add({"seq": seq, "device_id": deleted if seq == 5 else device_id})
+    await writer.flush()
+
+    # Everything but the deleted device's row lands, nothing is spilled
+    assert sorted(inserted) == [0, 1, 2, 3, 4, 6, 7]
+    assert attempts[0] == 8 and len(attempts) < 8 * 2
+    assert journal.seal() == []
+
+@pytest.mark.asyncio
+async def test_telemetry_writer_replay_dead_letters_refused_rows_and_drains(tmp_path, monkeypatch):
+    import os
+    import uuid
+    from datetime import datetime, timezone
+    import app.services.telemetry_writer as telemetry_writer_module
+    from app.services.spill_journal import DEAD_LETTER_DIR, SpillJournal
+    from app.services.telemetry_writer import TELEMETRY_COLUMNS, TelemetryWriter
+
+    deleted, device_id = uuid.uuid4(), uuid.uuid4()
+    journal = SpillJournal(str(tmp_path), segment_bytes=1 << 20, max_bytes=1 << 20, fsync_interval=0)
+
+    def rows(seqs):
+        return [dict(dict.fromkeys(TELEMETRY_COLUMNS), ts=datetime(2026, 1, 18, 10, seq, tzinfo=timezone.utc),
+                     device_id=deleted if seq == 2 else device_id, seq=seq, temp_c=99.5)
+                for seq in seqs]
+
+    journal.append(rows(range(0, 4)))
+    journal.seal()
+    journal.append(rows(range(4, 6)))
+
+    inserted = []
+    monkeypatch.setattr(telemetry_writer_module, "AsyncSession", _refusing_session(deleted, inserted, []))
+    writer = TelemetryWriter(3, 60.0, max_buffer=1000, journal=journal, replay_interval=60.0)
+    await writer.replay()
+
+    # The refused row no longer holds back its segment nor the next one
+    assert sorted(inserted) == [0, 1, 3, 4, 5]
+    assert journal.seal() == []
+    dead = os.path.join(str(tmp_path), DEAD_LETTER_DIR, os.path.basename(journal.directory) + ".ndjson")
+    assert [row["seq"] for batch in journal.read_segment(dead, 10) for row in batch] == [2]
+
+@pytest.mark.asyncio
+async def test_telemetry_writer_reports_only_inserted_rows_to_stats(tmp_path, monkeypatch):
+    import uuid
+    from datetime import datetime, timedelta, timezone
+    import app.services.telemetry_writer as telemetry_writer_module
+    from app.services.spill_journal import SpillJournal
+    from app.services.telemetry_stats import TelemetryStatsAggregator
+    from app.services.telemetry_writer import TelemetryWriter
+
+    stored = set()
+
+    class Session:
+        def __init__(self, engine):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement, rows):
+            # ON CONFLICT DO NOTHING ... RETURNING: rows already stored are not returned
+            new = [(row["ts"], row["device_id"]) for row in rows if (row["ts"], row["device_id"]) not in stored]
+            stored.update(new)
+            return new
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(telemetry_writer_module, "AsyncSession", Session)
+    journal = SpillJournal(str(tmp_path), segment_bytes=1 << 20, max_bytes=1 << 20, fsync_interval=0)
+    writer = TelemetryWriter(10, 60.0, max_buffer=1000, journal=journal, replay_interval=60.0)
+    stats = TelemetryStatsAggregator(bucket_seconds=3600, resolution=0.1, flush_interval=60)
+    writer.on_insert(stats.observe_rows)
+
+    device_id = uuid.uuid4()
+    ts = datetime(2026, 1, 18, 10, tzinfo=timezone.utc)
+    for seq in range(3):
+        writer.add({"ts": ts + timedelta(seconds=seq), "device_id": device_id, "temp_c": 99.5})
+    await writer.flush()
+    # A redelivery the in-memory filter missed (same reading, other UTC offset)
+    writer.add({"ts": (ts + timedelta(seconds=1)).astimezone(timezone(timedelta(hours=2))),
+                "device_id": device_id, "temp_c": 99.5})
+    await writer.flush()
+
+    bucket = stats.bucket_start(ts)
+    assert stats._pending[(device_id, bucket, "temp_c")].samples == 3
+    assert (device_id, bucket, "hum_pct") not in stats._pending
@@ -0,0 +1,38 @@
+import pytest
+
+@pytest.mark.asyncio
+async def test_failed_replay_closes_the_socket(monkeypatch):
+    from app.api.v1.endpoints import websocket as websocket_module
+    from app.services.ws_hub import ClientQueue
+
+    queue = ClientQueue("farm", maxsize=4, max_lag=60)
+    left = []
+
+    async def join(farm_id, delta=False):
+        return queue
+
+    async def leave(farm_id, client):
+        left.append(client)
+
+    async def replay(farm_id, last_id):
+        raise ConnectionError("redis unavailable")
+
+    monkeypatch.setattr(websocket_module.ws_hub, "join", join)
+    monkeypatch.setattr(websocket_module.ws_hub, "leave", leave)
+    monkeypatch.setattr(websocket_module.telemetry_stream, "replay", replay)
+
+    class WebSocket:
+        closed = None
+
+        async def accept(self):
+            pass
+
+        async def close(self, code=1000, reason=None):
+            self.closed = (code, reason)
+
+    websocket = WebSocket()
+    await websocket_module.websocket_endpoint(websocket, "farm", token="t", last_id="1700000000000-0", encoding="json")
+
+    # Not left half-open: the client sees the failure and can reconnect
+    assert websocket.closed == (websocket_module.REPLAY_FAILED_CLOSE_CODE, "Replay failed")
+    assert left == [queue]
@@ -0,0 +1,202 @@
+import asyncio
+import pytest
+
+from app.services.ws_hub import ClientQueue, OutgoingMessage
+
+def _message(device_id, text):
+    return OutgoingMessage('{"device_id": "%s", "text": "%s"}' % (device_id, text))
+
+async def _texts(queue):
+    import json
+    return [json.loads(await queue.get())["text"] for _ in range(len(queue))]
+
+@pytest.mark.asyncio
+async def test_client_queue_conflates_to_latest_per_device():
+    queue = ClientQueue("farm", maxsize=4, max_lag=60)
+    for seq in range(3):
+        queue.put(_message("a", f"a{seq}"))
+    queue.put(_message("b", "b0"))
+    # Full: a0..a2 collapse to a2 before b1 is queued
+    queue.put(_message("b", "b1"))
+    assert await _texts(queue) == ["a2", "b0", "b1"]
+    assert queue.dropped == 2 and queue.sent == 3
+    assert not queue.lagging.is_set()
+
+@pytest.mark.asyncio
+async def test_client_queue_flags_client_behind_for_too_long():
+    queue = ClientQueue("farm", maxsize=2, max_lag=0.05)
+    for seq in range(3):
+        queue.put(_message(f"d{seq}", "x"))
+    await asyncio.sleep(0.1)
+    queue.put(_message("d9", "x"))
+    assert queue.lagging.is_set()
+    assert len(queue) <= 2
+
+@pytest.mark.asyncio
+async def test_client_queue_filters_projects_and_throttles():
+    import json
+    from app.services.ws_hub import subscription_decoder
+
+    def reading(serial, seq):
+        return OutgoingMessage(json.dumps({
+            "type": "telemetry", "device_id": f"id-{serial}", "device_serial": serial, "farm_id": "farm",
+            "data": {"ts": "2026-01-18T10:15:00Z", "device_id": f"id-{serial}", "seq": seq, "temp_c": 99.5, "rssi": -60},
+        }))
+
+    queue = ClientQueue("farm", maxsize=16, max_lag=60)
+    queue.subscribe(subscription_decoder.decode(
+        b'{"action": "subscribe", "devices": ["INC-001"], "fields": ["temp_c", "seq"], "max_rate": 20}'
+    ))
+    for seq in range(3):
+        queue.put(reading("INC-001", seq))
+        queue.put(reading("INC-002", seq))
+
+    first = json.loads(await queue.get())
+    assert first["device_serial"] == "INC-001"
+    assert first["data"] == {"ts": "2026-01-18T10:15:00Z", "device_id": "id-INC-001", "temp_c": 99.5, "seq": 0}
+    # seq 1 was replaced by seq 2 while held, which is released after 1/20 s
+    second = json.loads(await asyncio.wait_for(queue.get(), timeout=1))
+    assert second["data"]["seq"] == 2
+    assert queue.throttled == 1 and len(queue) == 0
+
+@pytest.mark.asyncio
+async def test_client_queue_skips_messages_already_replayed():
+    import json
+    from app.services.telemetry_stream import with_stream_id
+
+    queue = ClientQueue("farm", maxsize=16, max_lag=60)
+    for entry_id in ("1700000000000-0", "1700000000000-1", "1700000000001-0"):
+        queue.put(OutgoingMessage(with_stream_id(entry_id, '{"device_id": "a", "text": "%s"}' % entry_id)))
+    queue.skip_through("1700000000000-1")
+    assert [json.loads(await queue.get())["id"] for _ in range(len(queue))] == ["1700000000001-0"]
+
+@pytest.mark.asyncio
+async def test_client_queue_delta_encoding_sends_changed_fields_only():
+    import json
+
+    def reading(seq, temp_c):
+        return OutgoingMessage(json.dumps({
+            "id": f"1-{seq}", "type": "telemetry", "device_id": "id-1", "device_serial": "INC-001", "farm_id": "farm",
+            "data": {
+                "ts": f"2026-01-18T10:15:0{seq}Z", "device_id": "id-1", "seq": seq, "temp_c": temp_c, "rssi": -60,
+                "payload": {"ts": f"2026-01-18T10:15:0{seq}Z", "seq": seq, "temp_c": temp_c, "temp_low": 99.0},
+            },
+        }))
+
+    queue = ClientQueue("farm", maxsize=16, max_lag=60, delta=True)
+    for seq, temp_c in enumerate((99.5, 99.5, 99.6)):
+        queue.put(reading(seq, temp_c))
+
+    snapshot = json.loads(await queue.get())
+    assert snapshot["type"] == "snapshot" and snapshot["device_serial"] == "INC-001"
+    # Payload keys mirrored by typed fields are left out
+    assert snapshot["data"]["payload"] == {"temp_low": 99.0}
+    assert json.loads(await queue.get()) == {
+        "type": "delta", "id": "1-1", "device_id": "id-1",
+        "data": {"ts": "2026-01-18T10:15:01Z", "seq": 1},
+    }
+    assert json.loads(await queue.get())["data"] == {"ts": "2026-01-18T10:15:02Z", "seq": 2, "temp_c": 99.6}
+    assert queue.stats()["encoding"] == "delta"
+
+    # A new subscription starts over with a snapshot
+    from app.services.ws_hub import subscription_decoder
+    queue.subscribe(subscription_decoder.decode(b'{"action": "subscribe", "fields": ["temp_c"]}'))
+    queue.put(reading(3, 99.6))
+    assert json.loads(await queue.get())["type"] == "snapshot"
+
+class _PubSub:
+    """redis.asyncio PubSub stand-in: listen() ends once nothing is subscribed."""
+
+    def __init__(self):
+        self.channels = set()
+        self.subscribes = []
+        self._inbox = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+        self.subscribes.append(channel)
+
+    async def unsubscribe(self, channel):
+        self.channels.discard(channel)
+        self._inbox.put_nowait(None)
+
+    def publish(self, channel, data):
+        if channel in self.channels:
+            self._inbox.put_nowait({"type": "message", "channel": channel, "data": data})
+
+    async def listen(self):
+        while self.channels:
+            message = await self._inbox.get()
+            if message is not None:
+                yield message
+
+    async def aclose(self):
+        pass
+
+@pytest.fixture
+def pubsub(monkeypatch):
+    import app.services.ws_hub as ws_hub_module
+
+    pubsub = _PubSub()
+
+    class Redis:
+        def pubsub(self, ignore_subscribe_messages=False):
+            return pubsub
+
+    async def get_redis():
+        return Redis()
+
+    monkeypatch.setattr(ws_hub_module, "get_redis", get_redis)
+    return pubsub
+
+@pytest.mark.asyncio
+async def test_farm_hub_shares_one_subscription_per_farm(pubsub):
+    from app.services.ws_hub import FarmHub
+
+    hub = FarmHub(queue_size=8, max_lag=60)
+    first = await hub.join("a")
+    second = await hub.join("a")
+    other = await hub.join("b")
+    assert pubsub.subscribes == ["telemetry:a", "telemetry:b"]
+
+    await hub.leave("a", first)
+    assert pubsub.channels == {"telemetry:a", "telemetry:b"}
+    # The last client of a farm drops its subscription
+    await hub.leave("a", second)
+    assert pubsub.channels == {"telemetry:b"}
+    await hub.leave("b", other)
+    assert pubsub.channels == set()
+    await hub.close()
+
+@pytest.mark.asyncio
+async def test_farm_hub_fans_out_to_the_farm_clients_only(pubsub):
+    import json
+    from app.services.ws_hub import FarmHub
+
+    hub = FarmHub(queue_size=8, max_lag=60)
+    clients = [await hub.join("a"), await hub.join("a")]
+    other = await hub.join("b")
+    pubsub.publish("telemetry:a", '{"device_id": "d1", "text": "hello"}')
+
+    for queue in clients:
+        assert json.loads(await asyncio.wait_for(queue.get(), timeout=1))["text"] == "hello"
+    assert len(other) == 0
+    await hub.close()
+
+@pytest.mark.asyncio
+async def test_farm_hub_slow_client_does_not_hold_up_the_others(pubsub):
+    import json
+    from app.services.ws_hub import FarmHub
+
+    hub = FarmHub(queue_size=4, max_lag=60)
+    slow = await hub.join("a")
+    fast = await hub.join("a")
+    received = []
+    for seq in range(20):
+        pubsub.publish("telemetry:a", '{"device_id": "d%d", "text": "%d"}' % (seq, seq))
+        received.append(json.loads(await asyncio.wait_for(fast.get(), timeout=1))["text"])
+
+    # The slow client never read: it sheds its own backlog, the fast one got everything
+    assert received == [str(seq) for seq in range(20)]
+    assert len(slow) <= 4 and slow.dropped > 0
+    await hub.close()